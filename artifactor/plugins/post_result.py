@@ -10,6 +10,7 @@ artifactor:
             enabled: True
             plugin: post_result
 """
+import json
 from collections import defaultdict
 
 from artifactor import ArtifactorBasePlugin
@@ -20,6 +21,10 @@ from utils.path import log_path
 # any unexpected statuses, which should probably never happen
 
 test_report = log_path.join('test-report.json')
+# Survives between runs, the parallelizer schedules tests by the durations stored here
+test_durations = log_path.join('test-durations.json')
+# How much the duration from the latest run counts when merged with the stored one
+duration_weight = 0.5
 test_counts = defaultdict(int, {
     'passed': 0,
     'failed': 0,
@@ -61,6 +66,42 @@ class PostResult(ArtifactorBasePlugin):
         if ui_coverage_percent:
             report['ui_coverage_percent'] = ui_coverage_percent
 
-        import json
         with test_report.open('w') as art_out:
             json.dump(report, art_out, indent=2)
+        update_test_durations(artifacts)
+
+
+def load_test_durations():
+    """Returns the durations of tests from the previous runs
+
+    Returns:
+        A dict of ``{test_ident: seconds}``, where ``test_ident`` is the artifactor identifier
+        of the test (``location/name``). Empty if there is no usable history.
+    """
+    if not test_durations.check():
+        return {}
+    try:
+        with test_durations.open('r') as f:
+            durations = json.load(f)
+    except ValueError:
+        return {}
+    if not isinstance(durations, dict):
+        return {}
+    return durations
+
+
+def update_test_durations(artifacts):
+    """Merges the durations of the finished tests into :py:data:`test_durations`"""
+    durations = load_test_durations()
+    for test_ident, test in artifacts.iteritems():
+        if not (test.get('start_time') and test.get('finish_time')):
+            continue
+        duration = test['finish_time'] - test['start_time']
+        if test_ident in durations:
+            duration = (duration_weight * duration +
+                (1 - duration_weight) * durations[test_ident])
+        durations[test_ident] = duration
+    tmp = test_durations.new(basename=test_durations.basename + '.tmp')
+    with tmp.open('w') as f:
+        json.dump(durations, f)
+    tmp.rename(test_durations)
@@ -20,7 +20,7 @@ import os
 import re
 import shutil
 import time
-from copy import deepcopy
+from multiprocessing.pool import ThreadPool
 
 from jinja2 import Environment, FileSystemLoader
 from py.path import local
@@ -29,18 +29,28 @@ from utils.conf import cfme_data  # Only for the provider specific reports
 from utils.path import template_path
 from artifactor import ArtifactorBasePlugin
 
-_tests_tpl = {
-    '_sub': {},
-    '_stats': {
-        'passed': 0,
-        'failed': 0,
-        'skipped': 0,
-        'error': 0,
-        'xpassed': 0,
-        'xfailed': 0
-    },
-    '_duration': 0
-}
+
+def _tests_tpl():
+    return {
+        '_sub': {},
+        '_stats': {
+            'passed': 0,
+            'failed': 0,
+            'skipped': 0,
+            'error': 0,
+            'xpassed': 0,
+            'xfailed': 0
+        },
+        '_duration': 0
+    }
+
+
+_colors = {'passed': 'success',
+           'failed': 'warning',
+           'error': 'danger',
+           'xpassed': 'danger',
+           'xfailed': 'success',
+           'skipped': 'info'}
 
 # Regexp, that finds all URLs in a string
 # Does not cover all the cases, but rather only those we can
@@ -63,6 +73,13 @@ def overall_test_status(statuses):
     return "passed"
 
 
+def _signature(test):
+    """Returns a value which changes whenever the artifacts of the test change."""
+    statuses = [(k, v) for k, v in test.get('statuses', {}).iteritems() if k != 'overall']
+    return repr(sorted(statuses)), repr(sorted(
+        (k, v) for k, v in test.iteritems() if k != 'statuses'))
+
+
 class Reporter(ArtifactorBasePlugin):
 
     def plugin_initialize(self):
@@ -77,6 +94,9 @@ class Reporter(ArtifactorBasePlugin):
 
     def configure(self):
         self.only_failed = self.data.get('only_failed', False)
+        # test_ident -> (signature, log_dir, fragment), see test_fragment
+        self.fragments = {}
+        self.top10_cache = {}
         self.configured = True
 
     @ArtifactorBasePlugin.check_configured
@@ -90,9 +110,18 @@ class Reporter(ArtifactorBasePlugin):
         return None, {'artifacts': {test_ident: {'start_time': time.time(), 'slaveid': slaveid}}}
 
     @ArtifactorBasePlugin.check_configured
-    def finish_test(self, test_location, test_name, slaveid):
+    def finish_test(self, test_location, test_name, slaveid, artifacts=None, artifact_dir=None):
         test_ident = "{}/{}".format(test_location, test_name)
-        return None, {'artifacts': {test_ident: {'finish_time': time.time(), 'slaveid': slaveid}}}
+        finish_time = time.time()
+        if artifacts is not None and artifact_dir is not None:
+            # Prepare the part of the report now, the session end only checks it is up to date
+            test = dict(artifacts.get(test_ident, {}), finish_time=finish_time, slaveid=slaveid)
+            try:
+                self.test_fragment(test_ident, test, local(artifact_dir).strpath + "/")
+            except (IOError, OSError):
+                # Some of the files are not there yet, it will be done at the end
+                pass
+        return None, {'artifacts': {test_ident: {'finish_time': finish_time, 'slaveid': slaveid}}}
 
     @ArtifactorBasePlugin.check_configured
     def report_test(self, test_location, test_name, test_xfail, test_when, test_outcome):
@@ -116,12 +145,22 @@ class Reporter(ArtifactorBasePlugin):
 
     @ArtifactorBasePlugin.check_configured
     def run_provider_report(self, artifacts, artifact_dir, version=None):
-        for mgmt in cfme_data['management_systems'].keys():
-            template_data = self.process_data(artifacts, artifact_dir, version, name_filter=mgmt)
+        index = self.build_index(artifacts, artifact_dir)
 
+        def _provider_report(mgmt):
+            template_data = self.process_data(artifacts, artifact_dir, version, name_filter=mgmt,
+                                              index=index)
             self.render_report(template_data, "report_{}".format(mgmt), artifact_dir,
                                'test_report_provider.html')
 
+        mgmts = cfme_data['management_systems'].keys()
+        if mgmts:
+            pool = ThreadPool(min(len(mgmts), 8))
+            try:
+                pool.map(_provider_report, mgmts)
+            finally:
+                pool.close()
+
     def render_report(self, report, filename, log_dir, template):
         template_env = Environment(
             loader=FileSystemLoader(template_path.strpath)
@@ -135,113 +174,157 @@ class Reporter(ArtifactorBasePlugin):
         except OSError:
             pass
 
-    def process_data(self, artifacts, log_dir, version, name_filter=None):
-        tb_errors = []
-        blocker_skip_count = 0
-        provider_skip_count = 0
-        template_data = {'tests': [], 'qa': []}
-        template_data['version'] = version
+    def test_fragment(self, test_name, test, log_dir):
+        """Processes the data of a single test that do not depend on the other tests.
+
+        The fragments of finished tests are cached, so the files of each test are read only once
+        and only the tests whose artifacts changed since are processed again.
+
+        Returns: A tuple of the test data for the template, the short traceback or ``None``
+            and a list of the qa contacts.
+        """
+        signature = _signature(test)
+        cached = self.fragments.get(test_name)
+        if cached is not None and cached[0] == signature and cached[1] == log_dir:
+            test['statuses']['overall'] = cached[2][0]['outcomes']['overall']
+            return cached[2]
+
+        short_tb = None
+        qa_contacts = []
+        overall_status = overall_test_status(test['statuses'])
+        # Set the overall status and then process duration
+        test['statuses']['overall'] = overall_status
+        test_data = {'name': test_name, 'outcomes': test['statuses'],
+                     'slaveid': test.get('slaveid', "Unknown"), 'color': _colors[overall_status]}
+        if 'composite' in test:
+            test_data['composite'] = test['composite']
+
+        if 'skipped' in test:
+            if test['skipped'].get('type', None) == 'provider':
+                test_data['skip_provider'] = test['skipped'].get('reason', None)
+            if test['skipped'].get('type', None) == 'blocker':
+                test_data['skip_blocker'] = test['skipped'].get('reason', None)
+
+        if test.get('start_time', None):
+            if test.get('finish_time', None):
+                test_data['in_progress'] = False
+                test_data['duration'] = test['finish_time'] - test['start_time']
+            else:
+                test_data['duration'] = time.time() - test['start_time']
+                test_data['in_progress'] = True
+
+        # Set up destinations for the files
+        for ident in test.get('files', []):
+            if "softassert" in ident:
+                clean_files = []
+                for assertion in test['files']['softassert']:
+                    files = {k: v.replace(log_dir, "") for k, v in assertion.iteritems()}
+                    clean_files.append(files)
+                test_data['softassert'] = sorted(clean_files)
+                continue
+
+            for filename in test['files'].get(ident, []):
+                if "rbac_screenshot" in filename:
+                    test_data['rbac_screenshot'] = filename.replace(log_dir, "")
+                elif "screenshot" in filename:
+                    test_data['screenshot'] = filename.replace(log_dir, "")
+                elif "short-traceback" in filename:
+                    with open(filename) as f:
+                        short_tb = f.read()
+                    test_data['short_tb'] = short_tb
+                elif "rbac-traceback" in filename:
+                    test_data['rbac'] = filename.replace(log_dir, "")
+                elif "traceback" in filename:
+                    test_data['full_tb'] = filename.replace(log_dir, "")
+                elif "video" in filename:
+                    test_data['video'] = filename.replace(log_dir, "")
+                elif "cfme.log" in filename:
+                    test_data['cfme'] = filename.replace(log_dir, "")
+                elif "function" in filename:
+                    test_data['function'] = filename.replace(log_dir, "")
+                elif "emails.html" in filename:
+                    test_data['emails'] = filename.replace(log_dir, "")
+                elif "events.html" in filename:
+                    test_data['event_testing'] = filename.replace(log_dir, "")
+                elif "qa_contact.txt" in filename:
+                    test_data['qa_contact'] = []
+                    with open(filename, 'rb') as qafile:
+                        qareader = csv.reader(qafile, delimiter=',', quotechar='"')
+                        for qacontact in qareader:
+                            test_data['qa_contact'].append(qacontact)
+                            qa_contacts.append(qacontact[0])
+            if "merkyl" in ident:
+                test_data['merkyl'] = [f.replace(log_dir, "")
+                                       for f in test['files']['merkyl']]
+
+        if "short_tb" in test_data and test_data["short_tb"]:
+            urls = [url for url in URL.findall(test_data["short_tb"])]
+            if urls:
+                test_data["urls"] = urls
+
+        fragment = (test_data, short_tb, qa_contacts)
+        if not test_data.get('in_progress', False):
+            self.fragments[test_name] = (signature, log_dir, fragment)
+        return fragment
+
+    def build_index(self, artifacts, log_dir):
+        """Collects the fragments of all the tests and the data computed over all of them.
+
+        The index is shared by the main and the provider reports.
+        """
         log_dir = local(log_dir).strpath + "/"
-        counts = {'passed': 0, 'failed': 0, 'skipped': 0, 'error': 0, 'xfailed': 0, 'xpassed': 0}
-        colors = {'passed': 'success',
-                  'failed': 'warning',
-                  'error': 'danger',
-                  'xpassed': 'danger',
-                  'xfailed': 'success',
-                  'skipped': 'info'}
-        # Iterate through the tests and process the counts and durations
+        index = {'tests': [], 'qa': [], 'tb_errors': [], 'blocker_skip_count': 0,
+                 'provider_skip_count': 0,
+                 'counts': {'passed': 0, 'failed': 0, 'skipped': 0, 'error': 0, 'xfailed': 0,
+                            'xpassed': 0}}
+        qa = set()
         for test_name, test in artifacts.iteritems():
             if not test.get('statuses', None):
                 continue
-            overall_status = overall_test_status(test['statuses'])
-            counts[overall_status] += 1
-            color = colors[overall_status]
-            # Set the overall status and then process duration
-            test['statuses']['overall'] = overall_status
-            test_data = {'name': test_name, 'outcomes': test['statuses'],
-                         'slaveid': test.get('slaveid', "Unknown"), 'color': color}
-            if 'composite' in test:
-                test_data['composite'] = test['composite']
-
-            if 'skipped' in test:
-                if test['skipped'].get('type', None) == 'provider':
-                    provider_skip_count += 1
-                    test_data['skip_provider'] = test['skipped'].get('reason', None)
-                if test['skipped'].get('type', None) == 'blocker':
-                    blocker_skip_count += 1
-                    test_data['skip_blocker'] = test['skipped'].get('reason', None)
-
-            if test.get('start_time', None):
-                if test.get('finish_time', None):
-                    test_data['in_progress'] = False
-                    test_data['duration'] = test['finish_time'] - test['start_time']
-                else:
-                    test_data['duration'] = time.time() - test['start_time']
-                    test_data['in_progress'] = True
-
-            # Set up destinations for the files
-            for ident in test.get('files', []):
-                if "softassert" in ident:
-                    clean_files = []
-                    for assertion in test['files']['softassert']:
-                        files = {k: v.replace(log_dir, "") for k, v in assertion.iteritems()}
-                        clean_files.append(files)
-                    test_data['softassert'] = sorted(clean_files)
-                    continue
-
-                for filename in test['files'].get(ident, []):
-                    if "rbac_screenshot" in filename:
-                        test_data['rbac_screenshot'] = filename.replace(log_dir, "")
-                    elif "screenshot" in filename:
-                        test_data['screenshot'] = filename.replace(log_dir, "")
-                    elif "short-traceback" in filename:
-                        short_tb_data = open(filename).read()
-                        test_data['short_tb'] = short_tb_data
-                        tb_errors.append((short_tb_data, test_name))
-                    elif "rbac-traceback" in filename:
-                        test_data['rbac'] = filename.replace(log_dir, "")
-                    elif "traceback" in filename:
-                        test_data['full_tb'] = filename.replace(log_dir, "")
-                    elif "video" in filename:
-                        test_data['video'] = filename.replace(log_dir, "")
-                    elif "cfme.log" in filename:
-                        test_data['cfme'] = filename.replace(log_dir, "")
-                    elif "function" in filename:
-                        test_data['function'] = filename.replace(log_dir, "")
-                    elif "emails.html" in filename:
-                        test_data['emails'] = filename.replace(log_dir, "")
-                    elif "events.html" in filename:
-                        test_data['event_testing'] = filename.replace(log_dir, "")
-                    elif "qa_contact.txt" in filename:
-                        test_data['qa_contact'] = []
-                        with open(filename, 'rb') as qafile:
-                            qareader = csv.reader(qafile, delimiter=',', quotechar='"')
-                            for qacontact in qareader:
-                                test_data['qa_contact'].append(qacontact)
-                                if qacontact[0] not in template_data['qa']:
-                                    template_data['qa'].append(qacontact[0])
-                if "merkyl" in ident:
-                    test_data['merkyl'] = [f.replace(log_dir, "")
-                                           for f in test['files']['merkyl']]
-
-            if "short_tb" in test_data and test_data["short_tb"]:
-                urls = [url for url in URL.findall(test_data["short_tb"])]
-                if urls:
-                    test_data["urls"] = urls
-            template_data['tests'].append(test_data)
-        template_data['top10'] = self.top10(tb_errors)
-        template_data['counts'] = counts
-        template_data['blocker_skip_count'] = blocker_skip_count
-        template_data['provider_skip_count'] = provider_skip_count
-
+            test_data, short_tb, qa_contacts = self.test_fragment(test_name, test, log_dir)
+            index['tests'].append(test_data)
+            index['counts'][test_data['outcomes']['overall']] += 1
+            if 'skip_provider' in test_data:
+                index['provider_skip_count'] += 1
+            if 'skip_blocker' in test_data:
+                index['blocker_skip_count'] += 1
+            if short_tb is not None:
+                index['tb_errors'].append((short_tb, test_name))
+            for qacontact in qa_contacts:
+                if qacontact not in qa:
+                    qa.add(qacontact)
+                    index['qa'].append(qacontact)
+
+        key = tuple(index['tb_errors'])
+        if key not in self.top10_cache:
+            self.top10_cache.clear()
+            self.top10_cache[key] = self.top10(index['tb_errors'])
+        index['top10'] = self.top10_cache[key]
+        return index
+
+    def process_data(self, artifacts, log_dir, version, name_filter=None, index=None):
+        if index is None:
+            index = self.build_index(artifacts, log_dir)
+        template_data = {
+            'version': version,
+            'qa': list(index['qa']),
+            'top10': index['top10'],
+            'counts': dict(index['counts']),
+            'blocker_skip_count': index['blocker_skip_count'],
+            'provider_skip_count': index['provider_skip_count'],
+        }
+
+        # The fragments are shared, the durations are formatted below
+        tests = index['tests']
         if name_filter:
-            template_data['tests'] = [x for x in template_data['tests']
-                                      if re.findall('{}[-\]]+'.format(name_filter), x['name'])]
+            name_re = re.compile('{}[-\]]+'.format(name_filter))
+            tests = [x for x in tests if name_re.search(x['name'])]
+        template_data['tests'] = [dict(test) for test in tests]
 
         # Create the tree dict that is used for js tree
         # Note template_data['tests'] != tests
-        tests = deepcopy(_tests_tpl)
-        tests['_sub']['tests'] = deepcopy(_tests_tpl)
+        tests = _tests_tpl()
+        tests['_sub']['tests'] = _tests_tpl()
 
         for test in template_data['tests']:
             self.build_dict(test['name'].replace('cfme/', ''), tests, test)
@@ -286,7 +369,7 @@ class Reporter(ArtifactorBasePlugin):
         # If we are in a module.
         else:
             if head not in container['_sub']:
-                container['_sub'][head] = deepcopy(_tests_tpl)
+                container['_sub'][head] = _tests_tpl()
             # Call again to recurse down the tree.
             self.build_dict('/'.join(end), container['_sub'][head], contents)
             container['_stats'][contents['outcomes']['overall']] += 1
@@ -283,15 +283,14 @@ class BaseVM(Pretty, Updateable, PolicyProfileAssignable, Taggable):
             else:
                 raise TemplateNotFound("Template '{}' not found in UI!".format(self.name))
 
-        # this is causing some issues in 5.5.0.9, commenting out for a bit
-        # paginator.results_per_page(1000)
-        for page in paginator.pages():
-            if sel.is_displayed(quadicon, move_to=True):
-                if mark:
-                    sel.check(quadicon.checkbox())
-                return quadicon
-        else:
+        try:
+            paginator.find_title(self.name)
+        except sel.NoSuchElementException:
             raise VmOrInstanceNotFound("VM '{}' not found in UI!".format(self.name))
+        sel.move_to_element(quadicon)
+        if mark:
+            sel.check(quadicon.checkbox())
+        return quadicon
 
     def get_detail(self, properties=None, icon_href=False):
         """Gets details from the details infoblock
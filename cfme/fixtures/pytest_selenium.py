@@ -12,7 +12,7 @@ Members of this module are available in the the pytest.sel namespace, e.g.::
 :var class_selector: Regular expression to detect simple CSS locators
 """
 from HTMLParser import HTMLParser
-from time import sleep
+from time import sleep, time
 from xml.sax.saxutils import quoteattr, unescape
 from collections import Iterable, namedtuple
 from contextlib import contextmanager
@@ -39,7 +39,7 @@ from fixtures.pytest_store import store
 from utils import version
 from utils.browser import browser, ensure_browser_open, quit
 from utils.path import log_path
-from utils.log import logger
+from utils.log import logger, perflog
 from utils.wait import wait_for
 from utils.pretty import Pretty
 
@@ -47,12 +47,115 @@ from threading import local
 _thread_local = local()
 _thread_local.ajax_timeout = 30
 
+#: Whether :py:func:`wait_for_ajax` uses the asynchronous script instead of polling
+ajax_wait_async = True
+
 class_selector = re.compile(r"^(?:[a-zA-Z][a-zA-Z0-9]*)?(?:[#.][a-zA-Z0-9_-]+)+$")
 
 
 urls = []
 
 
+class ElementCache(object):
+    """Per-page cache of resolved locators, used by :py:func:`elements`.
+
+    Results of ``find_elements`` calls are stored keyed by ``(locator, root)``. The cache is
+    dropped whenever the DOM generation reported by :py:func:`in_flight` changes (which covers
+    any ajax-driven change and navigation to a new page), when the browser changes and when
+    navigating using the functions in this module. Lookups that found nothing are not cached and
+    when a cached element turns out to be stale
+    (:py:class:`selenium.common.exceptions.StaleElementReferenceException`), its lookup is
+    evicted and done again.
+
+    The cache is disabled by default, it can be enabled by the ``--element-cache`` option.
+
+    Attributes:
+        enabled: Whether the cache is used.
+        hits: Number of locator resolutions served from the cache.
+        misses: Number of locator resolutions that had to ask the browser.
+        invalidations: Number of times the cache was dropped.
+    """
+    def __init__(self):
+        self.enabled = False
+        self._cache = {}
+        self._generation = None
+        self._browser = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def stats(self):
+        """Dictionary with the hit/miss/invalidation counters"""
+        return {'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations}
+
+    @staticmethod
+    def key(locator, root):
+        """Returns the cache key for the locator and root or ``None`` if it cannot be cached"""
+        key = (locator, root)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, key):
+        """Returns the cached list of elements or ``None`` if there is none"""
+        if not self.enabled or key is None:
+            return None
+        current_browser = browser()
+        if self._browser is not current_browser:
+            self.invalidate('browser changed')
+            self._browser = current_browser
+        try:
+            result = self._cache[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        else:
+            self.hits += 1
+            return list(result)
+
+    def put(self, key, result):
+        # Nothing found usually means the page is not complete yet, so do not remember that
+        if self.enabled and key is not None and result:
+            self._cache[key] = list(result)
+
+    def evict(self, element):
+        """Drops the cached lookup the element came from.
+
+        Returns: ``True`` if the lookup was cached, so doing it again gives fresh elements.
+        """
+        source = getattr(element, '_source_locator', None)
+        key = self.key(*source) if source is not None else None
+        if key is None or self._cache.pop(key, None) is None:
+            return False
+        logger.trace('Element cache evicted {!r}'.format(key))
+        return True
+
+    def invalidate(self, reason=None):
+        if self._cache:
+            self.invalidations += 1
+            logger.trace('Element cache invalidated ({})'.format(reason or 'no reason given'))
+        self._cache.clear()
+
+    def update_generation(self, generation):
+        """Drops the cache if the DOM generation differs from the one the cache was filled in.
+
+        Args:
+            generation: DOM generation as reported by :py:func:`in_flight`, ``None`` if unknown.
+        """
+        if generation is None or generation != self._generation:
+            self.invalidate('DOM generation changed')
+        self._generation = generation
+
+
+element_cache = ElementCache()
+
+
 # Monkeypatching WebElement
 if "_old__repr__" not in globals():
     _old__repr__ = WebElement.__repr__
@@ -162,12 +265,7 @@ def _w(webelement, **kwargs):
     return [webelement]
 
 
-@elements.method(tuple)
-def _t(t, root=None):
-    """Assume tuple is a 2-item tuple like (By.ID, 'myid').
-
-    Handles the case when root= locator resolves to multiple elements. In that case all of them
-    are processed and all results are put in the same list."""
+def _find_elements(t, root):
     result = []
     for root_element in (elements(root) if root is not None else [browser()]):
         # 20140920 - dajo - hack to get around selenium e is null bs
@@ -179,12 +277,34 @@ def _t(t, root=None):
                 break
             except Exception as e:
                 logger.info('Exception detected: ' + str(e))
+                if isinstance(e, StaleElementReferenceException) and element_cache.evict(
+                        root_element):
+                    raise
                 sleep(0.25)
                 if count == 8:
                     result += root_element.find_elements(*t)
+    return result
+
+
+@elements.method(tuple)
+def _t(t, root=None):
+    """Assume tuple is a 2-item tuple like (By.ID, 'myid').
+
+    Handles the case when root= locator resolves to multiple elements. In that case all of them
+    are processed and all results are put in the same list."""
+    cache_key = element_cache.key(t, root)
+    result = element_cache.get(cache_key)
+    if result is not None:
+        return result
+    try:
+        result = _find_elements(t, root)
+    except StaleElementReferenceException:
+        # A root element from the cache went stale, its lookup was evicted so this resolves it again
+        result = _find_elements(t, root)
     # Monkey patch them
     for elem in result:
         elem._source_locator = (t, root)
+    element_cache.put(cache_key, result)
     return result
 
 
@@ -282,6 +402,8 @@ def in_flight():
         Dictionary of js-related keys and booleans as its values, depending on status.
         The keys are: ``jquery, prototype, miq, spinner and document``.
         The values are: ``True`` if running, ``False`` otherwise.
+        There is also the ``dom`` key holding the DOM generation of the page, which changes
+        with every change of the DOM and with every page load.
     """
     try:
         return execute_script(js.in_flight)
@@ -292,22 +414,20 @@ def in_flight():
         return execute_script(js.in_flight)
 
 
-def wait_for_ajax():
-    """
-    Waits until all ajax timers are complete, in other words, waits until there are no
-    more pending ajax requests, page load should be finished completely.
+def _wait_for_ajax_polling():
+    """Waits for ajax by polling :py:func:`in_flight`
 
-    Raises:
-        TimedOutError: when ajax did not load in time
+    Returns: Number of calls made to the browser.
     """
-
     _thread_local.ajax_log_msg = ''
+    round_trips = [0]
 
     def _nothing_in_flight():
         """Checks if there is no ajax in flight and also logs current status
         """
         prev_log_msg = _thread_local.ajax_log_msg
 
+        round_trips[0] += 1
         try:
             running = in_flight()
         except Exception as e:
@@ -315,7 +435,9 @@ def wait_for_ajax():
             # should be handled by something else
             if "jquery" not in str(e).lower():
                 raise
+            element_cache.update_generation(None)
             return True
+        element_cache.update_generation(running.pop("dom", None))
         anything_in_flight = False
         anything_in_flight |= running["jquery"] > 0
         anything_in_flight |= running["prototype"] > 0
@@ -335,6 +457,67 @@ def wait_for_ajax():
         _nothing_in_flight,
         num_sec=_thread_local.ajax_timeout, delay=0.1, message="wait for ajax", quiet=True,
         silent_failure=True)
+    return round_trips[0]
+
+
+def _wait_for_ajax_async():
+    """Waits for ajax using a single asynchronous script, see :py:data:`cfme.js.wait_for_quiescence`
+
+    Returns: Number of calls made to the browser or ``None`` if the script could not be used and
+        :py:func:`_wait_for_ajax_polling` has to be used instead.
+    """
+    round_trips = 0
+    timeout = _thread_local.ajax_timeout
+    b = browser()
+    # The script timeout needs to be set only when it changes
+    if getattr(_thread_local, "script_timeout", None) != (b, timeout):
+        round_trips += 1
+        b.set_script_timeout(timeout + 5)
+        _thread_local.script_timeout = (b, timeout)
+    round_trips += 1
+    try:
+        state = b.execute_async_script(js.wait_for_quiescence, int(timeout * 1000))
+    except UnexpectedAlertPresentException:
+        raise
+    except Exception as e:
+        # Eg. the page got unloaded while the script was waiting, let the polling deal with it
+        logger.trace('Asynchronous ajax wait failed, falling back to polling: {}'.format(str(e)))
+        return None
+    if state is None:
+        # Non-cfme page (proxy error, ...), should be handled by something else
+        element_cache.update_generation(None)
+        return round_trips
+    element_cache.update_generation(state.pop("dom", None))
+    if not state.pop("quiet"):
+        logger.trace('Ajax still running after {} seconds: {}'.format(
+            timeout, ', '.join(["{}: {}".format(k, str(v)) for k, v in state.iteritems()])))
+    return round_trips
+
+
+def wait_for_ajax():
+    """
+    Waits until all ajax timers are complete, in other words, waits until there are no
+    more pending ajax requests, page load should be finished completely.
+
+    By default it waits using a single asynchronous script call which returns when the page
+    gets quiet. If that is not possible or it was disabled by ``--ajax-wait-polling``, the page
+    state is polled every 100ms. The time taken and the number of calls made to the browser are
+    written to the perf log.
+
+    Raises:
+        TimedOutError: when ajax did not load in time
+    """
+    start = time()
+    round_trips = None
+    mode = "polling"
+    if ajax_wait_async:
+        round_trips = _wait_for_ajax_async()
+        if round_trips is not None:
+            mode = "async"
+    if round_trips is None:
+        round_trips = _wait_for_ajax_polling()
+    perflog.logger.info(
+        'wait_for_ajax (%s) took %f seconds, %d round trips', mode, time() - start, round_trips)
 
     # If we are not supposed to take page screenshots...well...then...dont.
     if store.config and not store.config.getvalue('page_screenshots'):
@@ -385,6 +568,7 @@ def is_displayed(loc, _deep=0, **kwargs):
         CFMEExceptionOccured: When there is a CFME rails exception on the page.
     """
     move_to = kwargs.pop("move_to", False)
+    e = None
     try:
         if move_to:
             e = move_to_element(loc, **kwargs)
@@ -394,6 +578,9 @@ def is_displayed(loc, _deep=0, **kwargs):
     except (NoSuchElementException, exceptions.CannotScrollException):
         return False
     except StaleElementReferenceException:
+        # Drop the dead element, so the next try looks it up again
+        if e is None or not element_cache.evict(e):
+            element_cache.invalidate('stale element')
         # It can happen sometimes that the change will happen between element lookup and visibility
         # check. Then StaleElementReferenceException happens. We give it two additional tries.
         # One regular. And one if something really bad happens. We don't check WebElements as it has
@@ -589,7 +776,15 @@ def move_to_element(loc, **kwargs):
     brand = "//div[@id='page_header_div']//div[contains(@class, 'brand')]"
     wait_for_ajax()
     el = element(loc, **kwargs)
-    if el.tag_name == "option":
+    try:
+        tag_name = el.tag_name
+    except StaleElementReferenceException:
+        if not element_cache.evict(el):
+            raise
+        # The element came from the cache and is gone, look it up again
+        el = element(loc, **kwargs)
+        tag_name = el.tag_name
+    if tag_name == "option":
         # Instead of option, let's move on its parent <select> if possible
         parent = element("..", root=el)
         if parent.tag_name == "select":
@@ -818,6 +1013,7 @@ def get(url):
     Args:
         url: URL to navigate to.
     """
+    element_cache.invalidate('navigation')
     return browser().get(url)
 
 
@@ -825,6 +1021,7 @@ def refresh():
     """
     Refreshes the current browser window.
     """
+    element_cache.invalidate('navigation')
     browser().refresh()
 
 
@@ -10,19 +10,155 @@ function xpath(root, xpath) {
 }
 """
 
-in_flight = """
+# Reports the state of the page related to ajax. Needs jQuery, otherwise throws an exception.
+_ajax_state = """
 function isHidden(el) {if(el === null) return true; return el.offsetParent === null;}
 
-return {
-    jquery: jQuery.active,
-    prototype: (typeof Ajax === "undefined") ? 0 : Ajax.activeRequestCount,
-    miq: window.miqAjaxTimers,
-    spinner: (!isHidden(document.getElementById("spinner_div")))
-        && isHidden(document.getElementById("lightbox_div")),
-    document: document.readyState
-};
+function domGeneration() {
+    if(typeof window.cfmeDomGeneration === "undefined") {
+        window.cfmeDomGeneration = 0;
+        window.cfmePageId = (new Date()).getTime() + "-" + Math.random();
+        if(typeof MutationObserver !== "undefined") {
+            new MutationObserver(function() { window.cfmeDomGeneration++; }).observe(
+                document, {childList: true, subtree: true, attributes: true, characterData: true});
+        } else {
+            // Without the observer we cannot tell, so every check is a new generation
+            return window.cfmePageId + "-" + (new Date()).getTime();
+        }
+    }
+    return window.cfmePageId + "-" + window.cfmeDomGeneration;
+}
+
+function ajaxState() {
+    return {
+        dom: domGeneration(),
+        jquery: jQuery.active,
+        prototype: (typeof Ajax === "undefined") ? 0 : Ajax.activeRequestCount,
+        miq: window.miqAjaxTimers,
+        spinner: (!isHidden(document.getElementById("spinner_div")))
+            && isHidden(document.getElementById("lightbox_div")),
+        document: document.readyState
+    };
+}
 """
 
+in_flight = _ajax_state + """
+return ajaxState();
+"""
+
+# Asynchronous script that finishes once there is nothing in flight on the page.
+# On the first call on a page it installs a hook that gets notified by jQuery, prototype and the
+# document when a request or the page load finishes. The state is also checked every 50ms on
+# the page side to catch the spinner.
+# Expects: arguments[0] = timeout in ms
+# Returns: The ajaxState() with added key ``quiet`` (false on timeout) or null if no jQuery is
+#          present (not a CFME page).
+wait_for_quiescence = _ajax_state + """
+function installHook() {
+    if(typeof window.cfmeAjaxHook !== "undefined")
+        return window.cfmeAjaxHook;
+    var hook = {listeners: []};
+    hook.notify = function() {
+        // Let the libraries update their counters before checking
+        setTimeout(function() {
+            var listeners = hook.listeners.slice();
+            for(var i = 0; i < listeners.length; i++)
+                listeners[i]();
+        }, 0);
+    };
+    jQuery(document).ajaxComplete(hook.notify).ajaxStop(hook.notify);
+    if(typeof Ajax !== "undefined" && typeof Ajax.Responders !== "undefined")
+        Ajax.Responders.register({onComplete: hook.notify});
+    document.addEventListener("readystatechange", hook.notify);
+    window.cfmeAjaxHook = hook;
+    return hook;
+}
+
+var timeout = arguments[0];
+var done = arguments[arguments.length - 1];
+if(typeof jQuery === "undefined") {
+    done(null);
+} else {
+    var hook = installHook();
+    var start = (new Date()).getTime();
+    var finished = false;
+    var listener = function() { check(false); };
+
+    function check(reschedule) {
+        if(finished)
+            return;
+        var state = ajaxState();
+        var quiet = state.jquery == 0 && state.prototype == 0 && !state.spinner
+            && state.document == "complete";
+        if(quiet || ((new Date()).getTime() - start) >= timeout) {
+            finished = true;
+            hook.listeners.splice(hook.listeners.indexOf(listener), 1);
+            state.quiet = quiet;
+            done(state);
+        } else if(reschedule) {
+            setTimeout(function() { check(true); }, 50);
+        }
+    }
+
+    hook.listeners.push(listener);
+    check(true);
+}
+"""
+
+# Reads a whole table in one go so the Table does not have to ask for each cell separately.
+# Expects: arguments[0] = header row element, arguments[1] = body element,
+#          arguments[2] = body offset
+# The ``position`` of a row is its 1-based xpath index among the ``tr`` children of the body.
+table_snapshot = jsmin("""\
+function cell_text(el) {
+    var text = (typeof el.innerText === "undefined") ? el.textContent : el.innerText;
+    return (text === null) ? "" : text.replace(/^\\s+|\\s+$/g, "");
+}
+
+function child_cells(el, tags) {
+    var result = new Array();
+    for(var i = 0; i < el.children.length; i++) {
+        var child = el.children[i];
+        if(tags.indexOf(child.tagName.toLowerCase()) !== -1)
+            result.push(cell_text(child));
+    }
+    return result;
+}
+
+function table_snapshot(header_row, body, body_offset) {
+    var headers = (header_row === null) ? [] : child_cells(header_row, ["td", "th"]);
+    var rows = new Array();
+    var position = 0;
+    for(var i = 0; i < body.children.length; i++) {
+        var child = body.children[i];
+        if(child.tagName.toLowerCase() !== "tr")
+            continue;
+        position++;
+        if(position <= body_offset)
+            continue;
+        rows.push({position: position, cells: child_cells(child, ["td"])});
+    }
+    return {headers: headers, rows: rows};
+}
+
+return table_snapshot(arguments[0], arguments[1], arguments[2]);
+""")
+
+# Reads the titles of all Quadicons on the page in one go.
+# Returns: list of the titles, in the order of the page.
+quadicon_titles = jsmin("""\
+var result = new Array();
+var nt = XPathResult.ORDERED_NODE_SNAPSHOT_TYPE;
+var links = document.evaluate(
+    "//div[@id='quadicon']/../../../tr/td/a", document, null, nt, null);
+for(var i = 0; i < links.snapshotLength; i++) {
+    var link = links.snapshotItem(i);
+    var title = link.getAttribute("title");
+    result.push((title === null) ? link.getAttribute("data-original-title") : title);
+}
+return result;
+""")
+
 update_retirement_date_function_script = """\
 function updateDate(newValue) {
     if(typeof $j == "undefined") {
@@ -77,6 +213,21 @@ function get_root(loc) {
 }
 """
 
+# Returns a stamp identifying the instance of the tree. It is stored in the dynatree root, so it
+# changes when the tree gets rebuilt or the page is reloaded. Needs get_root.
+_tree_stamp = """\
+function tree_stamp(loc) {
+    var root = get_root(loc);
+    if(root === null)
+        return null;
+    if(typeof root.cfmeStamp === "undefined")
+        root.cfmeStamp = (new Date()).getTime() + "-" + Math.random();
+    return root.cfmeStamp;
+}
+"""
+
+tree_stamp = jsmin(_tree_get_root + _tree_stamp)
+
 # This function is used to DRY the decision on which text to match
 _get_level_name = xpath + """\
 function get_level_name(level, by_id) {
@@ -101,7 +252,7 @@ function expandable(el) {
 
 # This function reads whole tree. If it faces an ajax load, it returns false.
 # If it does not return false, the result is complete.
-read_tree = jsmin(_tree_get_root + _get_level_name + _expandable + """\
+read_tree = jsmin(_tree_get_root + _tree_stamp + _get_level_name + _expandable + """\
 function read_tree(root, read_id, _root_tree) {
     if(read_id === undefined)
         read_id = false;
@@ -167,7 +318,7 @@ function read_tree(root, read_id, _root_tree) {
 
 # This function searches for specified node by path. If it faces an ajax load, it returns false.
 # If it does not return false, the result is complete.
-find_leaf = jsmin(_tree_get_root + _get_level_name + _expandable + """\
+find_leaf = jsmin(_tree_get_root + _tree_stamp + _get_level_name + _expandable + """\
 function find_leaf(root, path, by_id) {
     if(path.length == 0)
         return null;
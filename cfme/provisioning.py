@@ -22,7 +22,7 @@ submit_button = form_buttons.FormButton("Submit")
 
 template_select_form = ui.Form(
     fields=[
-        ('template_table', ui.Table('//div[@id="pre_prov_div"]//table')),
+        ('template_table', ui.Table('//div[@id="pre_prov_div"]//table', snapshot=True)),
         ('cancel_button', form_buttons.cancel)
     ]
 )
@@ -256,23 +256,13 @@ def do_vm_provisioning(template_name, provider, vm_name, provisioning_data, requ
          "5.3": 'Vm Provisioned Successfully', })
 
     # Wait for e-mails to appear
-    def verify():
-        if current_version() >= "5.4":
-            approval = dict(subject_like="%%Your Virtual Machine configuration was Approved%%")
-        else:
-            approval = dict(text_like="%%Your Virtual Machine Request was approved%%")
-        return (
-            len(
-                smtp_test.get_emails(**approval)
-            ) > 0
-            and len(
-                smtp_test.get_emails(
-                    subject_like="Your virtual machine request has Completed - VM:%%%s" % vm_name
-                )
-            ) > 0
-        )
-
-    wait_for(verify, message="email receive check", delay=5)
+    if current_version() >= "5.4":
+        approval = dict(subject_like="%%Your Virtual Machine configuration was Approved%%")
+    else:
+        approval = dict(text_like="%%Your Virtual Machine Request was approved%%")
+    smtp_test.wait_for_emails(timeout=120, **approval)
+    smtp_test.wait_for_emails(
+        timeout=120, subject_like="Your virtual machine request has Completed - VM:%%%s" % vm_name)
 
 
 def copy_request(cells, modifications):
@@ -17,7 +17,7 @@ dynamic_tree = Tree("//div[@id='basic_info_div']//ul[@class='dynatree-container'
 
 template_select_form = Form(
     fields=[
-        ('template_table', Table('//div[@id="prov_vm_div"]/table')),
+        ('template_table', Table('//div[@id="prov_vm_div"]/table', snapshot=True)),
         ('add_button', form_buttons.add),
         ('cancel_button', form_buttons.cancel)
     ]
@@ -1,5 +1,4 @@
 from cfme.configure import configuration
-from utils.wait import wait_for
 
 
 def test_send_test_email(smtp_test, random_string):
@@ -8,4 +7,4 @@ def test_send_test_email(smtp_test, random_string):
     """
     e_mail = random_string + "@email.test"
     configuration.SMTPSettings.send_test_email(e_mail)
-    wait_for(lambda: len(smtp_test.get_emails(to_address=e_mail)) > 0, num_sec=60)
+    smtp_test.wait_for_emails(to_address=e_mail, timeout=60)
@@ -180,12 +180,6 @@ def test_host_provisioning(setup_provider, cfme_data, host_provisioning, provide
     assert set(requested_ds).issubset(datastores), 'Datastores are missing some members'
 
     # Wait for e-mails to appear
-    def verify():
-        return len(
-            smtp_test.get_emails(
-                subject_like="Your host provisioning request has Completed - Host:%%%s" %
-                prov_host_name
-            )
-        ) > 0
-
-    wait_for(verify, message="email receive check", delay=5)
+    smtp_test.wait_for_emails(
+        timeout=120,
+        subject_like="Your host provisioning request has Completed - Host:%%%s" % prov_host_name)
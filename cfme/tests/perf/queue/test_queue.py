@@ -41,13 +41,15 @@ def test_queue_infrastructure(request, ssh_client, enable_candu):
     request.addfinalizer(lambda: clean_up_log_files([local_evm, local_evm_gz, local_top,
         local_top_gz]))
 
+    # Older rotated logs are not needed, the time is taken from the appliance
+    since = int(ssh_client.run_command('date +%s').output.strip())
     sleep_time = perf_tests['test_queue']['infra_time']
 
     logger.info('Waiting: {}'.format(sleep_time))
     time.sleep(sleep_time)
 
-    collect_log(ssh_client, 'evm', local_evm_gz)
-    collect_log(ssh_client, 'top_output', local_top_gz, strip_whitespace=True)
+    collect_log(ssh_client, 'evm', local_evm_gz, since=since)
+    collect_log(ssh_client, 'top_output', local_top_gz, strip_whitespace=True, since=since)
 
     logger.info('Calling gunzip {}'.format(local_evm_gz))
     subprocess.call(['gunzip', local_evm_gz])
@@ -51,6 +51,7 @@
 import os
 import re
 import types
+from copy import deepcopy
 from datetime import date
 from collections import Sequence, Mapping, Callable
 from xml.sax.saxutils import quoteattr
@@ -196,6 +197,9 @@ class Table(Pretty):
         body_offset: In the case of a padding table row above the body rows, the row offset
             can be used to skip rows in ``<ttbody>`` to locate the correct header row. This offset
             is 1-indexed, not 0-indexed, so an offset of 1 is the first child row element
+        snapshot: If ``True``, :py:meth:`rows` and the row finders read the whole table with
+            a single javascript call (see :py:meth:`snapshot`) instead of resolving every row
+            and cell separately. Default ``False``.
 
     Attributes:
         header_indexes: A dict of header names related to their int index as a column.
@@ -258,6 +262,14 @@ class Table(Pretty):
         * :py:meth:`click_rows_by_cells`
         * :py:meth:`click_row_by_cells`
 
+    Big tables (eg. lists of hundreds of VMs) are best read in the snapshot mode. The header and
+    cell texts of the whole table are then pulled with one javascript call and the rows are built
+    from that data. The ``WebElement`` of a row or a cell is only looked up when it is needed,
+    eg. for clicking it::
+
+        table = Table('//div[@id="list_grid"]/table', snapshot=True)
+        table.click_row_by_cells({'Name': 'Mike'}, 'Animal')
+
     Note:
 
         A table is defined by the containers of the header and data areas, and offsets to them.
@@ -268,12 +280,13 @@ class Table(Pretty):
 
     pretty_attrs = ['_loc']
 
-    def __init__(self, table_locator, header_offset=0, body_offset=0):
+    def __init__(self, table_locator, header_offset=0, body_offset=0, snapshot=False):
         self._headers = None
         self._header_indexes = None
         self._loc = table_locator
         self.header_offset = int(header_offset)
         self.body_offset = int(body_offset)
+        self.snapshot_mode = snapshot
 
     @property
     def header_row(self):
@@ -349,6 +362,10 @@ class Table(Pretty):
         Yields:
             :py:class:`Table.Row` object corresponding to the next row in the table.
         """
+        if self.snapshot_mode:
+            for row in self.snapshot():
+                yield row
+            return
         index = self.body_offset
         row_elements = sel.elements('tr', root=self.body)
         for row_element in row_elements[index:]:
@@ -405,6 +422,8 @@ class Table(Pretty):
         """
         # accept dicts or supertuples
         cells = dict(cells)
+        if self.snapshot_mode:
+            return self._filter_rows(self.snapshot(), cells, partial_check)
         cell_text_loc = (
             './/td/descendant-or-self::*[contains(normalize-space(text()), "%s")]/ancestor::tr[1]')
         matching_rows_list = list()
@@ -430,6 +449,19 @@ class Table(Pretty):
         rows = [self.create_row_from_element(element) for element in rows_elements]
 
         # Only include rows where the expected values are in the right columns
+        return self._filter_rows(rows, cells, partial_check)
+
+    @staticmethod
+    def _filter_rows(rows, cells, partial_check=False):
+        """Filters the rows, leaving only those whose cells match all of the ``cells``
+
+        Args:
+            rows: An iterable of :py:class:`Table.Row` objects.
+            cells: A dict of ``header: value`` pairs.
+            partial_check: If ``True``, the value only has to be contained in the cell text.
+
+        Returns: A list of matching :py:class:`Table.Row` objects.
+        """
         matching_rows = list()
         if partial_check:
             matching_row_filter = lambda heading, value: value in row[heading].text
@@ -500,6 +532,21 @@ class Table(Pretty):
         """
         return Table.Row(row_element, self)
 
+    def snapshot(self):
+        """Reads the whole table using a single javascript call.
+
+        The header texts are used to refresh :py:attr:`header_indexes`, so the returned rows can
+        be accessed by the header names as usual.
+
+        Returns: A list of :py:class:`Table.SnapshotRow` objects, one for each body row.
+        """
+        data = sel.execute_script(js.table_snapshot, self.header_row, self.body, self.body_offset)
+        self._header_indexes = {
+            self._convert_header(header): index
+            for index, header in enumerate(data["headers"])}
+        return [
+            Table.SnapshotRow(row["position"], row["cells"], self) for row in data["rows"]]
+
     def click_cells(self, cell_map):
         """Submits multiple cells to be clicked on
 
@@ -608,6 +655,65 @@ class Table(Pretty):
             # table.create_row_from_element(row_instance) might actually work...
             return sel.move_to_element(self.row_element)
 
+    class SnapshotRow(Row):
+        """A :py:class:`Table.Row` built from the data read by :py:meth:`Table.snapshot`.
+
+        The cell texts are held in memory, so reading them does not cost any selenium calls.
+        The row element is looked up only when it is really needed (clicking, checkboxes, ...).
+
+        Args:
+            position: 1-based position of the row among the ``<tr>`` elements of the body.
+            cell_texts: List of texts of the row's ``<td>`` elements.
+            parent_table: :py:class:`Table` this row was read from.
+        """
+        pretty_attrs = ['position', 'table']
+
+        def __init__(self, position, cell_texts, parent_table):
+            self.table = parent_table
+            self.position = position
+            self._columns = [
+                Table.SnapshotCell(self, index, text) for index, text in enumerate(cell_texts)]
+
+        @property
+        def row_element(self):
+            """The ``<tr>`` WebElement of this row, looked up on each access"""
+            return sel.element('tr[%d]' % self.position, root=self.table.body)
+
+        @property
+        def columns(self):
+            """A list of :py:class:`Table.SnapshotCell` objects in this row"""
+            return self._columns
+
+        def __eq__(self, other):
+            if isinstance(other, type(self)):
+                return self.table is other.table and self.position == other.position
+            else:
+                return id(self) == id(other)
+
+    class SnapshotCell(Pretty):
+        """A cell of a :py:class:`Table.SnapshotRow`
+
+        Has the ``text`` attribute like a WebElement does and it can be passed to any
+        :py:mod:`cfme.fixtures.pytest_selenium` function, which will locate the ``<td>`` lazily.
+
+        Args:
+            row: :py:class:`Table.SnapshotRow` containing this cell.
+            index: 0-based index of the cell in the row.
+            text: Text of the cell.
+        """
+        pretty_attrs = ['row', 'index', 'text']
+
+        def __init__(self, row, index, text):
+            self.row = row
+            self.index = index
+            self.text = text
+
+        def __str__(self):
+            return self.text
+
+        def locate(self):
+            return sel.element('td[%d]' % (self.index + 1), root=self.row.row_element)
+
 
 class SplitTable(Table):
     """:py:class:`Table` that supports the header and body rows being in separate tables
@@ -621,6 +727,7 @@ class SplitTable(Table):
             These point to the container of the body rows. The offset is used in case
             there is a padding row above the body rows, or in the case that the header
             and the body are contained inside the same table element.
+        snapshot: See :py:class:`cfme.web_ui.Table`
 
     Usage:
 
@@ -664,7 +771,7 @@ class SplitTable(Table):
     tables require an offset for both the heading and body rows.
 
     """
-    def __init__(self, header_data, body_data):
+    def __init__(self, header_data, body_data, snapshot=False):
         self._headers = None
         self._header_indexes = None
 
@@ -672,6 +779,7 @@ class SplitTable(Table):
         self._body_loc, body_offset = body_data
         self.header_offset = int(header_offset)
         self.body_offset = int(body_offset)
+        self.snapshot_mode = snapshot
 
     @property
     def _root_loc(self):
@@ -788,12 +896,14 @@ class CheckboxTable(Table):
         body_checkbox_locator: Locator for checkboxes in body rows
         header_offset: See :py:class:`cfme.web_ui.Table`
         body_offset: See :py:class:`cfme.web_ui.Table`
+        snapshot: See :py:class:`cfme.web_ui.Table`
     """
     _checkbox_loc = ".//input[@type='checkbox']"
 
     def __init__(self, table_locator, header_offset=0, body_offset=0,
-            header_checkbox_locator=None, body_checkbox_locator=None):
-        super(CheckboxTable, self).__init__(table_locator, header_offset, body_offset)
+            header_checkbox_locator=None, body_checkbox_locator=None, snapshot=False):
+        super(CheckboxTable, self).__init__(
+            table_locator, header_offset, body_offset, snapshot=snapshot)
         if body_checkbox_locator:
             self._checkbox_loc = body_checkbox_locator
         self._header_checkbox_loc = header_checkbox_locator
@@ -973,13 +1083,14 @@ class SplitCheckboxTable(SplitTable, CheckboxTable):
         body_checkbox_locator: See :py:class:`cfme.web_ui.CheckboxTable`
         header_offset: See :py:class:`cfme.web_ui.Table`
         body_offset: See :py:class:`cfme.web_ui.Table`
+        snapshot: See :py:class:`cfme.web_ui.Table`
     """
     _checkbox_loc = './/img[contains(@src, "item_chk")]'
 
     def __init__(self, header_data, body_data,
-            header_checkbox_locator=None, body_checkbox_locator=None):
+            header_checkbox_locator=None, body_checkbox_locator=None, snapshot=False):
         # To limit multiple inheritance surprises, explicitly call out to SplitTable's __init__
-        SplitTable.__init__(self, header_data, body_data)
+        SplitTable.__init__(self, header_data, body_data, snapshot=snapshot)
 
         # ...then set up CheckboxTable's locators here
         self._header_checkbox_loc = header_checkbox_locator
@@ -1446,9 +1557,16 @@ class Tree(Pretty):
 
     Note: Dynatrees, rely on a ``<ul><li>`` setup. We class a ``<li>`` as a node.
 
+    The contents read by :py:meth:`read_contents` and the paths exposed by :py:meth:`expand_path`
+    are cached per tree id until the tree is rebuilt in the browser, see :py:meth:`invalidate`.
+
     """
     pretty_attrs = ['locator']
 
+    # tree_id -> {"stamp": ..., "contents": {by_id: tree}, "index": {by_id: [path, ...]},
+    #             "paths": {by_id: [path, ...]}}
+    _cache = {}
+
     def __init__(self, locator):
         self.locator = locator
 
@@ -1489,7 +1607,33 @@ class Tree(Pretty):
             self.tag = sel.tag(self)
         return self.tag
 
+    @classmethod
+    def invalidate(cls, tree_id=None):
+        """Drops the cached contents of the tree with given id or of all trees."""
+        if tree_id is None:
+            Tree._cache.clear()
+        else:
+            Tree._cache.pop(tree_id, None)
+
+    def _stamp(self):
+        return sel.execute_script(
+            "{} return tree_stamp(arguments[0]);".format(js.tree_stamp), self.locate())
+
+    def _cache_entry(self, stamp):
+        entry = Tree._cache.get(self.tree_id)
+        if entry is None or entry["stamp"] != stamp:
+            entry = {"stamp": stamp, "contents": {}, "index": {}, "paths": {}}
+            if stamp is not None:
+                Tree._cache[self.tree_id] = entry
+        return entry
+
     def read_contents(self, by_id=False):
+        # A copy, so the caller cannot change the cached contents
+        return deepcopy(self._read_contents(self._cache_entry(self._stamp()), by_id))
+
+    def _read_contents(self, entry, by_id):
+        if by_id in entry["contents"]:
+            return entry["contents"][by_id]
         result = False
         while result is False:
             sel.wait_for_ajax()
@@ -1497,8 +1641,26 @@ class Tree(Pretty):
                 "{} return read_tree(arguments[0], arguments[1]);".format(js.read_tree),
                 self.locate(),
                 by_id)
+        entry["contents"][by_id] = result
         return result
 
+    def _index(self, entry, by_id):
+        """Returns the paths to all the nodes of the tree, in the order they are in the tree."""
+        if by_id not in entry["index"]:
+            contents = self._read_contents(entry, by_id)
+            paths = []
+
+            def _walk(tree, path):
+                for item in tree or []:
+                    if isinstance(item, list):
+                        paths.append(path + [item[0]])
+                        _walk(item[1], path + [item[0]])
+                    else:
+                        paths.append(path + [item])
+            _walk(contents, [])
+            entry["index"][by_id] = paths
+        return entry["index"][by_id]
+
     def expand_path(self, *path, **kwargs):
         """ Exposes a path.
 
@@ -1522,7 +1684,8 @@ class Tree(Pretty):
             sel.wait_for_ajax()
             try:
                 result = sel.execute_script(
-                    "{} return find_leaf(arguments[0],arguments[1],arguments[2]);".format(
+                    "{} var leaf = find_leaf(arguments[0],arguments[1],arguments[2]); "
+                    "return (leaf === false) ? false : [leaf, tree_stamp(arguments[0])];".format(
                         js.find_leaf),
                     self.locate(),
                     path,
@@ -1532,6 +1695,7 @@ class Tree(Pretty):
                 match = re.search(r"TREEITEM /(.*?)/ NOT FOUND IN THE TREE", text)
                 if match is not None:
                     item = match.groups()[0]
+                    self.invalidate(self.tree_id)
                     raise exceptions.CandidateNotFound(
                         {'message': "{}: could not be found in the tree.".format(item),
                          'path': path,
@@ -1543,7 +1707,13 @@ class Tree(Pretty):
                         "Tree {} / {} not found.".format(tree_id, self.locator))
                 # Otherwise ...
                 raise
-        return result
+        leaf, stamp = result
+        if path:
+            # Remember the exposed path so find_path_to can check the cached contents have it
+            known = self._cache_entry(stamp)["paths"].setdefault(by_id, [])
+            if list(path) not in known:
+                known.append(list(path))
+        return leaf
 
     def click_path(self, *path, **kwargs):
         """ Exposes a path and then clicks it.
@@ -1610,43 +1780,36 @@ class Tree(Pretty):
         """
         return map(lambda item: item[0] if isinstance(item, list) else item, tree)
 
-    def find_path_to(self, target):
+    def find_path_to(self, target, by_id=False):
         """ Method used to look up the exact path to an item we know only by its regexp or partial
         description.
 
-        Expands whole tree during the execution.
+        The whole tree is expanded and read once, then it is cached. The first match in the
+        order of the tree is returned. The cached contents are read again if they lack a path
+        exposed by :py:meth:`expand_path` since.
 
         Args:
             target: Item searched for. Can be regexp made by
                 :py:func:`re.compile <python:re.compile>`,
                 otherwise it is taken as a string for `in` matching.
+            by_id: Whether to match ids instead of text.
         Returns: :py:class:`list` with path to that item.
         """
         if not isinstance(target, re._pattern_type):
             target = re.compile(r".*?{}.*?".format(re.escape(str(target))))
 
-        def _find_in_tree(t, p=None):
-            if p is None:
-                p = []
-            for item in t:
-                if isinstance(item, list):
-                    if target.match(item[0]) is None:
-                        subtree = _find_in_tree(item[1], p + [item[0]])
-                        if subtree is not None:
-                            return subtree
-                    else:
-                        return p + [item[0]]
-                else:
-                    if target.match(item) is not None:
-                        return p + [item]
-            else:
-                return None
+        entry = self._cache_entry(self._stamp())
+        if by_id in entry["index"]:
+            indexed = set(map(tuple, entry["index"][by_id]))
+            if any(tuple(path) not in indexed for path in entry["paths"].get(by_id, [])):
+                # Nodes were loaded since the tree was read
+                entry["contents"].pop(by_id, None)
+                entry["index"].pop(by_id, None)
 
-        result = _find_in_tree(self.read_contents())
-        if result is None:
-            raise NameError("{} not found in tree".format(target.pattern))
-        else:
-            return result
+        for path in self._index(entry, by_id):
+            if target.match(path[-1]) is not None:
+                return list(path)
+        raise NameError("{} not found in tree".format(target.pattern))
 
 
 class CheckboxTree(Tree):
@@ -2139,22 +2302,26 @@ class Quadicon(Pretty):
             return sel.get_attribute(el, "data-original-title")
 
     @classmethod
-    def all(cls, qtype=None, this_page=False):
+    def all(cls, qtype=None, this_page=False, maximize=False):
         """Allows iteration over Quadicons.
 
         Args:
             qtype: Quadicon type. Refer to the constructor for reference.
             this_page: Whether to look for Quadicons only on current page (do not list pages).
+            maximize: Whether to switch to the maximum number of results per page first, so there
+                are fewer pages to go through. The setting stays changed afterwards.
         Returns: :py:class:`list` of :py:class:`Quadicon`
         """
         from cfme.web_ui import paginator  # Prevent circular imports
         if this_page:
             pages = (None, )  # Single, current page. Since we dont care about the value, using None
         else:
+            if maximize:
+                paginator.maximize_results_per_page()
             pages = paginator.pages()
         for page in pages:
-            for href in sel.elements("//div[@id='quadicon']/../../../tr/td/a"):
-                yield cls(cls._get_title(href), qtype)
+            for title in paginator.page_titles():
+                yield cls(title, qtype)
 
     @classmethod
     def first(cls, qtype=None):
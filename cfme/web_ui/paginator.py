@@ -1,4 +1,5 @@
 """A set of functions for dealing with the paginator controls."""
+from cfme import js
 from cfme.web_ui import Select, Input, AngularSelect
 import cfme.fixtures.pytest_selenium as sel
 import re
@@ -16,6 +17,8 @@ _sort_by = '//select[@id="sort_choice"]'
 _page_cell = '//td//td[contains(., " of ")]|//li//span[contains(., " of ")]'
 _check_all = Input("masterToggle")
 
+MAX_RESULTS_PER_PAGE = 1000
+
 
 def page_controls_exist():
     """ Simple check to see if page controls exist. """
@@ -172,3 +175,34 @@ def click_element(el):
     """Advance the page until the given element is displayed, and click it"""
     find_element(el)
     sel.click(el)
+
+
+def maximize_results_per_page():
+    """Shows the maximum number of results on a page, unless all of them are shown already.
+
+    Does nothing in 5.5.0.9, where changing the number of results per page causes issues.
+    """
+    if version.current_version() == "5.5.0.9":
+        return
+    if page_controls_exist() and rec_end() != rec_total():
+        results_per_page(MAX_RESULTS_PER_PAGE)
+
+
+def page_titles():
+    """Returns the titles of all Quadicons on the current page, read by a single script call."""
+    return sel.execute_script(js.quadicon_titles)
+
+
+def find_title(title, maximize=True):
+    """Advance the pages until the Quadicon with the given title is displayed.
+
+    Every page is checked by reading all its titles with a single script call. With the maximum
+    number of results per page, the whole list is usually a single page.
+
+    Args:
+        title: Title of the Quadicon.
+        maximize: Whether to switch to the maximum number of results per page first.
+    """
+    if maximize:
+        maximize_results_per_page()
+    find(lambda: title in page_titles())
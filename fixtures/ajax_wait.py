@@ -0,0 +1,16 @@
+"""Plugin controlling how :py:func:`cfme.fixtures.pytest_selenium.wait_for_ajax` waits
+
+By default a single asynchronous script call waits until the page is quiet. The
+``--ajax-wait-polling`` option switches back to polling the page state every 100ms.
+"""
+from cfme.fixtures import pytest_selenium as sel
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('cfme')
+    group.addoption('--ajax-wait-polling', dest='ajax_wait_polling', action='store_true',
+        default=False, help="Wait for ajax by polling the page instead of an asynchronous script")
+
+
+def pytest_configure(config):
+    sel.ajax_wait_async = not config.getvalue('ajax_wait_polling')
@@ -63,21 +63,21 @@ def pytest_addoption(parser):
 
 @pytest.mark.trylast
 def pytest_collection_modifyitems(session, config, items):
+    # Fetch all the blockers of the collected tests in bulk, so resolving them does not go to
+    # Bugzilla or GitHub one by one. They are also stored on the disk for the slaves.
+    all_blockers = []
+    for item in items:
+        all_blockers.extend(item._metadata.get("blockers", []))
+    if all_blockers:
+        Blocker.prefetch_all(all_blockers)
     if not config.getvalue("list_blockers"):
         return
     store.terminalreporter.write("Loading blockers ...\n", bold=True)
     blocking = set([])
-    for item in items:
-        if "blockers" not in item._metadata:
-            continue
-        for blocker in item._metadata["blockers"]:
-            if isinstance(blocker, int):
-                # TODO: DRY
-                blocker_object = Blocker.parse("BZ#{}".format(blocker))
-            else:
-                blocker_object = Blocker.parse(blocker)
-            if blocker_object.blocks:
-                blocking.add(blocker_object)
+    for blocker in all_blockers:
+        blocker_object = Blocker.parse(blocker)
+        if blocker_object.blocks:
+            blocking.add(blocker_object)
     if blocking:
         store.terminalreporter.write("Known blockers:\n", bold=True)
         for blocker in blocking:
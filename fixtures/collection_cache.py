@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Persistent cache of the provider selection done by :py:mod:`utils.testgen` during collection.
+
+Deciding which providers a test is parametrized with means creating the CRUD objects of all
+providers, checking the appliance version and the test flags, for every test. The decisions are
+stored in the ``collection`` :py:class:`utils.disk_cache.DiskCache` under a key made of:
+
+- the contents of the Python files of the project (tests, fixtures, markers, ...)
+- the provider related parts of ``cfme_data`` (``management_systems`` and ``test_flags``)
+- the command line arguments
+- the appliance version
+
+so a run with the same key only rebuilds the parameters of the selected providers. The master of
+a parallelized run passes its key to the slaves in ``slave_config``, so the slaves reuse what the
+master has just collected instead of doing the work again.
+
+The ``--no-collection-cache`` option turns it off.
+"""
+import hashlib
+import json
+import os
+import sys
+
+from fixtures.pytest_store import store
+from utils import conf, version
+from utils.disk_cache import DiskCache
+from utils.log import logger
+from utils.path import project_path
+
+CACHE_TTL = 7 * 24 * 3600
+# Where the Python files whose changes invalidate the cache are
+SOURCE_DIRS = ("cfme", "fixtures", "markers", "metaplugins", "utils")
+
+
+def _source_files():
+    yield project_path.join("conftest.py").strpath
+    for source_dir in SOURCE_DIRS:
+        for root, dirs, files in os.walk(project_path.join(source_dir).strpath):
+            dirs.sort()
+            for file_name in sorted(files):
+                if file_name.endswith(".py"):
+                    yield os.path.join(root, file_name)
+
+
+def compute_key(args):
+    """Computes the cache key of the run with the command line ``args``."""
+    digest = hashlib.sha1()
+    for file_name in _source_files():
+        digest.update(file_name)
+        with open(file_name, "rb") as f:
+            digest.update(f.read())
+    cfme_data = conf.cfme_data
+    digest.update(json.dumps(
+        [cfme_data.get("management_systems", {}), cfme_data.get("test_flags", "")],
+        sort_keys=True, default=str))
+    digest.update(json.dumps(list(args)))
+    try:
+        digest.update(str(version.current_version()))
+    except Exception:
+        # No appliance, testgen does not know the version either
+        digest.update("no version")
+    return digest.hexdigest()
+
+
+class CollectionCache(object):
+    """Entries of one run, loaded on the first access."""
+    def __init__(self):
+        self.enabled = True
+        self.key = None
+        self._cache = DiskCache("collection", ttl=CACHE_TTL)
+        self._entries = None
+        self._changed = False
+
+    def _load(self):
+        if self._entries is None:
+            if self.key is None:
+                self.key = compute_key(sys.argv[1:])
+            self._entries = self._cache.get(self.key, {})
+            logger.info("Loaded {} collection cache entries for {}".format(
+                len(self._entries), self.key))
+        return self._entries
+
+    def get(self, entry_key):
+        if not self.enabled:
+            return None
+        return self._load().get(entry_key)
+
+    def put(self, entry_key, value):
+        if not self.enabled:
+            return
+        self._load()[entry_key] = value
+        self._changed = True
+
+    def save(self):
+        if self._changed:
+            self._cache.put(self.key, self._entries)
+            self._changed = False
+
+
+collection_cache = CollectionCache()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('cfme')
+    group.addoption('--no-collection-cache', dest='collection_cache', action='store_false',
+        default=True, help="Do not use the cached provider selection of the previous runs")
+
+
+def pytest_configure(config):
+    collection_cache.enabled = config.getvalue('collection_cache')
+    if store.parallelizer_role == 'slave':
+        # Use what the master collected
+        collection_cache.key = conf.slave_config.get('collection_cache')
+
+
+def pytest_collection_finish(session):
+    # The slaves only read the entries of the master
+    if store.parallelizer_role != 'slave':
+        collection_cache.save()
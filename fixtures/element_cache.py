@@ -0,0 +1,29 @@
+"""Plugin enabling the locator resolution cache of :py:mod:`cfme.fixtures.pytest_selenium`
+
+When enabled with ``--element-cache``, the results of ``find_elements`` calls are reused until
+the page DOM changes (see :py:class:`cfme.fixtures.pytest_selenium.ElementCache`). The number of
+cache hits, which is the number of WebDriver calls saved, is logged for every test.
+"""
+from cfme.fixtures.pytest_selenium import element_cache
+from utils.log import logger
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('cfme')
+    group.addoption('--element-cache', dest='element_cache', action='store_true', default=False,
+        help="Cache the resolved locators until the page changes")
+
+
+def pytest_configure(config):
+    element_cache.enabled = config.getvalue('element_cache')
+
+
+def pytest_runtest_setup(item):
+    element_cache.reset_stats()
+
+
+def pytest_runtest_teardown(item, nextitem):
+    if element_cache.enabled:
+        logger.info(
+            'Element cache: {hits} hits, {misses} misses, {invalidations} invalidations'.format(
+                **element_cache.stats))
@@ -25,6 +25,7 @@ Some very important tips:
 
 Usage of ``register_event`` is explained in :py:func:`register_event`.
 """
+import json
 import requests
 import signal
 import subprocess
@@ -157,6 +158,20 @@ class EventListener(object):
         logger.debug("Response: %s" % response)
         return response
 
+    def _post(self, route, data, timeout=None):
+        """ Send a JSON request to the listener
+        """
+        assert not self.finished, "Listener dead!"
+        listener_url = "%s:%d" % (self.listener_host(), self.listener_port)
+        logger.info("posting to api: %s%s" % (listener_url, route))
+        r = requests.post(
+            listener_url + route, data=json.dumps(data),
+            headers={"Content-Type": "application/json"}, timeout=timeout)
+        r.raise_for_status()
+        response = r.json()
+        logger.debug("Response: %s" % response)
+        return response
+
     def _delete_database(self):
         """ Sends a DELETE /events request for listener.
 
@@ -203,9 +218,9 @@ class EventListener(object):
         req = "/events/%s/%s?event=%s" % (self.mgmt_sys_type(sys_type, obj_type), obj, event)
         # Timespan limits
         if after:
-            req += "&from_time=%s" % datetime.strftime(after, self.TIME_FORMAT)
+            req += "&time_from=%s" % datetime.strftime(after, self.TIME_FORMAT)
         if before:
-            req += "&to_time=%s" % datetime.strftime(before, self.TIME_FORMAT)
+            req += "&time_to=%s" % datetime.strftime(before, self.TIME_FORMAT)
 
         for attempt in range(1, max_attempts + 1):
             data = self._get(req)
@@ -229,20 +244,26 @@ class EventListener(object):
     def get_all_received_events(self):
         return self._get("/events")
 
-    def check_all_expectations(self):
+    def check_all_expectations(self, timeout=0):
         """ Check whether all triggered events have been captured.
 
-        Sets a flag for each event.
+        Sets a flag for each event. All the expectations which have not arrived yet are checked by
+        a single request, the listener answers as soon as all of them have arrived or the timeout
+        passes.
 
-        Simplified to check just against the time of registration
-        and the begin of this check.
+        Simplified to check just against the time of registration.
 
+        Args:
+            timeout: How long can the listener wait for the events (in seconds).
         Returns:
             Boolean whether all events have already been captured.
 
         """
-        check_started = get_current_time_GMT()
+        pending = []
+        queries = []
         for expectation in self.expectations:
+            if expectation.arrived is not None:
+                continue
             # Get the events with the same parameters, just with different time
             the_same = [item
                         for item
@@ -258,14 +279,19 @@ class EventListener(object):
             # Get immediate predecessor's of follower's time of this event
             preceeding_event = preceeding_events[-1].time if preceeding_events else expectation.time
             # following_event = following_events[0].time if following_events else check_started
-            # Shorten the params
-            params = [expectation.sys_type,
-                      expectation.obj_type,
-                      expectation.obj,
-                      expectation.event]
-            came = self.check_db(*params, after=preceeding_event, before=check_started)
-            if came:
-                expectation.arrived = came
+            pending.append(expectation)
+            queries.append({
+                "event_type": self.mgmt_sys_type(expectation.sys_type, expectation.obj_type),
+                "resource_name": expectation.obj,
+                "event": expectation.event,
+                "time_from": datetime.strftime(preceeding_event, self.TIME_FORMAT)})
+        if queries:
+            results = self._post(
+                "/events/query", {"queries": queries, "timeout": timeout}, timeout=timeout + 30)
+            for expectation, came in zip(pending, results):
+                if came:
+                    logger.info("Event %s for %s arrived" % (expectation.event, expectation.obj))
+                    expectation.arrived = datetime.strptime(came, "%Y-%m-%d %H:%M:%S")
         return all([exp.arrived is not None for exp in self.expectations])
 
     @property
@@ -452,10 +478,10 @@ def pytest_runtest_call(item):
         if register_event.listener is None:
             return
 
-        # Event testing is enabled.
+        # Event testing is enabled. The listener holds the request until the events come.
         try:
-            wait_for(register_event.check_all_expectations,
-                     delay=5,
+            wait_for(lambda: register_event.check_all_expectations(timeout=30),
+                     delay=1,
                      num_sec=75,
                      handle_exception=True)
         except TimedOutError:
@@ -10,14 +10,17 @@ The Workflow
     if env['parallel_base_urls'] isn't set
   - if neither are set, no parallelization happens
 
-- Slaves are started
+- Slaves are started; with Sprout, as soon as the first appliance of the pool is ready, the
+  others join the run as Sprout provides them (see `Elastic slave pool`_)
 - Master runs collection, blocks until slaves report their collections
 - Slaves each run collection and submit them to the master, then block inside their runtest loop,
-  waiting for tests to run
+  waiting for tests to run. The master passes the test files it collected and the key of its
+  :py:mod:`fixtures.collection_cache` in ``slave_config``, so the slaves skip the other files and
+  reuse the provider selection of the master.
 - Master diffs slave collections against its own; the test ids are verified to match
   across all nodes
 - Master enters main runtest loop, uses a generator to build lists of test groups which are then
-  sent to slaves, one group at a time
+  assigned to slaves, longest estimated group first (see `Scheduling`_)
 - For each phase of each test, the slave serializes test reports, which are then unserialized on
   the master and handed to the normal pytest reporting hooks, which is able to deal with test
   reports arriving out of order
@@ -29,6 +32,35 @@ The Workflow
 - After all slaves are shut down, the master will do its end-of-session reporting as usual, and
   shut down
 
+Scheduling
+----------
+
+The tests are grouped by module and parametrization. Every group gets an estimated duration,
+which is the sum of the durations its tests had in the previous runs, as recorded by the
+artifactor ``post_result`` plugin in ``log/test-durations.json``. Tests without a history count
+as the median of the known durations (or :py:data:`DEFAULT_TEST_DURATION` without any history).
+
+- The groups are handed out longest first, still preferring the providers a slave already has
+  set up
+- A group assigned to a slave is kept in the slave's queue on the master and sent in chunks of
+  about :py:data:`CHUNK_DURATION` seconds
+- A slave that has nothing left to do steals the back half of the longest queue of another slave,
+  if that half is worth at least :py:data:`STEAL_MIN_DURATION` seconds (it is going to repeat the
+  module and provider setup). Queues of slaves that are gone are always taken over.
+
+Elastic slave pool
+------------------
+
+Slaves can come and go during the run. Adding a base url to ``slave_urls`` starts a new slave on
+the next audit, removing it shuts the slave down and its tests are redistributed.
+
+- With Sprout, the testing starts as soon as one appliance of the pool is ready, a background
+  thread polls the pools every :py:data:`SPROUT_POLL_INTERVAL` seconds and adds the appliances
+  which became ready since
+- A slave whose process terminated unexpectedly :py:data:`APPLIANCE_FAILURE_LIMIT` times is
+  retired together with its appliance. With Sprout, the appliance is destroyed and a replacement
+  is requested in a new pool, which joins the run the same way.
+
 """
 
 import collections
@@ -48,7 +80,10 @@ import zmq
 from _pytest import runner
 from functools32 import wraps
 
+from artifactor.plugins.post_result import load_test_durations
 from fixtures import terminalreporter
+from fixtures.artifactor_plugin import get_test_idents
+from fixtures.collection_cache import collection_cache
 from fixtures.parallelizer import remote
 from fixtures.pytest_store import store
 from utils import at_exit, conf
@@ -71,6 +106,17 @@ if env_base_urls:
 # slaves will set this to a unique string when they're initialized
 conf.runtime['env']['slaveid'] = None
 
+# estimated duration of a test when there are no durations from the previous runs at all
+DEFAULT_TEST_DURATION = 60
+# how many seconds worth of tests a slave gets in one go from its queue
+CHUNK_DURATION = 300
+# stealing repeats the module and provider setup, so it has to be worth that much seconds
+STEAL_MIN_DURATION = 300
+# how often (seconds) the Sprout pools are checked for new appliances
+SPROUT_POLL_INTERVAL = 30
+# a slave is retired with its appliance after its process terminated this many times
+APPLIANCE_FAILURE_LIMIT = 2
+
 # lock for protecting mutation of recv queue
 recv_lock = Lock()
 # lock for protecting zmq socket access
@@ -193,21 +239,35 @@ class ParallelSession(object):
         self.slaves = SlaveDict()
         self.slave_urls = SlaveDict()
         self.slave_tests = defaultdict(set)
+        # groups assigned to a slave, but not sent yet; idle slaves steal from here
+        self.slave_queues = defaultdict(deque)
         self.test_groups = self._test_item_generator()
+        # estimated durations of the collected tests, filled in when the collection is known
+        self.test_durations = {}
+        self.default_duration = DEFAULT_TEST_DURATION
 
         self._pool = []
-        self.pool_lock = Lock()
+        self.pool_lock = RLock()
         from utils.conf import cfme_data
         self.provs = sorted(set(cfme_data['management_systems'].keys()),
                             key=len, reverse=True)
         self.slave_allocation = collections.defaultdict(list)
         self.used_prov = set()
+        # how many providers a slave can have set up before its appliance is cleansed
+        self.appliance_num_limit = 2
 
         self.failed_slave_test_groups = deque()
         self.slave_spawn_count = 0
+        # how many times the process of a slave terminated unexpectedly
+        self.slave_failures = defaultdict(int)
         self.sprout_client = None
         self.sprout_timer = None
         self.sprout_pool = None
+        # all pools of this run, the first one and the replacements
+        # pool id -> {'count': requested, 'requested': time, 'added': set of urls}
+        self.sprout_pools = {}
+        # base urls of the retired Sprout appliances waiting for a replacement
+        self.retired_appliances = deque()
         if not self.config.option.use_sprout:
             # Without Sprout
             self.appliances = self.config.option.appliances
@@ -224,18 +284,18 @@ class ParallelSession(object):
                 date=self.config.option.sprout_date,
                 lease_time=self.config.option.sprout_timeout
             )
-            self.terminal.write("Pool {}. Waiting for fulfillment ...\n".format(pool_id))
+            self.terminal.write("Pool {}. Waiting for the first appliance ...\n".format(pool_id))
             self.sprout_pool = pool_id
-            at_exit(self.sprout_client.destroy_pool, self.sprout_pool)
+            self._add_sprout_pool(pool_id, self.config.option.sprout_appliances)
             if self.config.option.sprout_desc is not None:
                 self.sprout_client.set_pool_description(
                     pool_id, str(self.config.option.sprout_desc))
             try:
                 result = wait_for(
-                    lambda: self.sprout_client.request_check(self.sprout_pool)["fulfilled"],
+                    lambda: self._sprout_ready_appliances(self.sprout_pool),
                     num_sec=self.config.option.sprout_provision_timeout * 60,
                     delay=5,
-                    message="requesting appliances was fulfilled"
+                    message="first appliance of the pool is ready"
                 )
             except:
                 pool = self.sprout_client.request_check(self.sprout_pool)
@@ -246,32 +306,33 @@ class ParallelSession(object):
             else:
                 pool = self.sprout_client.request_check(self.sprout_pool)
                 dump_pool_info(lambda x: self.terminal.write("{}\n".format(x)), pool)
-            self.terminal.write("Provisioning took {0:.1f} seconds\n".format(result.duration))
-            request = self.sprout_client.request_check(self.sprout_pool)
+            self.terminal.write(
+                "Provisioning of the first appliance took {0:.1f} seconds\n".format(
+                    result.duration))
+            ready_appliances = result.out
             self.appliances = []
             # Push an appliance to the stack to have proper reference for test collection
-            IPAppliance(address=request["appliances"][0]["ip_address"]).push()
+            IPAppliance(address=ready_appliances[0]["ip_address"]).push()
             self.terminal.write("Appliances were provided:\n")
-            for appliance in request["appliances"]:
+            self.slave_appliances_data = {}
+            for appliance in ready_appliances:
                 url = "https://{}/".format(appliance["ip_address"])
                 self.appliances.append(url)
+                self.sprout_pools[self.sprout_pool]['added'].add(url)
+                self.slave_appliances_data[appliance["ip_address"]] = (
+                    appliance["template_name"], appliance["provider"]
+                )
                 self.terminal.write("- {} is {}\n".format(url, appliance['name']))
-            map(lambda a: "https://{}/".format(a["ip_address"]), request["appliances"])
             self._reset_timer()
             # Set the base_url for collection purposes on the first appliance
             conf.runtime["env"]["base_url"] = self.appliances[0]
             # Retrieve and print the template_name for Jenkins to pick up
-            template_name = request["appliances"][0]["template_name"]
+            template_name = ready_appliances[0]["template_name"]
             conf.runtime["cfme_data"]["basic_info"]["appliance_template"] = template_name
             self.terminal.write("appliance_template=\"{}\";\n".format(template_name))
             with project_path.join('.appliance_template').open('w') as template_file:
                 template_file.write('export appliance_template="{}"'.format(template_name))
             self.terminal.write("Parallelized Sprout setup finished.\n")
-            self.slave_appliances_data = {}
-            for appliance in request["appliances"]:
-                self.slave_appliances_data[appliance["ip_address"]] = (
-                    appliance["template_name"], appliance["provider"]
-                )
 
         # set up the ipc socket
         zmq_endpoint = 'tcp://127.0.0.1:{}'.format(random_port())
@@ -308,10 +369,14 @@ class ParallelSession(object):
         recv_queuer.daemon = True
         recv_queuer.start()
 
+        if self.sprout_pools:
+            sprout_watcher = Thread(target=self._sprout_watch)
+            sprout_watcher.daemon = True
+            sprout_watcher.start()
+
     def _slave_audit(self):
-        # XXX: There is currently no mechanism to add or remove slave_urls, short of
-        #      firing up the debugger and doing it manually. This is making room for
-        #      planned future abilities to dynamically add and remove slaves via automation
+        # slave_urls can change at any time, the Sprout watcher adds appliances as they are
+        # provided and the slaves with failing appliances get retired below
 
         # check for unexpected slave shutdowns and redistribute tests
         for slaveid, slave in self.slaves.items():
@@ -330,6 +395,9 @@ class ParallelSession(object):
                     with SlaveDict.lock:
                         self.failed_slave_test_groups.append(self.slave_tests.pop(slaveid))
                 self.print_message(msg, purple=True)
+                self.slave_failures[slaveid] += 1
+                if self.slave_failures[slaveid] >= APPLIANCE_FAILURE_LIMIT:
+                    self._retire_slave(slaveid)
 
         # Make sure we have a slave for every slave_url
         for slaveid in list(self.slave_urls):
@@ -343,6 +411,107 @@ class ParallelSession(object):
                 self.print_message("{}'s appliance has died, deactivating slave".format(slaveid))
                 self.interrupt(slaveid)
 
+    def _retire_slave(self, slaveid):
+        """Stops using the slave and its appliance for the rest of the run
+
+        The tests queued for the slave are taken over by the others. With Sprout, the
+        appliance gets replaced by the Sprout watcher.
+        """
+        base_url = self.slave_urls.get(slaveid)
+        if base_url is None:
+            return
+        self.print_message('{} failed {} times, retiring it and its appliance {}'.format(
+            slaveid, self.slave_failures[slaveid], base_url), red=True)
+        self.slave_urls.remove(slaveid)
+        with self.pool_lock:
+            self.slave_allocation.pop(slaveid, None)
+        if self.sprout_pools:
+            self.retired_appliances.append(base_url)
+
+    def _add_sprout_pool(self, pool_id, count):
+        self.sprout_pools[pool_id] = {'count': count, 'requested': time(), 'added': set()}
+        at_exit(self.sprout_client.destroy_pool, pool_id)
+
+    def _sprout_ready_appliances(self, pool_id):
+        """Returns the appliances of the pool that can be used already"""
+        request = self.sprout_client.request_check(pool_id)
+        return [
+            appliance for appliance in request["appliances"]
+            if appliance["ready"] and appliance["ip_address"]]
+
+    def sprout_pending(self):
+        """How many appliances are still expected to come from Sprout"""
+        timeout = self.config.option.sprout_provision_timeout * 60
+        return sum(
+            pool['count'] - len(pool['added']) for pool in self.sprout_pools.values()
+            if time() - pool['requested'] < timeout)
+
+    def work_left(self):
+        """Whether there are tests that no slave has received yet"""
+        if not self.collection:
+            # the master collection is not finished yet
+            return True
+        return self.sent_tests < len(self.collection) or bool(self.failed_slave_test_groups)
+
+    def _sprout_watch(self):
+        # Runs in a thread: adds the appliances as Sprout provides them and replaces the
+        # retired ones. The main loop starts slaves for the new slave_urls in _slave_audit.
+        while not self.session_finished:
+            try:
+                self._sprout_replace_retired()
+                if self.sprout_pending() and self.work_left():
+                    self._sprout_add_ready()
+            except Exception as e:
+                self.log.error('Sprout watcher failed, will retry: {}'.format(e))
+            sleep(SPROUT_POLL_INTERVAL)
+
+    def _sprout_replace_retired(self):
+        while self.retired_appliances:
+            base_url = self.retired_appliances[0]
+            ip_address = urlparse(base_url).netloc
+            try:
+                self.sprout_client.destroy_appliance(ip_address)
+            except SproutException as e:
+                self.log.warning('could not destroy retired appliance {}: {}'.format(
+                    ip_address, e))
+            if self.work_left():
+                pool_id = self.sprout_client.request_appliances(
+                    self.config.option.sprout_group,
+                    count=1,
+                    version=self.config.option.sprout_version,
+                    date=self.config.option.sprout_date,
+                    lease_time=self.config.option.sprout_timeout
+                )
+                if self.config.option.sprout_desc is not None:
+                    self.sprout_client.set_pool_description(
+                        pool_id, str(self.config.option.sprout_desc))
+                self._add_sprout_pool(pool_id, 1)
+                self.print_message(
+                    'requested a replacement for {} in pool {}'.format(ip_address, pool_id),
+                    yellow=True)
+            self.retired_appliances.popleft()
+
+    def _sprout_add_ready(self):
+        for pool_id, pool in self.sprout_pools.items():
+            if len(pool['added']) >= pool['count']:
+                continue
+            for appliance in self._sprout_ready_appliances(pool_id):
+                url = "https://{}/".format(appliance["ip_address"])
+                if url in pool['added']:
+                    continue
+                pool['added'].add(url)
+                self._add_appliance(url, appliance)
+
+    def _add_appliance(self, url, appliance):
+        # The slave reads the appliance data from the slave config when it starts,
+        # so the config has to be saved before the url appears in slave_urls
+        conf.runtime['slave_config'].setdefault('appliance_data', {})[
+            appliance["ip_address"]] = (appliance["template_name"], appliance["provider"])
+        conf.save('slave_config')
+        self.appliances.append(url)
+        self.slave_urls.add(url)
+        self.print_message('{} ({}) joined the run'.format(url, appliance['name']), green=True)
+
     def _start_slave(self, slaveid):
         devnull = open(os.devnull, 'w')
         try:
@@ -374,15 +543,18 @@ class ParallelSession(object):
         self.sprout_timer.start()
 
     def sprout_ping_pool(self):
-        try:
-            self.sprout_client.prolong_appliance_pool_lease(self.sprout_pool)
-        except SproutException as e:
-            self.terminal.write(
-                "Pool {} does not exist any more, disabling the timer.\n".format(self.sprout_pool))
-            self.terminal.write(
-                "This can happen before the tests are shut down "
-                "(last deleted appliance deleted the pool")
-            self.terminal.write("> The exception was: {}".format(str(e)))
+        for pool_id in list(self.sprout_pools):
+            try:
+                self.sprout_client.prolong_appliance_pool_lease(pool_id)
+            except SproutException as e:
+                self.terminal.write(
+                    "Pool {} does not exist any more, not pinging it.\n".format(pool_id))
+                self.terminal.write(
+                    "This can happen before the tests are shut down "
+                    "(last deleted appliance deleted the pool")
+                self.terminal.write("> The exception was: {}".format(str(e)))
+                del self.sprout_pools[pool_id]
+        if not self.sprout_pools:
             self.sprout_pool = None  # Will disable the timer in next reset call.
         self._reset_timer()
 
@@ -501,13 +673,19 @@ class ParallelSession(object):
             with SlaveDict.lock:
                 tests = list(self.failed_slave_test_groups.popleft())
         except IndexError:
-            try:
-                tests = self.get(slaveid)
-                # To return to the old parallelizer distributor, remove the line above
-                # and replace it with the line below.
-                # tests = self.test_groups.next()
-            except StopIteration:
-                tests = []
+            with self.pool_lock:
+                queue = self.slave_queues[slaveid]
+                if not queue:
+                    try:
+                        queue.extend(self.get(slaveid))
+                        # To return to the old parallelizer distributor, remove the line above
+                        # and replace it with the line below.
+                        # queue.extend(self.test_groups.next())
+                    except StopIteration:
+                        pass
+                if not queue:
+                    queue.extend(self.steal(slaveid))
+                tests = self._pop_chunk(queue)
 
         self.send(slaveid, tests)
         self.slave_tests[slaveid] |= set(tests)
@@ -552,6 +730,13 @@ class ParallelSession(object):
         # Build master collection for slave diffing and distribution
         for item in self.session.items:
             self.collection[item.nodeid] = item
+        self._load_test_durations()
+
+        # Let the slaves collect only what the master did, with the cached provider selection
+        conf.runtime['slave_config']['test_files'] = sorted(
+            {str(item.fspath) for item in self.session.items})
+        conf.runtime['slave_config']['collection_cache'] = collection_cache.key
+        conf.save('slave_config')
 
         # Fire up the workers after master collection is complete
         # master and the first slave share an appliance, this is a workaround to prevent a slave
@@ -569,8 +754,9 @@ class ParallelSession(object):
                 # spawn/kill/replace slaves if needed
                 self._slave_audit()
 
-                if not self.slaves:
+                if not self.slaves and not (self.work_left() and self.sprout_pending()):
                     # All slaves are killed or errored, we're done with tests
+                    # unless Sprout is still going to provide appliances to run the rest
                     self.print_message('all slaves have exited', yellow=True)
                     self.session_finished = True
 
@@ -634,6 +820,87 @@ class ParallelSession(object):
         # Suppress other runtestloop calls
         return True
 
+    def _load_test_durations(self):
+        """Estimates durations of the collected tests from the durations of the previous runs"""
+        history = load_test_durations()
+        self.test_durations = {}
+        for nodeid, item in self.collection.iteritems():
+            name, location = get_test_idents(item)
+            duration = history.get('{}/{}'.format(location, name))
+            if duration is not None:
+                self.test_durations[nodeid] = duration
+        if self.test_durations:
+            known = sorted(self.test_durations.values())
+            self.default_duration = known[len(known) / 2]
+        self.log.info('durations known for {} of {} tests, {:.1f}s for the others'.format(
+            len(self.test_durations), len(self.collection), self.default_duration))
+
+    def _estimate(self, tests):
+        """Estimated duration of a group of tests in seconds"""
+        return sum(self.test_durations.get(test, self.default_duration) for test in tests)
+
+    def _test_provider(self, test):
+        """Returns the provider key the test is parametrized with or None"""
+        if '[' not in test:
+            return None
+        # self.provs is sorted longest first, so a key that is a prefix of another key
+        # does not shadow it
+        for prov in self.provs:
+            if prov in test:
+                return prov
+        return None
+
+    def _pop_chunk(self, queue):
+        # Takes tests worth of about CHUNK_DURATION from the front of the queue
+        tests = []
+        duration = 0
+        while queue and (not tests or duration < CHUNK_DURATION):
+            test = queue.popleft()
+            tests.append(test)
+            duration += self._estimate([test])
+        return tests
+
+    def steal(self, thief):
+        """Takes the back half of the longest queue of another slave
+
+        Has to be called with ``pool_lock`` held. Provider affinity is kept in mind, a slave
+        will not steal tests with a provider it would not be given by :py:meth:`get`.
+
+        Returns:
+            A list of test ids, empty if there is nothing worth stealing.
+        """
+        candidates = []
+        for victim, queue in self.slave_queues.iteritems():
+            if victim == thief or not queue:
+                continue
+            orphaned = victim not in self.slave_urls
+            # the victim is going to ask for more soon, so only the back half is taken
+            tests = list(queue) if orphaned else list(queue)[(len(queue) + 1) / 2:]
+            if not tests:
+                continue
+            duration = self._estimate(tests)
+            if not orphaned and duration < STEAL_MIN_DURATION:
+                continue
+            prov = self._test_provider(tests[0])
+            allocation = self.slave_allocation[thief]
+            if (not orphaned and prov and prov not in allocation and
+                    len(allocation) >= self.appliance_num_limit):
+                continue
+            # Prefer the victims whose provider the thief already has, then the longest
+            candidates.append((prov is None or prov in allocation, duration, victim, tests))
+        if not candidates:
+            return []
+        _, duration, victim, tests = max(candidates)
+        queue = self.slave_queues[victim]
+        for _ in tests:
+            queue.pop()
+        prov = self._test_provider(tests[0])
+        if prov and prov not in self.slave_allocation[thief]:
+            self.slave_allocation[thief].append(prov)
+        self.print_message('stole {} tests (~{:.1f} min) from {}'.format(
+            len(tests), duration / 60., victim), thief, yellow=True)
+        return tests
+
     def _test_item_generator(self):
         for tests in self._modscope_item_generator():
             yield tests
@@ -701,15 +968,15 @@ class ParallelSession(object):
                 for test_group in self.test_groups:
                     self._pool.append(test_group)
                     for test in test_group:
-                        if '[' in test:
-                            found_prov = []
-                            for pv in self.provs:
-                                if pv in test:
-                                    found_prov.append(pv)
-                                    break
-                            provs = list(set(found_prov).intersection(self.provs))
-                            if provs:
-                                self.used_prov = self.used_prov.union(set(provs))
+                        prov = self._test_provider(test)
+                        if prov:
+                            self.used_prov.add(prov)
+                # Longest processing time first, the short groups fill the gaps at the end.
+                # The sort is stable, so equal groups stay in the collection order
+                self._pool.sort(key=self._estimate, reverse=True)
+                if self._pool:
+                    self.log.info('{} test groups, estimated {:.1f} min in total'.format(
+                        len(self._pool), sum(map(self._estimate, self._pool)) / 60.))
                 if self.used_prov:
                     self.ratio = float(len(self.slaves)) / float(len(self.used_prov))
                 else:
@@ -719,23 +986,14 @@ class ParallelSession(object):
             current_allocate = self.slave_allocation.get(slave, None)
             # num_provs_list = [len(v) for k, v in self.slave_allocation.iteritems()]
             # average_num_provs = sum(num_provs_list) / float(len(self.slaves))
-            appliance_num_limit = 2
+            appliance_num_limit = self.appliance_num_limit
             for test_group in self._pool:
                 for test in test_group:
                     # If the test is parametrized...
                     if '[' in test:
-                        found_prov = []
-                        for pv in self.provs:
-                            if pv in test:
-                                found_prov.append(pv)
-                                break
-                        # The line below can probably be removed now, since we compare
-                        # providers in the loop above with self.provs, which is a list
-                        # of all providers.
-                        provs = list(set(found_prov).intersection(self.provs))
+                        prov = self._test_provider(test)
                         # If the parametrization contains a provider...
-                        if provs:
-                            prov = provs[0]
+                        if prov:
                             # num_slave_with_prov = len([sl for sl, provs_list
                             #    in self.slave_allocation.iteritems()
                             #    if prov in provs_list])
@@ -775,17 +1033,9 @@ class ParallelSession(object):
                 for test in test_group:
                     # If the test is parametrized...
                     if '[' in test:
-                        found_prov = []
-                        for pv in self.provs:
-                            if pv in test:
-                                found_prov.append(pv)
-                                break
-                        # The line below can probably be removed now, since we compare
-                        # providers in the loop above with self.provs, which is a list
-                        # of all providers.
-                        provs = list(set(found_prov).intersection(self.provs))
+                        prov = self._test_provider(test)
                         # If the parametrization contains a provider...
-                        if provs:
+                        if prov:
                             # Already too many slaves with provider
                             app_url = self.slave_urls[slave]
                             app_ip = urlparse(app_url).netloc
@@ -31,6 +31,9 @@ class SlaveManager(object):
         self.messages = {}
 
         self.quit_signaled = False
+        # Test files collected by the master, None means collect everything
+        test_files = conf.slave_config.get('test_files')
+        self.test_files = set(test_files) if test_files is not None else None
 
     def send_event(self, name, **kwargs):
         kwargs['_event_name'] = name
@@ -49,6 +52,16 @@ class SlaveManager(object):
         """Send a message to the master, which should get printed to the console"""
         self.send_event('message', message=message, **kwargs)  # message!
 
+    def pytest_ignore_collect(self, path, config):
+        """pytest ignore collect hook
+
+        - skips the test modules the master did not collect anything from
+
+        """
+        if self.test_files is not None and path.check(file=True) and path.ext == '.py' \
+                and path.basename.startswith('test_') and str(path) not in self.test_files:
+            return True
+
     def pytest_collection_finish(self, session):
         """pytest collection hook
 
@@ -4,11 +4,11 @@ import argparse
 import datetime
 import re
 import sys
-from collections import defaultdict
-from threading import Lock, Thread
+from threading import Lock
 
 from utils.log import logger
-from utils.providers import list_all_providers, get_mgmt
+from utils.providers import list_all_providers
+from utils.sweep import Sweep, DEFAULT_MAX_WORKERS, DEFAULT_PROVIDER_WORKERS
 
 lock = Lock()
 
@@ -25,6 +25,12 @@ def parse_cmd_line():
     parser.add_argument('text_to_match', nargs='*', default=['^test_', '^jenkins', '^i-'],
         help='Regex in the name of vm to be affected, can be use multiple times'
         ' (Defaults to "^test_" and "^jenkins")')
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS,
+        help='How many provider calls can run at once in total')
+    parser.add_argument('--provider-workers', type=int, default=DEFAULT_PROVIDER_WORKERS,
+        help='How many calls can run at once against one provider')
+    parser.add_argument('--rate', type=float, default=None,
+        help='Max calls per second to one provider (default unlimited)')
     args = parser.parse_args()
     return args
 
@@ -37,16 +43,18 @@ def match(matchers, vm_name):
         return False
 
 
-def process_provider_vms(provider_key, matchers, delta, vms_to_delete):
-    with lock:
-        print '%s processing' % provider_key
-    try:
-        now = datetime.datetime.now()
-        provider = get_mgmt(provider_key)
-        for vm_name in provider.list_vm():
-            if not match(matchers, vm_name):
-                continue
+def list_matching_vms(matchers):
+    def _list(provider_key, provider):
+        with lock:
+            print '%s processing' % provider_key
+        return [vm_name for vm_name in provider.list_vm() if match(matchers, vm_name)]
+    return _list
+
 
+def check_vms_age(delta):
+    def _check(provider_key, provider, vm_names):
+        now = datetime.datetime.now()
+        for vm_name in vm_names:
             try:
                 vm_creation_time = provider.vm_creation_time(vm_name)
             except:
@@ -55,37 +63,34 @@ def process_provider_vms(provider_key, matchers, delta, vms_to_delete):
                 continue
 
             if vm_creation_time + delta < now:
-                vm_delta = now - vm_creation_time
-                with lock:
-                    vms_to_delete[provider_key].add((vm_name, vm_delta))
-        with lock:
-            print '%s finished' % provider_key
-    except Exception as ex:
+                yield vm_name, now - vm_creation_time
+    return _check
+
+
+def delete_vms(provider_key, provider, vms):
+    for vm_name, __ in vms:
         with lock:
-            print '%s failed' % provider_key
-        logger.error('failed to process vms from provider %s', provider_key)
-        logger.exception(ex)
+            print 'Deleting %s on %s' % (vm_name, provider_key)
+        try:
+            provider.delete_vm(vm_name)
+        except Exception as ex:
+            with lock:
+                print 'Failed to delete %s on %s' % (vm_name, provider_key)
+            logger.exception(ex)
 
 
-def cleanup_vms(texts, max_hours=24, providers=None, prompt=True):
+def cleanup_vms(texts, max_hours=24, providers=None, prompt=True, workers=DEFAULT_MAX_WORKERS,
+        provider_workers=DEFAULT_PROVIDER_WORKERS, rate=None):
     providers = providers or list_all_providers()
     delta = datetime.timedelta(hours=int(max_hours))
-    vms_to_delete = defaultdict(set)
-    thread_queue = []
+    sweep = Sweep(max_workers=workers, provider_workers=provider_workers, rate=rate)
     # precompile regexes
     matchers = [re.compile(text) for text in texts]
 
-    for provider_key in providers:
-        thread = Thread(target=process_provider_vms,
-            args=(provider_key, matchers, delta, vms_to_delete))
-        # Mark as daemon thread for easy-mode KeyboardInterrupt handling
-        thread.daemon = True
-        thread_queue.append(thread)
-        thread.start()
-
-    # Join the queued calls
-    for thread in thread_queue:
-        thread.join()
+    found, failed = sweep.run(providers, list_matching_vms(matchers), check_vms_age(delta))
+    for provider_key in failed:
+        print '%s failed' % provider_key
+    vms_to_delete = {provider_key: vms for provider_key, vms in found.items() if vms}
 
     for provider_key, vm_set in vms_to_delete.items():
         print '%s:' % provider_key
@@ -102,16 +107,10 @@ def cleanup_vms(texts, max_hours=24, providers=None, prompt=True):
     if not vms_to_delete:
         print 'No VMs to delete.'
 
-    for provider_key, vm_set in vms_to_delete.items():
-        provider = get_mgmt(provider_key)
-        for vm_name, __ in vm_set:
-            print 'Deleting %s on %s' % (vm_name, provider_key)
-            try:
-                provider.delete_vm(vm_name)
-            except Exception as ex:
-                print 'Failed to delete %s on %s' % (vm_name, provider_key)
-                logger.exception(ex)
+    sweep.run(vms_to_delete.keys(), lambda provider_key, provider: vms_to_delete[provider_key],
+        delete_vms)
 
 if __name__ == "__main__":
     args = parse_cmd_line()
-    sys.exit(cleanup_vms(args.text_to_match, args.max_hours, args.providers, args.prompt))
+    sys.exit(cleanup_vms(args.text_to_match, args.max_hours, args.providers, args.prompt,
+        args.workers, args.provider_workers, args.rate))
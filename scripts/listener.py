@@ -4,9 +4,14 @@
 # example calls
 #    curl -X PUT http://localhost:8080/events/VmRedhat/vm_name?event=vm_start
 #    curl -X GET http://localhost:8080/events
+#    curl -X POST -H 'Content-Type: application/json' http://localhost:8080/events/query \
+#        -d '{"timeout": 30, "queries": [{"event_type": "VmRedhat", "resource_name": "vm_name",
+#             "event": "vm_start", "time_from": "2015-01-01-00-00-00"}]}'
 
 import json
 import sqlite3
+import threading
+import time as _time
 from datetime import datetime
 from tempfile import NamedTemporaryFile
 
@@ -14,11 +19,17 @@ from bottle import run, route, request, response, install
 from bottle_sqlite import SQLitePlugin
 
 from utils.log import create_logger
+from utils.wsgi_server import ThreadingServer
 
 db_file = NamedTemporaryFile()
 logger = create_logger('events')
 
 TIME_FORMAT = "%Y-%m-%d-%H-%M-%S"
+# The longest a query can wait for the events to come
+MAX_QUERY_TIMEOUT = 120
+
+# Notified whenever an event is added
+new_event = threading.Condition()
 
 
 def main(host, port, quiet):
@@ -33,10 +44,14 @@ def main(host, port, quiet):
         event_time TIMESTAMP DEFAULT (datetime('now','localtime'))
     )
     """)
+    cursor.execute("""
+    CREATE INDEX event_log_lookup ON event_log (event_type, resource_name, event, event_time)
+    """)
+    conn.commit()
 
     # Install sqlite bottle plugin
     install(SQLitePlugin(dbfile=db_file.name))
-    run(host=host, port=port, quiet=quiet)
+    run(host=host, port=port, quiet=quiet, server=ThreadingServer)
 
 
 def log_event(action, event_type=None, resource_name=None):
@@ -90,6 +105,46 @@ def events_list(db, event_type=None, resource_name=None):
     return json.dumps([dict(r) for r in rows])
 
 
+def find_event(db, query):
+    """Returns the time of the first event matching the query or None."""
+    sql = ('SELECT event_time FROM event_log '
+           'WHERE event_type = ? AND resource_name = ? AND event = ?')
+    bindings = (query['event_type'], query['resource_name'], query['event'])
+    if query.get('time_from'):
+        sql += ' AND event_time >= ?'
+        bindings += (datetime.strptime(query['time_from'], TIME_FORMAT),)
+    if query.get('time_to'):
+        sql += ' AND event_time <= ?'
+        bindings += (datetime.strptime(query['time_to'], TIME_FORMAT),)
+    row = db.execute(sql + ' ORDER BY event_time ASC LIMIT 1', bindings).fetchone()
+    return row[0] if row is not None else None
+
+
+@route('/events/query', method='POST')
+def events_query(db):
+    """Checks many queries at once, optionally waiting until all of them match.
+
+    Expects a JSON object with ``queries``, a list of objects with ``event_type``,
+    ``resource_name``, ``event`` and optional ``time_from`` and ``time_to``, and optional
+    ``timeout`` in seconds. Returns a list with the time of the first matching event for each
+    query, ``null`` for those that did not match before the timeout.
+    """
+    response.content_type = 'application/json'
+    data = request.json or {}
+    queries = data.get('queries', [])
+    deadline = _time.time() + min(float(data.get('timeout', 0)), MAX_QUERY_TIMEOUT)
+    results = [None] * len(queries)
+    while True:
+        with new_event:
+            for i, query in enumerate(queries):
+                if results[i] is None:
+                    results[i] = find_event(db, query)
+            remaining = deadline - _time.time()
+            if all(result is not None for result in results) or remaining <= 0:
+                return json.dumps(results)
+            new_event.wait(remaining)
+
+
 @route("/events_count", method="GET")
 def events_count(db):
     response.content_type = "application/json"
@@ -106,6 +161,8 @@ def event_put(db, event_type, resource_name):
                                                                                   resource_name,
                                                                                   event)])
     db.commit()
+    with new_event:
+        new_event.notify_all()
     return dict(result='success')
 
 
@@ -1,10 +1,10 @@
 #! /usr/bin/env python2
 from collections import defaultdict
-from utils.providers import get_mgmt
 from utils.conf import cfme_data, jenkins
 from utils import appliance
 from jinja2 import Environment, FileSystemLoader
 from utils.path import template_path
+from utils.sweep import Sweep
 import json
 
 li = cfme_data['management_systems']
@@ -14,9 +14,11 @@ data = defaultdict(dict)
 
 
 def process_vm(vm, mgmt, user, prov):
+    """Returns list of ``(user, provider name, VM description)`` of the providers the VM uses"""
     print "Inspecting: {} on {}".format(vm, prov)
+    usage = []
     if mgmt.is_vm_stopped(vm):
-        return
+        return usage
     ip = mgmt.get_ip_address(vm, timeout=1)
     if ip:
         with appliance.IPAppliance(ip) as app:
@@ -33,35 +35,35 @@ def process_vm(vm, mgmt, user, prov):
 
                 for provider in providers:
                     prov_name = prov_key_db.get(provider, 'Unknown ({})'.format(prov))
-                    if prov_name in data[user]:
-                        data[user][prov_name].append("{} ({})".format(vm, prov))
-                    else:
-                        data[user][prov_name] = ["{} ({})".format(vm, prov)]
+                    usage.append((user, prov_name, "{} ({})".format(vm, prov)))
 
             except:
                 pass
+    return usage
 
 
-def process_provider(mgmt, prov):
-    try:
-        vms = mgmt.list_vm()
-    except:
-        return
+def list_user_vms(prov, mgmt):
+    print "DOING {}".format(prov)
+    return [(vm, user) for vm in mgmt.list_vm() for user in users if user in vm]
 
-    for vm in vms:
-        for user in users:
-            if user in vm:
-                process_vm(vm, mgmt, user, prov)
+
+def process_vms(prov, mgmt, vms):
+    for vm, user in vms:
+        for usage in process_vm(vm, mgmt, user, prov):
+            yield usage
 
 prov_key_db = {}
 
 for prov in li:
     ip = li[prov].get('ipaddress', None)
     prov_key_db[ip] = prov
-    if li[prov]['type'] not in ['ec2', 'scvmm']:
-        mgmt = get_mgmt(prov)
-        print "DOING {}".format(prov)
-        process_provider(mgmt, prov)
+
+results, __ = Sweep().run(
+    [prov for prov in li if li[prov]['type'] not in ['ec2', 'scvmm']],
+    list_user_vms, process_vms)
+for prov in li:
+    for user, prov_name, vm in results.get(prov, []):
+        data[user].setdefault(prov_name, []).append(vm)
 
 with open('provider_usage.json', 'w') as f:
     json.dump(data, f)
@@ -5,10 +5,13 @@
 from bottle import route, run, response, request
 from collections import namedtuple
 from datetime import datetime
+from itertools import count
 from jinja2 import Environment, FileSystemLoader
 from smtpd import SMTPServer
 from utils.path import log_path, template_path
 from utils.timeutil import parsetime
+from utils.wsgi_server import ThreadingServer
+import Queue
 import asyncore
 import email
 import json
@@ -16,10 +19,15 @@ import re
 import sqlite3
 import sys
 import threading
+import time as _time
 
 
 TIME_FORMAT = "%Y-%m-%d-%H-%M-%S"
 ROWS = ("from_address", "to_address", "subject", "time", "text")
+# How many received messages are written into the database in one transaction at most
+BATCH_SIZE = 500
+# The longest a /messages/wait query can block
+MAX_WAIT_TIMEOUT = 300
 
 # Shared variable with all messages
 db_lock = threading.RLock()
@@ -36,13 +44,21 @@ cur.execute(
     )
     """
 )
+for column in ("from_address", "to_address", "subject", "time"):
+    cur.execute("CREATE INDEX emails_{0} ON emails ({0})".format(column))
 connection.commit()
 
+# Received messages waiting for the writer thread
+pending = Queue.Queue()
+# Notified whenever a batch of messages is written into the database
+new_mail = threading.Condition()
+
 # To write the e-mails into the files
-files_lock = threading.RLock()  # To prevent filename collisions
+files_lock = threading.RLock()  # Guards test_name
 test_name = None                # Name of the test which currently runs
 email_path = log_path.join("emails")
 email_folder = None             # Name of the root folder for testing
+file_counter = count()          # Makes the file names unique
 
 template_env = Environment(
     loader=FileSystemLoader(template_path.strpath)
@@ -63,7 +79,11 @@ def write(what, end="\n"):
 
 
 class EmailServer(SMTPServer):
-    """Simple e-mail server. What does it do is that every mail is put in the database."""
+    """Simple e-mail server. What does it do is that every mail is put in the database.
+
+    The messages are only parsed here and handed over to :py:func:`write_messages`, so the
+    SMTP loop never waits for the database or the disk.
+    """
     def process_message(self, peer, mailfrom, rcpttos, data):
         message = email.message_from_string(data)
         payload = message.get_payload()
@@ -71,35 +91,56 @@ class EmailServer(SMTPServer):
             # Message can have multiple payloads, so let's join them for simplicity
             payload = "\n".join([x.get_payload().strip() for x in payload])
         d = dict(message.items())
-        with db_lock:
-            global connection
-            cursor = connection.cursor()
-            cursor.execute(
-                "INSERT INTO emails VALUES (?, ?, ?, CURRENT_TIMESTAMP, ?)",
-                (
-                    d["From"],
-                    ",".join([address.strip() for address in d["To"].strip().split(",")]),
-                    d["Subject"],
-                    payload)
-            )
-            connection.commit()
-        if email_folder is not None:
-            with files_lock:
-                # Create directories if they don't exist
-                current_test_folder = email_folder.join(test_name or "default-test")
-                if not current_test_folder.exists():
-                    current_test_folder.mkdir()
-                arrived = datetime.now()
-
-                def _getfname(counter):
-                    return current_test_folder\
-                        .join("%s-%d.eml" % (arrived.strftime("%Y%m%d%H%M%S"), int(counter)))
-                cnt = 0
-                while _getfname(cnt).exists():
-                    cnt += 1
-                with _getfname(cnt).open("w") as output:
-                    # Dump the raw e-mail data
-                    output.write(data)
+        # Same format as CURRENT_TIMESTAMP, taken now as the message can wait in the queue
+        arrived = datetime.utcnow().replace(microsecond=0)
+        row = (
+            d["From"],
+            ",".join([address.strip() for address in d["To"].strip().split(",")]),
+            d["Subject"],
+            arrived,
+            payload)
+        with files_lock:
+            current_test_name = test_name
+        pending.put((row, current_test_name, data))
+
+
+def save_email_file(current_test_name, data):
+    """Dumps the raw e-mail data into the folder of the test."""
+    current_test_folder = email_folder.join(current_test_name or "default-test")
+    current_test_folder.ensure(dir=True)
+    file_name = "%s-%d.eml" % (datetime.now().strftime("%Y%m%d%H%M%S"), next(file_counter))
+    with current_test_folder.join(file_name).open("w") as output:
+        output.write(data)
+
+
+def write_messages():
+    """Writes the received messages into the database (and files) in batches.
+
+    Takes whatever has accumulated in the queue, up to :py:const:`BATCH_SIZE`, and inserts it in
+    one transaction. The waiting queries are notified afterwards.
+    """
+    while True:
+        batch = [pending.get()]
+        try:
+            while len(batch) < BATCH_SIZE:
+                batch.append(pending.get_nowait())
+        except Queue.Empty:
+            pass
+        try:
+            with db_lock:
+                connection.executemany(
+                    "INSERT INTO emails VALUES (?, ?, ?, ?, ?)", [row for row, _, _ in batch])
+                connection.commit()
+            with new_mail:
+                new_mail.notify_all()
+            if email_folder is not None:
+                for _, current_test_name, data in batch:
+                    save_email_file(current_test_name, data)
+        except Exception as e:
+            write("Could not store {} messages: {}".format(len(batch), str(e)))
+        finally:
+            for _ in batch:
+                pending.task_done()
 
 
 @route("/set_test_name")
@@ -115,41 +156,41 @@ def set_test_name():
         return json.dumps(False)
 
 
-@route("/messages")
-def all_messages():
-    """Return a JSON with all e-mails (eventually filtered)"""
-    response.content_type = "application/json"
+def build_query(query):
+    """Builds the SQL selecting the e-mails matching the filter in the request query.
 
+    Returns: Tuple of SQL and its bindings.
+    """
     # Build SQL
     sql = 'SELECT * FROM emails'
 
     # Build WHERE clause(s)
     bindings = ()
     where_clause = list()
-    if request.query.from_address:
+    if query.from_address:
         where_clause.append("from_address = ?")
-        bindings += (request.query.from_address,)
-    if request.query.to_address:
+        bindings += (query.from_address,)
+    if query.to_address:
         where_clause.append("to_address = ?")
-        bindings += (request.query.to_address,)
-    if request.query.subject:
+        bindings += (query.to_address,)
+    if query.subject:
         where_clause.append("subject = ?")
-        bindings += (request.query.subject,)
-    if request.query.subject_like:
+        bindings += (query.subject,)
+    if query.subject_like:
         where_clause.append("subject LIKE ?")
-        bindings += (request.query.subject_like,)
-    if request.query.text_like:
+        bindings += (query.subject_like,)
+    if query.text_like:
         where_clause.append("text LIKE ?")
-        bindings += (request.query.text_like,)
-    if request.query.text:
+        bindings += (query.text_like,)
+    if query.text:
         where_clause.append("text = ?")
-        bindings += (request.query.text,)
-    if request.query.time_from:
-        time = parsetime.from_request_format(request.query.time_from)
+        bindings += (query.text,)
+    if query.time_from:
+        time = parsetime.from_request_format(query.time_from)
         where_clause.append("time >= ?")
         bindings += (time,)
-    if request.query.time_to:
-        time = parsetime.from_request_format(request.query.time_to)
+    if query.time_to:
+        time = parsetime.from_request_format(query.time_to)
         where_clause.append("time <= ?")
         bindings += (time,)
 
@@ -158,15 +199,41 @@ def all_messages():
 
     # Order by time arrived
     sql += " ORDER BY time ASC"
+    return sql, bindings
 
+
+def select_messages(sql, bindings):
     with db_lock:
-        global connection
-        db = connection.cursor()
-        # execute query
-        c = db.execute(sql, bindings)
+        rows = connection.cursor().execute(sql, bindings).fetchall()
+    return [dict(zip(ROWS, row)) for row in rows]
+
 
-        rows = c.fetchall()
-        return json.dumps([dict(zip(ROWS, row)) for row in rows])
+@route("/messages")
+def all_messages():
+    """Return a JSON with all e-mails (eventually filtered)"""
+    response.content_type = "application/json"
+    return json.dumps(select_messages(*build_query(request.query)))
+
+
+@route("/messages/wait")
+def wait_for_messages():
+    """Blocks until at least ``count`` e-mails match the filter or ``timeout`` seconds pass.
+
+    Takes the same filters as ``/messages``. Returns a JSON with the matching e-mails, the caller
+    checks whether there is enough of them.
+    """
+    response.content_type = "application/json"
+    wanted = int(request.query.count or 1)
+    timeout = min(float(request.query.timeout or 60), MAX_WAIT_TIMEOUT)
+    sql, bindings = build_query(request.query)
+    deadline = _time.time() + timeout
+    with new_mail:
+        while True:
+            messages = select_messages(sql, bindings)
+            remaining = deadline - _time.time()
+            if len(messages) >= wanted or remaining <= 0:
+                return json.dumps(messages)
+            new_mail.wait(remaining)
 
 
 @route("/messages.html")
@@ -184,8 +251,9 @@ def all_messages_in_html():
 def clear_database():
     """Clear the e-mail database"""
     response.content_type = "application/json"
+    # Messages received before the request must not turn up afterwards
+    pending.join()
     with db_lock:
-        global connection
         cursor = connection.cursor()
         cursor.execute("DELETE FROM emails")
         connection.commit()
@@ -202,7 +270,7 @@ def run_email_server(port=1025):
 
 def run_email_query(port=1026):
     try:
-        run(host="0.0.0.0", port=port, quiet=True)
+        run(host="0.0.0.0", port=port, quiet=True, server=ThreadingServer)
     except KeyboardInterrupt:
         pass
 
@@ -221,6 +289,8 @@ if __name__ == "__main__":
     email_thread.daemon = True
     query_thread = threading.Thread(target=run_email_query, args=(args.query_port,))
     query_thread.daemon = True
+    writer_thread = threading.Thread(target=write_messages)
+    writer_thread.daemon = True
     # Prepare folders
     if not email_path.exists():
         email_path.mkdir()
@@ -236,6 +306,7 @@ if __name__ == "__main__":
         latest_path_symlink.remove()
     latest_path_symlink.mksymlinkto(email_folder)
     # RUN!
+    writer_thread.start()
     email_thread.start()
     query_thread.start()
     write("Threads started ...")
@@ -1,35 +1,33 @@
 #!/usr/bin/env python
 """Populate template tracker with information based on cfme_data"""
 import sys
-import traceback
 from collections import defaultdict
-from threading import Lock, Thread
 
 from slumber.exceptions import SlumberHttpBaseException
 
 from utils import trackerbot
 from utils.conf import cfme_data
-from utils.providers import list_all_providers, get_mgmt
+from utils.providers import list_all_providers
+from utils.sweep import Sweep
 
 
 def main(trackerbot_url, mark_usable=None):
     api = trackerbot.api(trackerbot_url)
 
-    thread_q = []
-    thread_lock = Lock()
     template_providers = defaultdict(list)
     all_providers = set(list_all_providers())
-    unresponsive_providers = set()
-    # Queue up list_template calls
-    for provider_key in all_providers:
-        thread = Thread(target=get_provider_templates,
-            args=(provider_key, template_providers, unresponsive_providers, thread_lock))
-        thread_q.append(thread)
-        thread.start()
-
-    # Join the queued calls
-    for thread in thread_q:
-        thread.join()
+    # Run the list_template calls in parallel
+    provider_templates, failed = Sweep().run(all_providers, get_provider_templates)
+    for provider_key, exc in failed.items():
+        print provider_key, 'failed:', str(exc)
+    unresponsive_providers = set(failed)
+    for provider_key, templates in provider_templates.items():
+        print provider_key, 'returned %d templates' % len(templates)
+        for template in templates:
+            # If it ends with 'db', skip it, it's a largedb/nodb variant
+            if str(template).lower().endswith('db'):
+                continue
+            template_providers[template].append(provider_key)
 
     seen_templates = set()
 
@@ -107,28 +105,15 @@ def main(trackerbot_url, mark_usable=None):
     #             trackerbot.set_provider_active(True)
 
 
-def get_provider_templates(provider_key, template_providers, unresponsive_providers, thread_lock):
+def get_provider_templates(provider_key, provider_mgmt):
     # functionalized to make it easy to farm this out to threads
-    provider_mgmt = get_mgmt(provider_key)
-    try:
-        if cfme_data['management_systems'][provider_key]['type'] == 'ec2':
-            # dirty hack to filter out ec2 public images, because there are literally hundreds.
-            templates = provider_mgmt.api.get_all_images(owners=['self'],
-                filters={'image-type': 'machine'})
-            templates = map(lambda i: i.name or i.id, templates)
-        else:
-            templates = provider_mgmt.list_template()
-        print provider_key, 'returned %d templates' % len(templates)
-        with thread_lock:
-            for template in templates:
-                # If it ends with 'db', skip it, it's a largedb/nodb variant
-                if str(template).lower().endswith('db'):
-                    continue
-                template_providers[template].append(provider_key)
-    except:
-        print provider_key, 'failed:', traceback.format_exc().splitlines()[-1]
-        with thread_lock:
-            unresponsive_providers.add(provider_key)
+    if cfme_data['management_systems'][provider_key]['type'] == 'ec2':
+        # dirty hack to filter out ec2 public images, because there are literally hundreds.
+        templates = provider_mgmt.api.get_all_images(owners=['self'],
+            filters={'image-type': 'machine'})
+        return map(lambda i: i.name or i.id, templates)
+    else:
+        return provider_mgmt.list_template()
 
 
 def parse_cmdline():
@@ -14,20 +14,31 @@ The scripts for respective providers are:
     - template_upload_rhevm.py
     - template_upload_rhos.py
     - template_upload_vsphere.py
+
+The uploads to the providers run in parallel. The images for RHEVM and vSphere are downloaded only
+once into the local :py:class:`utils.image_cache.ImageCache`, verified against the SHA256SUM file
+and uploaded from there; an interrupted download or RHEVM upload continues where it stopped when
+the script is run again. OpenStack fetches the image from the URL itself.
 """
 
 import argparse
 import re
 import datetime
+import threading
+import time
+import traceback
 
 from contextlib import closing
 from urllib2 import urlopen, HTTPError
 
 from utils.conf import cfme_data
+from utils.image_cache import ImageCache, get_checksums, stats
 
 
 CFME_BREW_ID = "cfme"
 NIGHTLY_MIQ_ID = "manageiq"
+# Modules which upload the image from the local cache
+CACHED_MODULES = {'template_upload_rhevm', 'template_upload_vsphere'}
 
 
 def parse_cmd_line():
@@ -41,6 +52,12 @@ def parse_cmd_line():
     parser.add_argument('--provider-version', dest='provider_version',
                         help='Version of chosen provider',
                         default=None)
+    parser.add_argument('--workers', dest='workers', type=int,
+                        help='How many uploads can run at once',
+                        default=4)
+    parser.add_argument('--provider-workers', dest='provider_workers', type=int,
+                        help='How many uploads can run at once on one provider',
+                        default=1)
     args = parser.parse_args()
     return args
 
@@ -232,16 +249,10 @@ def browse_directory(dir_url):
     return name_dict
 
 
-if __name__ == "__main__":
-
-    args = parse_cmd_line()
-
-    urls = cfme_data['basic_info']['cfme_images_url']
-    stream = args.stream or cfme_data['template_upload']['stream']
+def make_jobs(urls, stream, provider_type, provider_version):
+    """Returns list of ``(module, provider, kwargs, checksum)`` of the uploads to run."""
     mgmt_sys = cfme_data['management_systems']
-    provider_type = args.provider_type or cfme_data['template_upload']['provider_type']
-    provider_version = args.provider_version or cfme_data['template_upload']['provider_version']
-
+    jobs = []
     for key, url in urls.iteritems():
         if stream is not None:
             if key != stream:
@@ -251,7 +262,7 @@ if __name__ == "__main__":
             continue
         checksum_url = url + "SHA256SUM"
         try:
-            o = urlopen(checksum_url)
+            checksums = get_checksums(checksum_url)
         except Exception:
             print "No valid checksum file for %s. Skipping..." % key
             continue
@@ -295,13 +306,69 @@ if __name__ == "__main__":
                             get_version(url)
                         )
 
-                    print "---Start of %s: %s---" % (module, provider)
+                    checksum = checksums.get(dir_files[module].split("/")[-1])
+                    jobs.append((module, provider, kwargs, checksum))
+                    kwargs = {}
+    return jobs
+
+
+def run_jobs(jobs, workers, provider_workers, cache=None):
+    """Runs the uploads in parallel, at most ``provider_workers`` of them on one provider."""
+    cache = cache or ImageCache()
+    slots = threading.BoundedSemaphore(workers)
+    provider_slots = {}
+    for __, provider, __, __ in jobs:
+        provider_slots.setdefault(provider, threading.BoundedSemaphore(provider_workers))
 
-                    try:
-                        getattr(__import__(module), "run")(**kwargs)
-                    except Exception as woops:
-                        print "Exception: Module '%s' with provider '%s' exitted with error." \
-                            % (module, provider)
-                        print woops
+    def run_job(module, provider, kwargs, checksum):
+        try:
+            if module in CACHED_MODULES:
+                if checksum is None:
+                    print "No checksum for %s, %s will download it itself." % (
+                        kwargs['image_url'], provider)
+                else:
+                    local_image = cache.fetch(kwargs['image_url'], checksum)
+                    if module == 'template_upload_rhevm':
+                        kwargs['local_image'] = local_image.strpath
+                        kwargs['image_checksum'] = checksum
+                    else:
+                        # ovftool reads local files as well
+                        kwargs['image_url'] = local_image.strpath
+            with provider_slots[provider], slots:
+                print "---Start of %s: %s---" % (module, provider)
+                start = time.time()
+                getattr(__import__(module), "run")(**kwargs)
+                print "---End of %s: %s (%.0f s)---" % (module, provider, time.time() - start)
+        except (Exception, SystemExit) as woops:
+            # The modules call sys.exit() on errors
+            print "Exception: Module '%s' with provider '%s' exitted with error." \
+                % (module, provider)
+            print woops
+            print traceback.format_exc()
+
+    threads = []
+    for job in jobs:
+        thread = threading.Thread(target=run_job, args=job)
+        thread.daemon = True
+        threads.append(thread)
+        thread.start()
+    for thread in threads:
+        # Joining with timeout keeps the main thread responsive to KeyboardInterrupt
+        while thread.is_alive():
+            thread.join(1)
+
+    for line in stats.report():
+        print line
+
+
+if __name__ == "__main__":
+
+    args = parse_cmd_line()
+
+    urls = cfme_data['basic_info']['cfme_images_url']
+    stream = args.stream or cfme_data['template_upload']['stream']
+    provider_type = args.provider_type or cfme_data['template_upload']['provider_type']
+    provider_version = args.provider_version or cfme_data['template_upload']['provider_version']
 
-                    print "---End of %s: %s---" % (module, provider)
+    jobs = make_jobs(urls, stream, provider_type, provider_version)
+    run_jobs(jobs, args.workers, args.provider_workers)
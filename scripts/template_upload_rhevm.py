@@ -12,12 +12,14 @@ normally be placed in main function, are located in function run(**kwargs).
 import argparse
 import fauxfactory
 import sys
+import time
 
 from ovirtsdk.api import API
 from ovirtsdk.xml import params
 
 from utils.conf import cfme_data
 from utils.conf import credentials
+from utils.image_cache import stats
 from utils.ssh import SSHClient
 from utils.wait import wait_for
 
@@ -82,6 +84,28 @@ def download_ova(ssh_client, ovaurl):
         sys.exit(127)
 
 
+def upload_ova(ssh_client, rhevip, local_image, ovaname, checksum):
+    """Uploads ova file from the local image cache, continues an interrupted upload.
+
+    Args:
+        ssh_client: :py:class:`utils.ssh.SSHClient` instance
+        rhevip: IP of chosen RHEVM provider.
+        local_image: Path to the local ova file
+        ovaname: Name of ova file
+        checksum: SHA256 checksum of the ova file
+    """
+    start = time.time()
+    offset, sent = ssh_client.put_file_resumable(local_image, ovaname)
+    stats.add("upload", "%s to %s" % (ovaname, rhevip), sent, time.time() - start)
+    if offset:
+        # The beginning came from an earlier run, check it is the same image
+        exit_status, output = ssh_client.run_command('sha256sum %s' % ovaname)
+        if exit_status != 0 or output.split()[0] != checksum:
+            print "RHEVM: Resumed upload does not match the checksum, uploading again..."
+            ssh_client.run_command('rm -f %s' % ovaname)
+            ssh_client.put_file_resumable(local_image, ovaname)
+
+
 def template_from_ova(api, username, password, rhevip, edomain, ovaname, ssh_client):
     """Uses rhevm-image-uploader to make a template from ova file.
 
@@ -428,8 +452,13 @@ def run(**kwargs):
         print "RHEVM: Found finished template with this name."
         print "RHEVM: The script will now end."
     else:
-        print "RHEVM: Downloading .ova file..."
-        download_ova(ssh_client, kwargs.get('image_url'))
+        if kwargs.get('local_image'):
+            print "RHEVM: Uploading .ova file..."
+            upload_ova(ssh_client, rhevip, kwargs.get('local_image'), ovaname,
+                       kwargs.get('image_checksum'))
+        else:
+            print "RHEVM: Downloading .ova file..."
+            download_ova(ssh_client, kwargs.get('image_url'))
         try:
             print "RHEVM: Templatizing .ova file..."
             template_from_ova(api, username, password, rhevip, kwargs.get('edomain'),
@@ -0,0 +1,64 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""Microbenchmark of :py:class:`utils.version.Version` and :py:func:`utils.version.pick`.
+
+Compares the interned versions and the pick lookup table with what it costs when the caches
+are empty every time, which is how it worked before they were introduced.
+
+Usage:
+
+   scripts/version_benchmark.py [--number 10000] [--current 5.5.0.1]
+"""
+import argparse
+import timeit
+
+from utils import version
+from utils.version import Version
+
+LOCATOR = {
+    '5.3': '//div[@id="old"]',
+    '5.4': '//div[@id="older"]',
+    '5.5': '//div[@id="new"]',
+    version.LATEST: '//div[@id="upstream"]',
+}
+
+
+def compare():
+    return Version('5.4.1.2') < '5.5' and Version('5.5.0.1') >= Version('5.5')
+
+
+def compare_uncached():
+    Version._cache.clear()
+    return compare()
+
+
+def pick():
+    return version.pick(LOCATOR)
+
+
+def pick_uncached():
+    Version._cache.clear()
+    version._pick_table.clear()
+    return version.pick(LOCATOR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=10000, help='Iterations of each case')
+    parser.add_argument('--current', default='5.5.0.1', help='Current appliance version')
+    args = parser.parse_args()
+
+    current = Version(args.current)
+    # No appliance needed
+    version.current_version = lambda: current
+
+    for name, cached, uncached in [('compare', compare, compare_uncached),
+                                   ('pick', pick, pick_uncached)]:
+        fast = timeit.timeit(cached, number=args.number)
+        slow = timeit.timeit(uncached, number=args.number)
+        print '{:8} {:8.2f} us cached, {:8.2f} us uncached, {:.1f}x'.format(
+            name, fast * 1e6 / args.number, slow * 1e6 / args.number, slow / fast)
+
+
+if __name__ == '__main__':
+    main()
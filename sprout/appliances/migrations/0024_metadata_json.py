@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+import yaml
+
+from django.db import models, migrations
+
+MODELS = ['appliance', 'appliancepool', 'delayedprovisiontask', 'group', 'provider', 'template']
+
+
+def metadata_to_json(apps, schema_editor):
+    for model_name in MODELS:
+        model = apps.get_model('appliances', model_name)
+        for pk, data in model.objects.values_list('pk', 'object_meta_data'):
+            try:
+                json.loads(data)
+                continue  # Already converted
+            except ValueError:
+                pass
+            try:
+                converted = json.dumps(yaml.load(data) or {})
+            except (TypeError, ValueError, yaml.YAMLError):
+                # Not representable in JSON, the models can still read it
+                continue
+            model.objects.filter(pk=pk).update(object_meta_data=converted)
+
+
+def metadata_to_yaml(apps, schema_editor):
+    for model_name in MODELS:
+        model = apps.get_model('appliances', model_name)
+        for pk, data in model.objects.values_list('pk', 'object_meta_data'):
+            try:
+                converted = yaml.dump(json.loads(data))
+            except ValueError:
+                continue  # Still YAML
+            model.objects.filter(pk=pk).update(object_meta_data=converted)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appliances', '0023_provider_disabled'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name=model_name,
+            name='object_meta_data',
+            field=models.TextField(default=b'{}'),
+        )
+        for model_name in MODELS
+    ] + [
+        migrations.RunPython(metadata_to_json, metadata_to_yaml),
+    ]
@@ -1,12 +1,18 @@
 # -*- coding: utf-8 -*-
+import json
+import threading
 import yaml
 
 from celery import chain
 from contextlib import contextmanager
+from copy import deepcopy
 from datetime import timedelta, date
 from django.contrib.auth.models import User
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import models, transaction
+from django.db import connection, models, transaction
+from django.db.models import Case, Count, IntegerField, Sum, When
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from django.utils import timezone
 
 from sprout import critical_section
@@ -38,10 +44,45 @@ def apply_if_not_none(o, meth, *args, **kwargs):
     return getattr(o, meth)(*args, **kwargs)
 
 
+# Holds the ProviderCapacity of the running capacity_snapshot()
+_capacity = threading.local()
+
+
+@contextmanager
+def capacity_snapshot():
+    """Makes the load related properties of the providers read from a :py:class:`ProviderCapacity`.
+
+    The snapshot is kept up to date with the appliances created meanwhile. Nested uses share the
+    outermost snapshot.
+    """
+    snapshot = getattr(_capacity, "snapshot", None)
+    if snapshot is not None:
+        yield snapshot
+        return
+    _capacity.snapshot = ProviderCapacity()
+    try:
+        yield _capacity.snapshot
+    finally:
+        _capacity.snapshot = None
+
+
+def load_metadata(data):
+    try:
+        return json.loads(data)
+    except ValueError:
+        # Stored as YAML before, the rows which could not be converted to JSON stay so
+        return yaml.load(data)
+
+
+@contextmanager
+def _no_lock():
+    yield
+
+
 class MetadataMixin(models.Model):
     class Meta:
         abstract = True
-    object_meta_data = models.TextField(default=yaml.dump({}))
+    object_meta_data = models.TextField(default=json.dumps({}))
 
     def reload(self):
         new_self = self.__class__.objects.get(pk=self.pk)
@@ -55,25 +96,40 @@ class MetadataMixin(models.Model):
 
     @property
     def metadata(self):
-        return yaml.load(self.object_meta_data)
+        """The metadata, parsed only once for each value of ``object_meta_data``.
+
+        Returns a copy, so changing it does not change the cached value.
+        """
+        data = self.object_meta_data
+        cached = self.__dict__.get("_metadata_cache")
+        if cached is None or cached[0] is not data:
+            cached = self._metadata_cache = (data, load_metadata(data))
+        return deepcopy(cached[1])
 
     @metadata.setter
     def metadata(self, value):
         if not isinstance(value, dict):
             raise TypeError("You can store only dict in metadata!")
-        self.object_meta_data = yaml.dump(value)
+        self.object_meta_data = json.dumps(value)
 
     @property
     @contextmanager
     def edit_metadata(self):
+        """Edits the metadata as they are in the database, only the metadata column is updated.
+
+        The row is locked by the database during the edit. The global lock is used only with
+        databases which cannot do that.
+        """
+        lock = _no_lock() if connection.features.has_select_for_update else self.metadata_lock
         with transaction.atomic():
-            with self.metadata_lock:
-                o = type(self).objects.get(pk=self.pk)
-                metadata = o.metadata
+            with lock:
+                data = type(self).objects.select_for_update().filter(pk=self.pk).values_list(
+                    "object_meta_data", flat=True).get()
+                metadata = load_metadata(data)
                 yield metadata
-                o.metadata = metadata
-                o.save()
-        self.reload()
+                self.metadata = metadata
+                type(self).objects.filter(pk=self.pk).update(
+                    object_meta_data=self.object_meta_data)
 
     @property
     def logger(self):
@@ -116,13 +172,19 @@ class Provider(MetadataMixin):
 
     @property
     def num_currently_provisioning(self):
-        return len(
-            Appliance.objects.filter(
-                ready=False, marked_for_deletion=False, template__provider=self, ip_address=None))
+        snapshot = getattr(_capacity, "snapshot", None)
+        if snapshot is not None:
+            return snapshot.provisioning.get(self.id, 0)
+        return Appliance.objects.filter(
+            ready=False, marked_for_deletion=False, template__provider=self,
+            ip_address=None).count()
 
     @property
     def num_templates_preparing(self):
-        return len(Template.objects.filter(provider=self, ready=False))
+        snapshot = getattr(_capacity, "snapshot", None)
+        if snapshot is not None:
+            return snapshot.templates_preparing.get(self.id, 0)
+        return Template.objects.filter(provider=self, ready=False).count()
 
     @property
     def remaining_configuring_slots(self):
@@ -142,7 +204,10 @@ class Provider(MetadataMixin):
 
     @property
     def num_currently_managing(self):
-        return len(Appliance.objects.filter(template__provider=self))
+        snapshot = getattr(_capacity, "snapshot", None)
+        if snapshot is not None:
+            return snapshot.managing.get(self.id, 0)
+        return Appliance.objects.filter(template__provider=self).count()
 
     @property
     def currently_managed_appliances(self):
@@ -293,6 +358,35 @@ class Provider(MetadataMixin):
         return "{} {}".format(self.__class__.__name__, self.id)
 
 
+class ProviderCapacity(object):
+    """Numbers of appliances and templates the load of all providers is computed from.
+
+    Obtained by one aggregate query for the appliances and one for the templates.
+    """
+    def __init__(self):
+        self.managing = {}
+        self.provisioning = {}
+        self.templates_preparing = {}
+        appliances = Appliance.objects.order_by().values("template__provider").annotate(
+            managing=Count("id"),
+            provisioning=Sum(Case(
+                When(ready=False, marked_for_deletion=False, ip_address=None, then=1),
+                default=0, output_field=IntegerField())))
+        for row in appliances:
+            self.managing[row["template__provider"]] = row["managing"]
+            self.provisioning[row["template__provider"]] = row["provisioning"] or 0
+        templates = Template.objects.filter(ready=False).order_by().values("provider").annotate(
+            preparing=Count("id"))
+        for row in templates:
+            self.templates_preparing[row["provider"]] = row["preparing"]
+
+    def appliance_added(self, appliance):
+        provider_id = appliance.template.provider_id
+        self.managing[provider_id] = self.managing.get(provider_id, 0) + 1
+        if not appliance.ready and not appliance.marked_for_deletion and not appliance.ip_address:
+            self.provisioning[provider_id] = self.provisioning.get(provider_id, 0) + 1
+
+
 class Group(MetadataMixin):
     id = models.CharField(max_length=32, primary_key=True,
         help_text="Group name as trackerbot says. (eg. upstream, downstream-53z, ...)")
@@ -739,6 +833,13 @@ class Appliance(MetadataMixin):
             return None
 
 
+@receiver(post_save, sender=Appliance)
+def _appliance_created(sender, instance, created, **kwargs):
+    snapshot = getattr(_capacity, "snapshot", None)
+    if created and snapshot is not None:
+        snapshot.appliance_added(instance)
+
+
 class AppliancePool(MetadataMixin):
     total_count = models.IntegerField(help_text="How many appliances should be in this pool.")
     group = models.ForeignKey(Group, help_text="Group which is used to provision appliances.")
@@ -851,10 +952,11 @@ class AppliancePool(MetadataMixin):
 
     @property
     def possible_provisioning_templates(self):
-        return sorted(
-            filter(lambda tpl: tpl.provider.free, self.possible_templates),
-            # Sort by date and load to pick the best match (least loaded provider)
-            key=lambda tpl: (tpl.date, 1.0 - tpl.provider.appliance_load), reverse=True)
+        with capacity_snapshot():
+            return sorted(
+                filter(lambda tpl: tpl.provider.free, self.possible_templates),
+                # Sort by date and load to pick the best match (least loaded provider)
+                key=lambda tpl: (tpl.date, 1.0 - tpl.provider.appliance_load), reverse=True)
 
     @property
     def possible_providers(self):
@@ -968,12 +1070,13 @@ class AppliancePool(MetadataMixin):
 
     @property
     def num_possible_provisioning_slots(self):
-        providers = set([])
-        for template in self.possible_provisioning_templates:
-            providers.add(template.provider)
-        slots = 0
-        for provider in providers:
-            slots += provider.remaining_provisioning_slots
+        with capacity_snapshot():
+            providers = set([])
+            for template in self.possible_provisioning_templates:
+                providers.add(template.provider)
+            slots = 0
+            for provider in providers:
+                slots += provider.remaining_provisioning_slots
         return slots
 
     @property
@@ -982,8 +1085,9 @@ class AppliancePool(MetadataMixin):
         for template in self.possible_templates:
             providers.add(template.provider)
         slots = 0
-        for provider in providers:
-            slots += provider.remaining_appliance_slots
+        with capacity_snapshot():
+            for provider in providers:
+                slots += provider.remaining_appliance_slots
         return slots
 
     @property
@@ -6,6 +6,7 @@ import hashlib
 import random
 import re
 import command
+import time
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.mail import send_mail
@@ -19,7 +20,7 @@ from novaclient.exceptions import OverLimit as OSOverLimit
 
 from appliances.models import (
     Provider, Group, Template, Appliance, AppliancePool, DelayedProvisionTask,
-    MismatchVersionMailer, User)
+    MismatchVersionMailer, User, capacity_snapshot)
 from sprout import settings, redis
 from sprout.log import create_logger
 
@@ -505,15 +506,16 @@ def request_appliance_pool(self, appliance_pool_id, time_minutes):
         "Appliance pool {} requested for {} minutes.".format(appliance_pool_id, time_minutes))
     pool = AppliancePool.objects.get(id=appliance_pool_id)
     n = Appliance.give_to_pool(pool)
-    for i in range(pool.total_count - n):
-        tpls = pool.possible_provisioning_templates
-        if tpls:
-            template_id = tpls[0].id
-            clone_template_to_pool(template_id, pool.id, time_minutes)
-        else:
-            with transaction.atomic():
-                task = DelayedProvisionTask(pool=pool, lease_time=time_minutes)
-                task.save()
+    with capacity_snapshot():
+        for i in range(pool.total_count - n):
+            tpls = pool.possible_provisioning_templates
+            if tpls:
+                template_id = tpls[0].id
+                clone_template_to_pool(template_id, pool.id, time_minutes)
+            else:
+                with transaction.atomic():
+                    task = DelayedProvisionTask(pool=pool, lease_time=time_minutes)
+                    task.save()
     apply_lease_times_after_pool_fulfilled.delay(appliance_pool_id, time_minutes)
 
 
@@ -553,36 +555,38 @@ def process_delayed_provision_tasks(self):
     Goes one task by one and when some of them can be provisioned, it starts the provisioning and
     then deletes the task.
     """
-    for task in DelayedProvisionTask.objects.order_by("id"):
-        if task.pool.not_needed_anymore:
-            task.delete()
-            continue
-        # Try retrieve from shepherd
-        appliances_given = Appliance.give_to_pool(task.pool, 1)
-        if appliances_given == 0:
-            # No free appliance in shepherd, so do it on our own
-            tpls = task.pool.possible_provisioning_templates
-            if task.provider_to_avoid is not None:
-                filtered_tpls = filter(lambda tpl: tpl.provider != task.provider_to_avoid, tpls)
-                if filtered_tpls:
-                    # There are other providers to provision on, so try one of them
-                    tpls = filtered_tpls
-                # If there is no other provider to provision on, we will use the original list.
-                # This will cause additional rejects until the provider quota is met
-            if tpls:
-                clone_template_to_pool(tpls[0].id, task.pool.id, task.lease_time)
+    with capacity_snapshot():
+        for task in DelayedProvisionTask.objects.order_by("id"):
+            if task.pool.not_needed_anymore:
                 task.delete()
+                continue
+            # Try retrieve from shepherd
+            appliances_given = Appliance.give_to_pool(task.pool, 1)
+            if appliances_given == 0:
+                # No free appliance in shepherd, so do it on our own
+                tpls = task.pool.possible_provisioning_templates
+                if task.provider_to_avoid is not None:
+                    filtered_tpls = filter(lambda tpl: tpl.provider != task.provider_to_avoid, tpls)
+                    if filtered_tpls:
+                        # There are other providers to provision on, so try one of them
+                        tpls = filtered_tpls
+                    # If there is no other provider to provision on, we will use the original list.
+                    # This will cause additional rejects until the provider quota is met
+                if tpls:
+                    clone_template_to_pool(tpls[0].id, task.pool.id, task.lease_time)
+                    task.delete()
+                else:
+                    # Try freeing up some space in provider
+                    for provider in task.pool.possible_providers:
+                        appliances = provider.free_shepherd_appliances.exclude(
+                            **task.pool.appliance_filter_params)
+                        if appliances:
+                            Appliance.kill(random.choice(appliances))
+                            break  # Just one
             else:
-                # Try freeing up some space in provider
-                for provider in task.pool.possible_providers:
-                    appliances = provider.free_shepherd_appliances.exclude(
-                        **task.pool.appliance_filter_params)
-                    if appliances:
-                        Appliance.kill(random.choice(appliances))
-                        break  # Just one
-        else:
-            # There was a free appliance in shepherd, so we took it and we don't need this task more
-            task.delete()
+                # There was a free appliance in shepherd, so we took it and we don't need this task
+                # more
+                task.delete()
 
 
 @logged_task()
@@ -926,16 +930,37 @@ def refresh_appliances(self):
         refresh_appliances_provider.delay(provider.id)
 
 
+def _bulk_update(model, changes):
+    """Updates changed fields of many rows with as few queries as possible.
+
+    Args:
+        model: The model class.
+        changes: A dict of ``{pk: {field: new_value}}``. The rows with the same changes are
+            updated in a single query.
+    """
+    groups = {}
+    for pk, changed in changes.iteritems():
+        groups.setdefault(tuple(sorted(changed.iteritems())), []).append(pk)
+    with transaction.atomic():
+        for changed, pks in groups.iteritems():
+            model.objects.filter(pk__in=pks).update(**dict(changed))
+    return len(groups)
+
+
 @singleton_task(soft_time_limit=180)
 def refresh_appliances_provider(self, provider_id):
     """Downloads the list of VMs from the provider, then matches them by name or UUID with
     appliances stored in database.
+
+    The appliances are loaded in one query, compared with the VMs in memory and only the changed
+    rows are written back.
     """
     self.logger.info("Refreshing appliances in {}".format(provider_id))
     provider = Provider.objects.get(id=provider_id)
     if not hasattr(provider.api, "all_vms"):
         # Ignore this provider
         return
+    start = time.time()
     vms = provider.api.all_vms()
     dict_vms = {}
     uuid_vms = {}
@@ -943,29 +968,49 @@ def refresh_appliances_provider(self, provider_id):
         dict_vms[vm.name] = vm
         if vm.uuid:
             uuid_vms[vm.uuid] = vm
-    for appliance in Appliance.objects.filter(template__provider=provider):
-        if appliance.uuid is not None and appliance.uuid in uuid_vms:
-            vm = uuid_vms[appliance.uuid]
+    provider_time = time.time() - start
+    start = time.time()
+    now = timezone.now()
+    changes = {}
+    appliances = Appliance.objects.filter(template__provider=provider).values(
+        "id", "name", "uuid", "ip_address", "power_state")
+    for appliance in appliances:
+        if appliance["uuid"] is not None and appliance["uuid"] in uuid_vms:
+            vm = uuid_vms[appliance["uuid"]]
             # Using the UUID and change the name if it changed
-            appliance.name = vm.name
-            appliance.ip_address = vm.ip
-            appliance.set_power_state(Appliance.POWER_STATES_MAPPING.get(
-                vm.power_state, Appliance.Power.UNKNOWN))
-            appliance.save()
-        elif appliance.name in dict_vms:
-            vm = dict_vms[appliance.name]
+            current = {
+                "name": vm.name,
+                "ip_address": vm.ip,
+                "power_state": Appliance.POWER_STATES_MAPPING.get(
+                    vm.power_state, Appliance.Power.UNKNOWN)}
+        elif appliance["name"] in dict_vms:
+            vm = dict_vms[appliance["name"]]
             # Using the name, and then retrieve uuid
-            appliance.uuid = vm.uuid
-            appliance.ip_address = vm.ip
-            appliance.set_power_state(Appliance.POWER_STATES_MAPPING.get(
-                vm.power_state, Appliance.Power.UNKNOWN))
-            appliance.save()
-            self.logger.info("Retrieved UUID for appliance {}/{}: {}".format(
-                appliance.id, appliance.name, appliance.uuid))
+            current = {
+                "uuid": vm.uuid,
+                "ip_address": vm.ip,
+                "power_state": Appliance.POWER_STATES_MAPPING.get(
+                    vm.power_state, Appliance.Power.UNKNOWN)}
+            if appliance["uuid"] != vm.uuid:
+                self.logger.info("Retrieved UUID for appliance {}/{}: {}".format(
+                    appliance["id"], appliance["name"], vm.uuid))
         else:
             # Orphaned :(
-            appliance.set_power_state(Appliance.Power.ORPHANED)
-            appliance.save()
+            current = {"power_state": Appliance.Power.ORPHANED}
+        changed = {
+            field: value for field, value in current.iteritems() if appliance[field] != value}
+        if "power_state" in changed:
+            self.logger.info("Appliance {}/{} changed power state to {}".format(
+                appliance["id"], appliance["name"], changed["power_state"]))
+            changed["power_state_changed"] = now
+        if changed:
+            changes[appliance["id"]] = changed
+    queries = _bulk_update(Appliance, changes)
+    self.logger.info(
+        "Refreshed {} appliances in {}, {} changed ({} update queries). "
+        "Provider took {:.2f}s, database {:.2f}s".format(
+            len(appliances), provider_id, len(changes), queries, provider_time,
+            time.time() - start))
 
 
 @singleton_task()
@@ -980,6 +1025,7 @@ def check_templates_in_provider(self, provider_id):
     self.logger.info("Initiated a periodic template check for {}".format(provider_id))
     provider = Provider.objects.get(id=provider_id)
     # Get templates and update metadata
+    start = time.time()
     try:
         templates = map(str, provider.api.list_template())
     except:
@@ -992,21 +1038,29 @@ def check_templates_in_provider(self, provider_id):
             metadata["templates"] = templates
     if not provider.working:
         return
+    provider_time = time.time() - start
     # Check Sprout template existence
+    start = time.time()
+    templates = set(templates)
+    changes = {}
+    sprout_templates = Template.objects.filter(provider=provider).values_list(
+        "pk", "name", "exists")
+    for pk, name, exists in sprout_templates:
+        if (name in templates) != exists:
+            changes[pk] = {"exists": name in templates}
+    _bulk_update(Template, changes)
+    self.logger.info(
+        "Checked {} templates in {}, {} changed. Provider took {:.2f}s, database {:.2f}s".format(
+            len(sprout_templates), provider_id, len(changes), provider_time,
+            time.time() - start))
     # expiration_time = (timezone.now() - timedelta(**settings.BROKEN_APPLIANCE_GRACE_TIME))
-    for template in Template.objects.filter(provider=provider):
-        with transaction.atomic():
-            tpl = Template.objects.get(pk=template.pk)
-            exists = tpl.name in templates
-            tpl.exists = exists
-            tpl.save()
-        # if not exists:
-        #     if len(Appliance.objects.filter(template=template).all()) == 0\
-        #             and template.status_changed < expiration_time:
-        #         # No other appliance is made from this template so no need to keep it
-        #         with transaction.atomic():
-        #             tpl = Template.objects.get(pk=template.pk)
-        #             tpl.delete()
+    # if not exists:
+    #     if len(Appliance.objects.filter(template=template).all()) == 0\
+    #             and template.status_changed < expiration_time:
+    #         # No other appliance is made from this template so no need to keep it
+    #         with transaction.atomic():
+    #             tpl = Template.objects.get(pk=template.pk)
+    #             tpl.delete()
 
 
 @singleton_task()
@@ -1149,8 +1203,12 @@ def generic_shepherd(self, preconfigured):
 
 @singleton_task()
 def free_appliance_shepherd(self):
-    generic_shepherd(self, True)
-    generic_shepherd(self, False)
+    for preconfigured in [True, False]:
+        start = time.time()
+        with capacity_snapshot():
+            generic_shepherd(self, preconfigured)
+        self.logger.info("Shepherd cycle ({}) took {:.2f}s".format(
+            "preconfigured" if preconfigured else "unconfigured", time.time() - start))
 
 
 @singleton_task()
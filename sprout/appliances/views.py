@@ -13,7 +13,8 @@ from django.template.base import add_to_builtins
 
 from appliances.api import json_response
 from appliances.models import (
-    Provider, AppliancePool, Appliance, Group, Template, MismatchVersionMailer, User)
+    Provider, AppliancePool, Appliance, Group, Template, MismatchVersionMailer, User,
+    capacity_snapshot)
 from appliances.tasks import (appliance_power_on, appliance_power_off, appliance_suspend,
     anyvm_power_on, anyvm_power_off, anyvm_suspend, anyvm_delete, delete_template_from_provider,
     appliance_rename, wait_appliance_ready, mark_appliance_ready, appliance_reboot)
@@ -44,7 +45,8 @@ def index(request):
 def providers(request):
     providers = Provider.objects.order_by("id")
     complete_usage = Provider.complete_user_usage()
-    return render(request, 'appliances/providers.html', locals())
+    with capacity_snapshot():
+        return render(request, 'appliances/providers.html', locals())
 
 
 def templates(request):
@@ -180,7 +182,8 @@ def providers_for_date_group_and_version(request):
             for provider in providers:
                 render_providers[provider.id] = {
                     "shepherd_count": shepherd_appliances[provider.id], "object": provider}
-    return render(request, 'appliances/_providers.html', locals())
+    with capacity_snapshot():
+        return render(request, 'appliances/_providers.html', locals())
 
 
 def my_appliances(request, show_user="my"):
@@ -7,6 +7,8 @@ import re
 import requests
 import simplejson
 from copy import copy
+from multiprocessing.pool import ThreadPool
+from requests.adapters import HTTPAdapter
 from utils.log import logger
 from utils.version import Version
 from utils.wait import wait_for
@@ -17,6 +19,10 @@ class APIException(Exception):
 
 
 class API(object):
+    # How many connections to the appliance are kept open, also the number of concurrent requests
+    # made by :py:meth:`reload_entities`
+    POOL_SIZE = 8
+
     def __init__(self, entry_point, auth):
         self._entry_point = entry_point
         if isinstance(auth, dict):
@@ -25,6 +31,13 @@ class API(object):
             self._auth = tuple(auth[:2])
         else:
             raise ValueError("Unknown values provider for auth")
+        # One keep-alive session for all requests, so the TLS handshake is not done every time
+        self._session = requests.Session()
+        self._session.auth = self._auth
+        self._session.verify = False
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.POOL_SIZE)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
         self._load_data()
 
     def _load_data(self):
@@ -54,7 +67,7 @@ class API(object):
 
     def get(self, url, **get_params):
         logger.info("[RESTAPI] GET {} {}".format(url, repr(get_params)))
-        data = requests.get(url, auth=self._auth, params=get_params, verify=False)
+        data = self._session.get(url, params=get_params)
         try:
             data = data.json()
         except simplejson.scanner.JSONDecodeError:
@@ -63,7 +76,7 @@ class API(object):
 
     def post(self, url, **payload):
         logger.info("[RESTAPI] POST {} {}".format(url, repr(payload)))
-        data = requests.post(url, auth=self._auth, data=json.dumps(payload), verify=False)
+        data = self._session.post(url, data=json.dumps(payload))
         try:
             data = data.json()
         except simplejson.scanner.JSONDecodeError:
@@ -75,7 +88,7 @@ class API(object):
 
     def delete(self, url, **payload):
         logger.info("[RESTAPI] DELETE {} {}".format(url, repr(payload)))
-        data = requests.delete(url, auth=self._auth, data=json.dumps(payload), verify=False)
+        data = self._session.delete(url, data=json.dumps(payload))
         try:
             data = data.json()
         except simplejson.scanner.JSONDecodeError:
@@ -96,6 +109,28 @@ class API(object):
             entity.reload(attributes=attributes)
         return entity
 
+    def reload_entities(self, entities, **reload_kwargs):
+        """Reloads a list of entities concurrently.
+
+        Same as calling ``entity.reload(**reload_kwargs)`` for each of the entities, but up to
+        :py:attr:`POOL_SIZE` requests are in flight at once.
+
+        Returns:
+            The list of the entities
+        """
+        entities = list(entities)
+        if len(entities) < 2:
+            for entity in entities:
+                entity.reload(**reload_kwargs)
+            return entities
+        pool = ThreadPool(min(self.POOL_SIZE, len(entities)))
+        try:
+            pool.map(lambda entity: entity.reload(**reload_kwargs), entities)
+        finally:
+            pool.close()
+            pool.join()
+        return entities
+
     def api_version(self, version):
         return type(self)(self._versions[version], self._auth)
 
@@ -146,34 +181,107 @@ class CollectionsIndex(object):
             return collection in self.all
 
 
+def paginate(api, href, page_size, first_page=None, **params):
+    """Yields the resources of a collection query page by page, using offset and limit.
+
+    The next page is requested in the background while the resources of the current page are
+    being consumed.
+
+    Args:
+        api: :py:class:`API` to use for the requests.
+        href: The collection href.
+        page_size: How many resources to ask for in one request.
+        first_page: The response for offset 0, if it was already requested.
+        **params: Other query parameters, like filters and expand.
+    """
+    def fetch(offset):
+        return api.get(href, offset=offset, limit=page_size, **params)
+
+    pool = ThreadPool(1)
+    try:
+        page = first_page if first_page is not None else fetch(0)
+        offset = 0
+        previous_resources = None
+        while True:
+            resources = page["resources"]
+            # The same page again means the server ignores offset and limit
+            if not resources or resources == previous_resources:
+                return
+            previous_resources = resources
+            offset += len(resources)
+            # Total number of the (filtered) resources, if the server tells it
+            total = page.get("subquery_count", page.get("count"))
+            # A short page is the last one. A longer one means the server does not page at all.
+            if len(resources) == page_size and (total is None or offset < total):
+                next_page = pool.apply_async(fetch, (offset, ))
+            else:
+                next_page = None
+            for resource in resources:
+                yield resource
+            if next_page is None:
+                return
+            page = next_page.get()
+    finally:
+        pool.terminate()
+
+
 class SearchResult(object):
-    def __init__(self, collection, data):
+    """Result of :py:meth:`Collection.find_by`.
+
+    The resources are loaded page by page while being iterated over or indexed, so
+    ``resources`` contains only the entities loaded so far.
+    """
+    def __init__(self, collection, data, params, page_size):
         self.collection = collection
         self.count = data.pop("count")
-        self.subcount = data.pop("subcount")
         self.name = data.pop("name")
         self.resources = []
-        for resource in data["resources"]:
-            self.resources.append(Entity(collection, resource))
+        self._stream = (
+            Entity(collection, resource)
+            for resource in paginate(
+                collection.api, collection._href, page_size, first_page=data, **params))
+
+    def _load(self, position=None):
+        # Loads the entities up to the position, or all if it is None
+        for entity in self._stream:
+            self.resources.append(entity)
+            if position is not None and len(self.resources) > position:
+                break
+
+    @property
+    def subcount(self):
+        return len(self)
 
     def __iter__(self):
-        for resource in self.resources:
-            resource.reload()
-            yield resource
+        position = 0
+        while True:
+            if position >= len(self.resources):
+                self._load(position)
+                if position >= len(self.resources):
+                    return
+            yield self.resources[position]
+            position += 1
 
     def __getitem__(self, position):
-        entity = self.resources[position]
-        entity.reload()
-        return entity
+        self._load(position if position >= 0 else None)
+        return self.resources[position]
+
+    def __nonzero__(self):
+        self._load(0)
+        return bool(self.resources)
 
     def __len__(self):
-        return self.subcount
+        self._load()
+        return len(self.resources)
 
     def __repr__(self):
         return "<SearchResult for {}>".format(repr(self.collection))
 
 
 class Collection(object):
+    # How many resources are requested at once when streaming
+    PAGE_SIZE = 500
+
     def __init__(self, api, href, name, description=None):
         self._api = api
         self._href = href
@@ -186,13 +294,17 @@ class Collection(object):
     def api(self):
         return self._api
 
-    def reload(self, expand=False):
+    def reload(self, expand=False, attributes=None):
         if expand is True:
             kwargs = {"expand": "resources"}
         elif expand:
             kwargs = {"expand": expand}
         else:
             kwargs = {}
+        if attributes is not None:
+            if isinstance(attributes, basestring):
+                attributes = [attributes]
+            kwargs["attributes"] = ",".join(attributes)
         self._data = self._api.get(self._href, **kwargs)
         self._resources = self._data["resources"]
         self._count = self._data["count"]
@@ -224,8 +336,7 @@ class Collection(object):
         search_query = []
         for key, value in params.iteritems():
             search_query.append("{} = {}".format(key, repr(str(value))))
-        return SearchResult(
-            self, self._api.get(self._href, **{"sqlfilter": " AND ".join(search_query)}))
+        return self._search({"sqlfilter": " AND ".join(search_query)})
 
     def _find_by_filter(self, **params):
         search_query = []
@@ -234,7 +345,28 @@ class Collection(object):
                 search_query.append("{}={}".format(key, value))
             else:
                 search_query.append("{}={}".format(key, repr(str(value))))
-        return SearchResult(self, self._api.get(self._href, **{"filter[]": search_query}))
+        return self._search({"filter[]": search_query})
+
+    def _search(self, params):
+        # The first page is requested right away, so a bad query raises here
+        params = dict(params, expand="resources")
+        first_page = self._api.get(self._href, offset=0, limit=self.PAGE_SIZE, **params)
+        return SearchResult(self, first_page, params, self.PAGE_SIZE)
+
+    def stream(self, attributes=None, page_size=None):
+        """Yields fully loaded entities of the collection, requesting them page by page.
+
+        Args:
+            attributes: Additional attributes (eg. virtual columns) to include in the resources.
+            page_size: How many resources to request at once, :py:attr:`PAGE_SIZE` by default.
+        """
+        params = {"expand": "resources"}
+        if attributes is not None:
+            if isinstance(attributes, basestring):
+                attributes = [attributes]
+            params["attributes"] = ",".join(attributes)
+        for resource in paginate(self._api, self._href, page_size or self.PAGE_SIZE, **params):
+            yield Entity(self, resource)
 
     def get(self, **params):
         try:
@@ -257,6 +389,14 @@ class Collection(object):
         self.reload_if_needed()
         return map(lambda r: Entity(self, r), self._resources)
 
+    def all_expanded(self, attributes=None):
+        """Like :py:attr:`all`, but the entities come loaded, a page per request.
+
+        Args:
+            attributes: Additional attributes (eg. virtual columns) to include in the resources.
+        """
+        return list(self.stream(attributes=attributes))
+
     def __repr__(self):
         return "<Collection {} ({})>".format(repr(self.name), repr(self.description))
 
@@ -264,9 +404,7 @@ class Collection(object):
         return self._api.get_entity(self, entity_id, attributes=attributes)
 
     def __iter__(self):
-        self.reload(expand=True)
-        for resource in self._resources:
-            yield Entity(self, resource)
+        return self.stream()
 
     def __getitem__(self, position):
         self.reload_if_needed()
@@ -859,8 +859,10 @@ class IPAppliance(object):
         result = {}
         name_regexp = re.compile(r"^\[update-([^\]]+)\]")
         baseurl_regexp = re.compile(r"baseurl\s*=\s*([^\s]+)")
-        for repofile in self.get_repofile_list():
-            rc, out = self.ssh_client.run_command("cat /etc/yum.repos.d/{}".format(repofile))
+        repofiles = self.get_repofile_list()
+        results = self.ssh_client.run_commands(
+            ["cat /etc/yum.repos.d/{}".format(repofile) for repofile in repofiles])
+        for rc, out in results:
             if rc != 0:
                 # Something happened meanwhile?
                 continue
@@ -2,12 +2,15 @@
 import re
 import sys
 import xmlrpclib
+from collections import defaultdict
 from github import Github
+from github.Issue import Issue
 from urlparse import urlparse
 
 from fixtures.pytest_store import store
 from utils import classproperty, conf, version
 from utils.bz import Bugzilla
+from utils.disk_cache import DiskCache
 from utils.log import logger
 
 
@@ -60,13 +63,48 @@ class Blocker(object):
                 return engine_class(spec)
             # EXTEND: If someone has other ideas, put them here
             raise ValueError("Could not parse blocker {}".format(blocker))
+        elif isinstance(blocker, int):
+            # Shortcut for Bugzilla
+            return BZ(blocker)
         else:
             raise ValueError("Wrong specification of the blockers!")
 
+    @classmethod
+    def prefetch(cls, blockers):
+        """Load the data of the blockers in advance, ideally in bulk.
+
+        Engines that can do better than fetching blockers one by one when they are needed
+        override this. ``blockers`` are instances of the class.
+        """
+        pass
+
+    @classmethod
+    def prefetch_all(cls, blockers):
+        """Parse the blockers and let each engine prefetch its own.
+
+        Failures are only logged, the blockers get loaded when needed then.
+        """
+        by_engine = defaultdict(list)
+        for blocker in blockers:
+            try:
+                blocker = cls.parse(blocker)
+            except Exception as e:
+                # Reported when the blocker is resolved
+                logger.warning("Could not parse blocker {!r}: {}".format(blocker, str(e)))
+                continue
+            by_engine[type(blocker)].append(blocker)
+        for engine, engine_blockers in by_engine.iteritems():
+            try:
+                engine.prefetch(engine_blockers)
+            except Exception as e:
+                logger.warning("Could not prefetch {} blockers: {}: {}".format(
+                    engine.__name__, type(e).__name__, str(e)))
+
 
 class GH(Blocker):
     DEFAULT_REPOSITORY = conf.env.get("github", {}).get("default_repo", None)
     _issue_cache = {}
+    _disk_cache = DiskCache("github", conf.env.get("github", {}).get("cache_ttl", 3600))
 
     @classproperty
     def github(cls):
@@ -106,11 +144,24 @@ class GH(Blocker):
         else:
             raise ValueError("GH issue specified wrong")
 
+    @classmethod
+    def prefetch(cls, blockers):
+        # GitHub cannot get issues by a list of numbers, but it is enough to hit the disk cache
+        for blocker in blockers:
+            blocker.data
+
     @property
     def data(self):
         identifier = "{}:{}".format(self.repo, self.issue)
         if identifier not in self._issue_cache:
-            self._issue_cache[identifier] = self.github.get_repo(self.repo).get_issue(self.issue)
+            cache_key = "{}_{}".format(self.repo.replace("/", "_"), self.issue)
+            raw_data = self._disk_cache.get(cache_key)
+            if raw_data is not None:
+                issue = self.github.create_from_raw_data(Issue, raw_data)
+            else:
+                issue = self.github.get_repo(self.repo).get_issue(self.issue)
+                self._disk_cache.put(cache_key, issue.raw_data)
+            self._issue_cache[identifier] = issue
         return self._issue_cache[identifier]
 
     @property
@@ -139,6 +190,10 @@ class BZ(Blocker):
         super(BZ, self).__init__(**kwargs)
         self.bug_id = int(bug_id)
 
+    @classmethod
+    def prefetch(cls, blockers):
+        cls.bugzilla.prefetch_bug_variants(set(blocker.bug_id for blocker in blockers))
+
     @property
     def data(self):
         return self.bugzilla.resolve_blocker(
@@ -5,11 +5,14 @@ from collections import Sequence
 
 from utils import lazycache
 from utils.conf import cfme_data, credentials
+from utils.disk_cache import DiskCache
 from utils.log import logger
 from utils.version import (
     LATEST, Version, current_version, appliance_build_datetime, appliance_is_downstream)
 
 NONE_FIELDS = {"---", "undefined", "unspecified"}
+# How many bugs are requested in one getbugs call
+BATCH_SIZE = 200
 
 
 class Product(object):
@@ -48,9 +51,12 @@ class Product(object):
 class Bugzilla(object):
     def __init__(self, **kwargs):
         self.__product = kwargs.pop("product", None)
+        cache_ttl = kwargs.pop("cache_ttl", None)
         self.__kwargs = kwargs
         self.__bug_cache = {}
         self.__product_cache = {}
+        # The bugs are also kept on the disk for other processes and runs if ttl is set
+        self.__disk_cache = DiskCache("bugzilla", cache_ttl) if cache_ttl else None
 
     @property
     def bug_count(self):
@@ -86,7 +92,8 @@ class Bugzilla(object):
         password = credentials.get(cr_root, {}).get("password", None)
         return cls(
             url=url, user=username, password=password, cookiefile=None,
-            tokenfile=None, product=product)
+            tokenfile=None, product=product,
+            cache_ttl=cfme_data.get("bugzilla", {}).get("cache_ttl", 3600))
 
     @lazycache
     def bugzilla(self):
@@ -107,12 +114,77 @@ class Bugzilla(object):
         else:
             return Version(cfme_data.get("bugzilla", {}).get("upstream_version", "9.9"))
 
+    def _from_disk_cache(self, ids):
+        # Loads what is possible from the disk cache into the memory one
+        if self.__disk_cache is None:
+            return
+        for id, bug in self.__disk_cache.get_many(ids).iteritems():
+            # The pickled bug lost its connection
+            bug.bugzilla = self.bugzilla
+            self.__bug_cache[id] = BugWrapper(self, bug)
+
+    def _cache_bug(self, bug):
+        self.__bug_cache[int(bug.id)] = BugWrapper(self, bug)
+        if self.__disk_cache is not None:
+            self.__disk_cache.put(int(bug.id), bug)
+        return self.__bug_cache[int(bug.id)]
+
     def get_bug(self, id):
         id = int(id)
         if id not in self.__bug_cache:
-            self.__bug_cache[id] = BugWrapper(self, self.bugzilla.getbugsimple(id))
+            self._from_disk_cache([id])
+        if id not in self.__bug_cache:
+            self._cache_bug(self.bugzilla.getbugsimple(id))
         return self.__bug_cache[id]
 
+    def get_bugs(self, ids):
+        """Like :py:meth:`get_bug`, but the bugs that are not cached are fetched in batches.
+
+        Returns:
+            A dict of ``{id: BugWrapper}``. Bugs that are not accessible are left out.
+        """
+        ids = set(map(int, ids))
+        missing = [id for id in ids if id not in self.__bug_cache]
+        self._from_disk_cache(missing)
+        missing = sorted(id for id in missing if id not in self.__bug_cache)
+        for i in range(0, len(missing), BATCH_SIZE):
+            for bug in self.bugzilla.getbugs(missing[i:i + BATCH_SIZE]):
+                if bug is not None:
+                    self._cache_bug(bug)
+        return {id: self.__bug_cache[id] for id in ids if id in self.__bug_cache}
+
+    def prefetch_bug_variants(self, ids):
+        """Loads the bugs with everything :py:meth:`get_bug_variants` needs for them.
+
+        It walks the duplicates, ``copy_of`` and copies level by level, every level is fetched
+        with :py:meth:`get_bugs`, so resolving the blockers later does not go to Bugzilla.
+        """
+        expanded = set([])
+        pending = set(map(int, ids))
+        while pending:
+            bugs = self.get_bugs(pending)
+            expanded.update(pending)
+            # Whatever get_bug_variants is going to look at
+            related = {}
+            for bug in bugs.itervalues():
+                linked = set(map(int, bug._bug.blocks))
+                if bug.status == "CLOSED" and bug.resolution == "DUPLICATE" and bug.dupe_of:
+                    linked.add(int(bug.dupe_of))
+                if bug.copy_of:
+                    linked.add(bug.copy_of)
+                related[bug] = linked
+            fetched = self.get_bugs(set([]).union(*related.values()))
+            pending = set([])
+            for bug, linked in related.iteritems():
+                for linked_id in linked:
+                    linked_bug = fetched.get(linked_id)
+                    if linked_bug is None:
+                        continue
+                    # Blocked bugs only count when they are copies
+                    if linked_id in {bug.dupe_of, bug.copy_of} or linked_bug.copy_of == bug.id:
+                        pending.add(linked_id)
+            pending -= expanded
+
     def get_bug_variants(self, id):
         if isinstance(id, BugWrapper):
             bug = id
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""A simple on-disk cache with expiration, shared by all processes of the project.
+
+Every value lives in its own pickle file under ``log/cache/<name>/``, so the slaves of a
+parallelized run and the consecutive runs share the data without any locking. The files are
+written to a temporary name and renamed, so a reader never sees a half-written value.
+
+Usage:
+
+    >>> from utils.disk_cache import DiskCache
+    >>> cache = DiskCache("bugzilla", ttl=3600)
+    >>> cache.put(123456, {"status": "NEW"})
+    >>> cache.get(123456)
+    {'status': 'NEW'}
+"""
+import cPickle
+import os
+import time
+
+from utils.log import logger
+from utils.path import log_path
+
+
+class DiskCache(object):
+    def __init__(self, name, ttl):
+        """
+        Args:
+            name: Name of the cache, used as the directory name.
+            ttl: How many seconds the values are valid.
+        """
+        self.name = name
+        self.ttl = ttl
+        self.path = log_path.join("cache", name)
+
+    def _file(self, key):
+        return self.path.join("{}.pickle".format(key))
+
+    def get(self, key, default=None):
+        """Returns the cached value or ``default`` if it is missing or expired."""
+        cache_file = self._file(key)
+        try:
+            if time.time() - cache_file.mtime() > self.ttl:
+                return default
+            with cache_file.open("rb") as f:
+                return cPickle.load(f)
+        except Exception as e:
+            # Missing file is the usual case, anything else means a broken entry
+            if cache_file.check():
+                logger.warning("Could not read {} from the {} cache: {}".format(
+                    key, self.name, str(e)))
+            return default
+
+    def get_many(self, keys):
+        """Returns a dict with the cached values of the keys that are present."""
+        result = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                result[key] = value
+        return result
+
+    def put(self, key, value):
+        self.path.ensure(dir=True)
+        cache_file = self._file(key)
+        tmp_file = cache_file.new(basename="{}.{}.tmp".format(cache_file.basename, os.getpid()))
+        try:
+            with tmp_file.open("wb") as f:
+                cPickle.dump(value, f, cPickle.HIGHEST_PROTOCOL)
+            tmp_file.rename(cache_file)
+        except Exception as e:
+            logger.warning("Could not store {} in the {} cache: {}".format(
+                key, self.name, str(e)))
+            tmp_file.remove(ignore_errors=True)
+
+    def clear(self):
+        if self.path.check():
+            self.path.remove(ignore_errors=True)
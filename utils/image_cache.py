@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""Local cache of the appliance images, shared by the template uploads.
+
+The images are stored under the SHA256 checksum they are published with, so one image is
+downloaded and verified only once, no matter how many providers it goes to. An interrupted
+download is resumed from where it stopped.
+
+Usage:
+
+    >>> from utils.image_cache import ImageCache, get_checksums
+    >>> checksums = get_checksums("http://example.com/builds/5.5/SHA256SUM")
+    >>> cache = ImageCache()
+    >>> local_file = cache.fetch("http://example.com/builds/5.5/cfme-rhevm-5.5.ova",
+    ...                          checksums["cfme-rhevm-5.5.ova"])
+"""
+import hashlib
+import threading
+import time
+
+import requests
+
+from utils.log import logger
+from utils.path import log_path
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+class StageStats(object):
+    """Collects how much data went through the stages of a pipeline and how long it took."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records = []
+
+    def add(self, stage, name, size, seconds):
+        with self._lock:
+            self.records.append((stage, name, size, seconds))
+        logger.info("{} of {}: {}".format(stage, name, self.format(size, seconds)))
+
+    @staticmethod
+    def format(size, seconds):
+        return "{:.1f} MB in {:.0f} s ({:.2f} MB/s)".format(
+            size / 1e6, seconds, size / 1e6 / seconds if seconds else 0)
+
+    def report(self):
+        """Returns lines with the throughput of every record and the total for every stage."""
+        lines = []
+        totals = {}
+        with self._lock:
+            records = list(self.records)
+        for stage, name, size, seconds in records:
+            lines.append("{}: {}: {}".format(stage, name, self.format(size, seconds)))
+            total_size, total_seconds = totals.get(stage, (0, 0))
+            totals[stage] = (total_size + size, total_seconds + seconds)
+        for stage, (size, seconds) in sorted(totals.items()):
+            lines.append("{} total: {}".format(stage, self.format(size, seconds)))
+        return lines
+
+
+stats = StageStats()
+
+
+def parse_checksums(text):
+    """Parses the output of ``sha256sum`` into a dict of file name to checksum."""
+    checksums = {}
+    for line in text.splitlines():
+        fields = line.strip().split(None, 1)
+        if len(fields) != 2:
+            continue
+        checksum, file_name = fields
+        # Binary mode is marked with an asterisk
+        checksums[file_name.lstrip("*").split("/")[-1]] = checksum.lower()
+    return checksums
+
+
+def get_checksums(url):
+    response = requests.get(url, timeout=60)
+    response.raise_for_status()
+    return parse_checksums(response.text)
+
+
+class ImageCache(object):
+    """Downloads the images into ``path``/<sha256>/<file name>.
+
+    Args:
+        path: Where to keep the images. Defaults to ``log/cache/images``.
+    """
+    _locks = {}
+    _locks_lock = threading.Lock()
+
+    def __init__(self, path=None):
+        self.path = path or log_path.join("cache", "images")
+
+    def _lock(self, checksum):
+        with self._locks_lock:
+            return self._locks.setdefault(checksum, threading.Lock())
+
+    def file(self, url, checksum):
+        return self.path.join(checksum, url.split("/")[-1])
+
+    def fetch(self, url, checksum):
+        """Returns the local file with the image, downloads it if it is not cached yet.
+
+        Concurrent calls for the same image wait for the one download.
+
+        Raises:
+            :py:class:`ChecksumMismatch` when the downloaded file does not match the checksum.
+                The partial file is removed, so the next attempt starts over.
+        """
+        checksum = checksum.lower()
+        with self._lock(checksum):
+            target = self.file(url, checksum)
+            # The file gets its name only after it was verified
+            if target.check():
+                logger.info("Image {} is cached in {}".format(url, target))
+                return target
+            target.dirpath().ensure(dir=True)
+            part = target.new(basename="{}.part".format(target.basename))
+            digest = hashlib.sha256()
+            offset = part.size() if part.check() else 0
+            if offset:
+                with part.open("rb") as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                        digest.update(chunk)
+                logger.info("Resuming download of {} at {} bytes".format(url, offset))
+            start = time.time()
+            response = requests.get(
+                url, stream=True, timeout=60,
+                headers={"Range": "bytes={}-".format(offset)} if offset else {})
+            response.raise_for_status()
+            if offset and response.status_code != requests.codes.partial_content:
+                # The server does not support ranges, start from scratch
+                offset = 0
+                digest = hashlib.sha256()
+            received = 0
+            with part.open("ab" if offset else "wb") as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    received += len(chunk)
+            stats.add("download", target.basename, received, time.time() - start)
+            if digest.hexdigest() != checksum:
+                part.remove(ignore_errors=True)
+                raise ChecksumMismatch("{} has checksum {}, expected {}".format(
+                    url, digest.hexdigest(), checksum))
+            part.rename(target)
+            return target
@@ -318,12 +318,53 @@ def perf_bench_read_tree(tree):
     return tree_contents, seleniumtime
 
 
+# Regular Expressions to find the ruby production completed time and select query time
+status_re = re.compile(r'Completed\s([0-9]*\s[a-zA-Z]*)\sin\s([0-9\.]*)ms')
+views_re = re.compile(r'Views:\s([0-9\.]*)ms')
+activerecord_re = re.compile(r'ActiveRecord:\s([0-9\.]*)ms')
+select_query_time_re = re.compile(r'\s\(([0-9\.]*)ms\)')
+
+
+def parse_page_stats(lines, query_time_threshold):
+    """Generator turning production.log lines of a single worker into :py:class:`PageStat` s.
+
+    The lines are walked through only once, the queries are accounted to the page being built
+    and the page is yielded as soon as its ``Completed`` line shows up.
+    """
+    pgstat = PageStat()
+    for line in lines:
+        if 'SELECT' in line:
+            pgstat.selectcount += 1
+            selecttime = select_query_time_re.search(line)
+            if selecttime and float(selecttime.group(1)) > query_time_threshold:
+                pgstat.slowselects.append(line)
+        if 'CACHE' in line:
+            pgstat.cachedcount += 1
+        if 'INFO -- : Started' in line:
+            # Obtain method and requested page
+            started_idx = line.index('Started') + 8
+            pgstat.request = line[started_idx:line.index('for', 72)]
+        elif 'INFO -- : Completed' in line:
+            # Obtain status code and total render time
+            status_result = status_re.search(line)
+            if status_result:
+                pgstat.status = status_result.group(1)
+                pgstat.completedintime = float(status_result.group(2))
+
+            pgstat.uncachedcount = pgstat.selectcount - pgstat.cachedcount
+
+            # Redirects don't always have a view timing
+            views_result = views_re.search(line)
+            if views_result:
+                pgstat.viewstime = float(views_result.group(1))
+            activerecord_result = activerecord_re.search(line)
+            if activerecord_result:
+                pgstat.activerecordtime = float(activerecord_result.group(1))
+            yield pgstat
+            pgstat = PageStat()
+
+
 def perf_click(uiworker_pid, tailer, measure_sel_time, clickable, *args):
-    # Regular Expressions to find the ruby production completed time and select query time
-    status_re = re.compile(r'Completed\s([0-9]*\s[a-zA-Z]*)\sin\s([0-9\.]*)ms')
-    views_re = re.compile(r'Views:\s([0-9\.]*)ms')
-    activerecord_re = re.compile(r'ActiveRecord:\s([0-9\.]*)ms')
-    select_query_time_re = re.compile(r'\s\(([0-9\.]*)ms\)')
     worker_pid = '#' + uiworker_pid
 
     # Time the selenium transaction from "click"
@@ -333,49 +374,18 @@ def perf_click(uiworker_pid, tailer, measure_sel_time, clickable, *args):
         clickable(*args)
         seleniumtime = int((time() - starttime) * 1000)
 
-    pgstats = []
-    pgstat = PageStat()
-    line_count = 0
     starttime = time()
-
-    for line in tailer:
-        line_count += 1
-        if worker_pid in line:
-            if 'SELECT' in line:
-                pgstat.selectcount += 1
-                selecttime = select_query_time_re.search(line)
-                if selecttime:
-                    if float(selecttime.group(1)) > perf_tests['ui']['threshold']['query_time']:
-                        pgstat.slowselects.append(line)
-            if 'CACHE' in line:
-                pgstat.cachedcount += 1
-            if 'INFO -- : Started' in line:
-                # Obtain method and requested page
-                started_idx = line.index('Started') + 8
-                pgstat.request = line[started_idx:line.index('for', 72)]
-            if 'INFO -- : Completed' in line:
-                # Obtain status code and total render time
-                status_result = status_re.search(line)
-                if status_result:
-                    pgstat.status = status_result.group(1)
-                    pgstat.completedintime = float(status_result.group(2))
-
-                pgstat.uncachedcount = pgstat.selectcount - pgstat.cachedcount
-
-                # Redirects don't always have a view timing
-                views_result = views_re.search(line)
-                if views_result:
-                    pgstat.viewstime = float(views_result.group(1))
-                activerecord_result = activerecord_re.search(line)
-                if activerecord_result:
-                    pgstat.activerecordtime = float(activerecord_result.group(1))
-                pgstats.append(pgstat)
-                pgstat = PageStat()
+    if hasattr(tailer, 'grep'):
+        # Only the lines of the worker are sent from the appliance
+        lines = tailer.grep(worker_pid)
+    else:
+        lines = (line for line in tailer if worker_pid in line)
+    pgstats = list(parse_page_stats(lines, perf_tests['ui']['threshold']['query_time']))
     if pgstats:
         if measure_sel_time:
             pgstats[-1].seleniumtime = seleniumtime
     timediff = time() - starttime
-    logger.debug('Parsed ({}) lines in {}'.format(line_count, timediff))
+    logger.debug('Parsed ({}) pages in {}'.format(len(pgstats), timediff))
     return pgstats
 
 
@@ -5,41 +5,42 @@ from utils.log import logger
 import numpy
 import time
 
+log_dir = '/var/www/miq/vmdb/log/'
 
-def collect_log(ssh_client, log_prefix, local_file_name, strip_whitespace=False):
+
+def collect_log(ssh_client, log_prefix, local_file_name, strip_whitespace=False, since=None):
     """Collects all of the logs associated with a single log prefix (ex. evm or top_output) and
-    combines to single gzip log file.  The log file is then scp-ed back to the host.
+    combines to single gzip log file.
+
+    The rotated logs and the current log are concatenated in chronological order and compressed
+    on the appliance into a single stream which is written directly into the local file, nothing
+    is written to the appliance disk.
+
+    Args:
+        ssh_client: :py:class:`utils.ssh.SSHClient` of the appliance.
+        log_prefix: Name of the log without the ``.log``.
+        local_file_name: Where to store the gzipped log.
+        strip_whitespace: Strip leading and trailing whitespace and drop empty lines.
+        since: Appliance time (seconds since epoch), rotated logs last modified before that
+            are skipped.
     """
-    log_dir = '/var/www/miq/vmdb/log/'
-
     log_file = '{}{}.log'.format(log_dir, log_prefix)
-    dest_file = '{}{}.perf.log'.format(log_dir, log_prefix)
-    dest_file_gz = '{}{}.perf.log.gz'.format(log_dir, log_prefix)
-
-    ssh_client.run_command('rm -f {}'.format(dest_file_gz))
-
-    status, out = ssh_client.run_command('ls -1 {}-*'.format(log_file))
-    if status == 0:
-        files = out.strip().split('\n')
-        for lfile in sorted(files):
-            ssh_client.run_command('cp {} {}-2.gz'.format(lfile, lfile))
-            ssh_client.run_command('gunzip {}-2.gz'.format(lfile))
-            if strip_whitespace:
-                ssh_client.run_command('sed -i  \'s/^ *//; s/ *$//; /^$/d; /^\s*$/d\' '
-                    '{}-2'.format(lfile))
-            ssh_client.run_command('cat {}-2 >> {}'.format(lfile, dest_file))
-            ssh_client.run_command('rm {}-2'.format(lfile))
-
-    ssh_client.run_command('cp {} {}-2'.format(log_file, log_file))
+    if since is None:
+        skip_old = ''
+    else:
+        skip_old = '[ $(stat -c %Y $f) -lt {} ] && continue; '.format(int(since))
+    # The rotated logs have the date as a suffix, so sorting them is chronological
+    command = ('for f in $(ls -1 {log}-*.gz 2>/dev/null | sort); do {skip}zcat $f; done; '
+        'cat {log}').format(log=log_file, skip=skip_old)
     if strip_whitespace:
-        ssh_client.run_command('sed -i  \'s/^ *//; s/ *$//; /^$/d; /^\s*$/d\' '
-            '{}-2'.format(log_file))
-    ssh_client.run_command('cat {}-2 >> {}'.format(log_file, dest_file))
-    ssh_client.run_command('rm {}-2'.format(log_file))
-    ssh_client.run_command('gzip {}{}.perf.log'.format(log_dir, log_prefix))
+        command = '({}) | sed \'s/^ *//; s/ *$//; /^$/d; /^\s*$/d\''.format(command)
+    command = 'set -o pipefail; ({}) | gzip -c'.format(command)
 
-    ssh_client.get_file(dest_file_gz, local_file_name)
-    ssh_client.run_command('rm -f {}'.format(dest_file_gz))
+    starttime = time.time()
+    status = ssh_client.run_command_to_file(command, local_file_name)
+    if status != 0:
+        logger.error('Collecting {} logs ended with {}'.format(log_prefix, status))
+    logger.info('Collected {} logs in {:.1f}s'.format(log_prefix, time.time() - starttime))
 
 
 def convert_top_mem_to_mib(top_mem):
@@ -69,8 +70,8 @@ def generate_statistics(the_list, decimals=2):
         median = round(numpy.median(numpy_arr), decimals)
         maximum = round(numpy.amax(numpy_arr), decimals)
         stddev = round(numpy.std(numpy_arr), decimals)
-        percentile90 = round(numpy.percentile(numpy_arr, 90), decimals)
-        percentile99 = round(numpy.percentile(numpy_arr, 99), decimals)
+        percentile90, percentile99 = [
+            round(percentile, decimals) for percentile in numpy.percentile(numpy_arr, [90, 99])]
         return [len(the_list), minimum, average, median, maximum, stddev, percentile90,
             percentile99]
 
@@ -10,7 +10,11 @@ from datetime import datetime
 import dateutil.parser as du_parser
 from datetime import timedelta
 from time import time
+import cPickle
 import csv
+import hashlib
+import mmap
+import multiprocessing
 import numpy
 import os
 import pygal
@@ -59,84 +63,223 @@ miq_top = re.compile(r'([0-9]+)\s+[0-9]+\s+[A-Za-z0-9]+\s+[0-9]+\s+[0-9\-]+\s+([
     r'([0-9\.mg]+)\s+([0-9\.mg]+)\s+[SRDZ]\s+([0-9\.]+)\s+([0-9\.]+)')
 
 
-def evm_to_messages(evm_file, filters):
-    test_start = ''
-    test_end = ''
-    line_count = 0
-    messages = {}
-    msg_cmds = {}
+# Bump when the format of the data stored in the checkpoints changes
+CHECKPOINT_VERSION = 1
+# Number of bytes from the start of a log file used to recognize it
+SIGNATURE_SIZE = 4096
 
-    runningtime = time()
-    evmlogfile = open(evm_file, 'r')
-    evm_log_line = evmlogfile.readline()
-    while evm_log_line:
-        line_count += 1
-        evm_log_line = evm_log_line.strip()
 
-        miqmsg_result = miqmsg.search(evm_log_line)
-        if miqmsg_result:
+def _file_signature(log_file, size):
+    with open(log_file, 'rb') as f:
+        return hashlib.md5(f.read(size)).hexdigest()
 
-            # Obtains the first timestamp in the log file
-            if test_start == '':
-                ts, pid = get_msg_timestamp_pid(evm_log_line)
-                test_start = ts
 
-            # A message was first put on the queue, this starts its queuing time
-            if (miqmsg_result.group(1) == 'MiqQueue.put'):
+def complete_size(log_file, checkpoint_file):
+    """Returns the size of the log file to parse.
+
+    When the state is saved to ``checkpoint_file``, the parsing ends with the last complete line
+    and a line still being written to the log is left for the next run. Otherwise the whole file
+    is parsed.
+    """
+    size = os.path.getsize(log_file)
+    if size == 0 or checkpoint_file is None:
+        return size
+    with open(log_file, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return mm.rfind('\n') + 1
+        finally:
+            mm.close()
 
-                msg_cmd = get_msg_cmd(evm_log_line)
-                msg_id = get_msg_id(evm_log_line)
-                if msg_id:
-                    ts, pid = get_msg_timestamp_pid(evm_log_line)
-                    test_end = ts
-                    messages[msg_id] = MiqMsgStat()
-                    messages[msg_id].msg_id = msg_id
-                    messages[msg_id].msg_id = '\'' + msg_id + '\''
-                    messages[msg_id].msg_cmd = msg_cmd
-                    messages[msg_id].pid_put = pid
-                    messages[msg_id].puttime = ts
-                    msg_args = get_msg_args(evm_log_line)
-                    if msg_args is False:
-                        logger.debug('Could not obtain message args line #: {}'.format(line_count))
-                    else:
-                        messages[msg_id].msg_args = msg_args
-                else:
-                    logger.error('Could not obtain message id, line #: {}'.format(line_count))
-
-            elif (miqmsg_result.group(1) == 'MiqQueue.get_via_drb'):
-                msg_id = get_msg_id(evm_log_line)
-                if msg_id:
-                    if msg_id in messages:
-                        ts, pid = get_msg_timestamp_pid(evm_log_line)
-                        test_end = ts
-                        messages[msg_id].pid_get = pid
-                        messages[msg_id].gettime = ts
-                        messages[msg_id].deq_time = get_msg_deq(evm_log_line)
-                    else:
-                        logger.error('Message ID not in dictionary: {}'.format(msg_id))
-                else:
-                    logger.error('Could not obtain message id, line #: {}'.format(line_count))
 
-            elif (miqmsg_result.group(1) == 'MiqQueue.delivered'):
-                msg_id = get_msg_id(evm_log_line)
-                if msg_id:
+def load_checkpoint(checkpoint_file, log_file):
+    """Loads the state of a previous parse of the log file.
+
+    Args:
+        checkpoint_file: Path to the checkpoint file, ``None`` disables checkpointing.
+        log_file: Path to the log file the checkpoint was made for.
+
+    Returns: The dictionary saved by :py:func:`save_checkpoint` or ``None`` if there is no
+        checkpoint or it does not belong to the log file (eg. the log was replaced).
+    """
+    if checkpoint_file is None or not os.path.exists(checkpoint_file):
+        return None
+    try:
+        with open(checkpoint_file, 'rb') as f:
+            checkpoint = cPickle.load(f)
+    except Exception as e:
+        logger.warning('Could not load checkpoint {}: {}'.format(checkpoint_file, str(e)))
+        return None
+    if (checkpoint.get('version') != CHECKPOINT_VERSION or
+            checkpoint['offset'] > os.path.getsize(log_file) or
+            checkpoint['signature'] != _file_signature(log_file, checkpoint['signature_size'])):
+        logger.info('Checkpoint {} does not match {}, parsing from the start'.format(
+            checkpoint_file, log_file))
+        return None
+    logger.info('Resuming parsing of {} from byte {}'.format(log_file, checkpoint['offset']))
+    return checkpoint
+
+
+def save_checkpoint(checkpoint_file, log_file, offset, **state):
+    """Saves the state of parsing of the log file up to the byte ``offset``.
+
+    Does nothing if ``checkpoint_file`` is ``None``.
+    """
+    if checkpoint_file is None:
+        return
+    signature_size = min(offset, SIGNATURE_SIZE)
+    state.update(
+        version=CHECKPOINT_VERSION, offset=offset, signature_size=signature_size,
+        signature=_file_signature(log_file, signature_size))
+    # Write to a temporary file first so an interrupted run does not leave a broken checkpoint
+    temp_file = '{}.tmp'.format(checkpoint_file)
+    with open(temp_file, 'wb') as f:
+        cPickle.dump(state, f, cPickle.HIGHEST_PROTOCOL)
+    os.rename(temp_file, checkpoint_file)
+
+
+def grep_range(pattern, log_file, start, end):
+    """Greps the byte range ``start`` - ``end`` of the log file.
+
+    Returns: List of the matching lines.
+    """
+    if start >= end:
+        return []
+    with open(os.devnull, 'w') as devnull:
+        # tail complains about the broken pipe when head is done, which is expected
+        tail = subprocess.Popen(['tail', '-c', '+{}'.format(start + 1), log_file],
+            stdout=subprocess.PIPE, stderr=devnull)
+        head = subprocess.Popen(['head', '-c', str(end - start)], stdin=tail.stdout,
+            stdout=subprocess.PIPE)
+        grep = subprocess.Popen(['grep', pattern], stdin=head.stdout, stdout=subprocess.PIPE)
+        # Allow the earlier processes to receive SIGPIPE if the later ones exit
+        tail.stdout.close()
+        head.stdout.close()
+        grepped, err = grep.communicate()
+        tail.wait()
+        head.wait()
+    grepped = grepped.strip()
+    return grepped.split('\n') if grepped else []
+
+
+def _evm_chunk_boundaries(evm_file, chunks, start=0, end=None):
+    """Splits the evm log file (or its part) into byte ranges which start and end on line
+    boundaries."""
+    size = os.path.getsize(evm_file) if end is None else end
+    if size <= start:
+        return []
+    boundaries = [start]
+    with open(evm_file, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for chunk in range(1, chunks):
+                newline = mm.find(
+                    '\n', max(boundaries[-1], start + (size - start) * chunk // chunks), size)
+                if newline == -1:
+                    break
+                if newline + 1 < size:
+                    boundaries.append(newline + 1)
+        finally:
+            mm.close()
+    boundaries.append(size)
+    return zip(boundaries[:-1], boundaries[1:])
+
+
+def _parse_evm_chunk(args):
+    """Parses the queue messages out of a byte range of the evm log file.
+
+    Runs in a worker process of :py:func:`evm_to_messages`, so it must not touch any shared
+    state. Lines not mentioning ``MIQ(MiqQueue.`` are skipped before any regular expression is
+    run on them.
+
+    Returns: A tuple of the first message timestamp in the range (or ``''``), the number of lines
+        in the range and the list of message events in the order they appear. An event is a tuple
+        ``(kind, line #, ...)``, where kind is one of ``put``, ``get``, ``del`` or ``noid``.
+    """
+    evm_file, start, end = args
+    first_ts = ''
+    line_count = 0
+    events = []
+    with open(evm_file, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            mm.seek(start)
+            while mm.tell() < end:
+                evm_log_line = mm.readline()
+                line_count += 1
+                if first_ts == '' or 'MIQ(MiqQueue.' in evm_log_line:
+                    evm_log_line = evm_log_line.strip()
+                    miqmsg_result = miqmsg.search(evm_log_line)
+                    if not miqmsg_result:
+                        continue
+                    if first_ts == '':
+                        first_ts, pid = get_msg_timestamp_pid(evm_log_line)
+                    kind = miqmsg_result.group(1)
+                    if kind not in ('MiqQueue.put', 'MiqQueue.get_via_drb', 'MiqQueue.delivered'):
+                        continue
+                    msg_id = get_msg_id(evm_log_line)
+                    if not msg_id:
+                        events.append(('noid', line_count))
+                        continue
                     ts, pid = get_msg_timestamp_pid(evm_log_line)
-                    test_end = ts
-                    if msg_id in messages:
-                        messages[msg_id].del_time = get_msg_del(evm_log_line)
-                        messages[msg_id].total_time = messages[msg_id].deq_time + \
-                            messages[msg_id].del_time
+                    if kind == 'MiqQueue.put':
+                        events.append(('put', line_count, msg_id, ts, pid,
+                            get_msg_cmd(evm_log_line), get_msg_args(evm_log_line)))
+                    elif kind == 'MiqQueue.get_via_drb':
+                        events.append(('get', line_count, msg_id, ts, pid,
+                            get_msg_deq(evm_log_line)))
                     else:
-                        logger.error('Message ID not in dictionary: {}'.format(msg_id))
-                else:
-                    logger.error('Could not obtain message id, line #: {}'.format(line_count))
+                        events.append(('del', line_count, msg_id, ts, get_msg_del(evm_log_line)))
+        finally:
+            mm.close()
+    return first_ts, line_count, events
 
-        if (line_count % 100000) == 0:
-            timediff = time() - runningtime
-            runningtime = time()
-            logger.info('Count {} : Parsed 100000 lines in {}'.format(line_count, timediff))
 
-        evm_log_line = evmlogfile.readline()
+def evm_to_messages(evm_file, filters, processes=None, checkpoint_file=None):
+    """Parses the queue messages out of the evm log file.
+
+    The file is memory mapped and split into chunks on line boundaries, which are parsed in
+    a pool of ``processes`` worker processes (defaults to the number of CPUs). The message
+    events of the chunks are then joined by the message id in the log order.
+
+    If ``checkpoint_file`` is given, the parsed messages are saved to it (before applying the
+    ``filters``) and the next call only parses the lines appended to the log since.
+    """
+    msg_cmds = {}
+
+    checkpoint = load_checkpoint(checkpoint_file, evm_file)
+    if checkpoint is not None:
+        messages = checkpoint['messages']
+        test_start = checkpoint['test_start']
+        test_end = checkpoint['test_end']
+        line_count = checkpoint['line_count']
+        offset = checkpoint['offset']
+    else:
+        messages, test_start, test_end, line_count, offset = {}, '', '', 0, 0
+    end = complete_size(evm_file, checkpoint_file)
+
+    processes = processes or multiprocessing.cpu_count()
+    # Chunks considerably smaller than the file give the pool a chance to balance the load
+    chunks = _evm_chunk_boundaries(evm_file, processes * 4, offset, end)
+    chunk_args = [(evm_file, start, end) for start, end in chunks]
+    runningtime = time()
+    if processes > 1 and len(chunk_args) > 1:
+        pool = multiprocessing.Pool(processes)
+        try:
+            # imap keeps the order of the chunks, which is needed to join them properly
+            results = pool.imap(_parse_evm_chunk, chunk_args)
+            test_start, test_end, line_count = _join_evm_chunks(
+                results, len(chunk_args), runningtime, messages, test_start, test_end, line_count)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        test_start, test_end, line_count = _join_evm_chunks(
+            map(_parse_evm_chunk, chunk_args), len(chunk_args), runningtime, messages, test_start,
+            test_end, line_count)
+    if chunk_args:
+        save_checkpoint(checkpoint_file, evm_file, end, messages=messages, test_start=test_start,
+            test_end=test_end, line_count=line_count)
 
     # I tried to avoid two loops but this reduced the complexity of filtering on messages.
     # By filtering over messages, we can better display what is occuring under the covers, as a
@@ -163,22 +306,80 @@ def evm_to_messages(evm_file, filters):
     return messages, msg_cmds, test_start, test_end, line_count
 
 
-def evm_to_workers(evm_file):
-    # Use grep to reduce # of lines to sort through
-    p = subprocess.Popen(['grep', 'Interrupt\\|MIQ([A-Za-z]*) ID\\|"evm_worker_uptime_exceeded\\|'
-            '"evm_worker_memory_exceeded\\|"evm_worker_stop\\|Worker exiting.', evm_file],
-            stdout=subprocess.PIPE)
-    greppedevmlog, err = p.communicate()
-    greppedevmlog = greppedevmlog.strip()
+def _join_evm_chunks(results, chunk_count, runningtime, messages, test_start, test_end,
+        line_count):
+    """Joins the message events of the parsed chunks into ``messages`` in the order of the chunks.
+
+    Returns: Updated ``test_start``, ``test_end`` and ``line_count``.
+    """
+    for chunk, (first_ts, chunk_line_count, events) in enumerate(results, 1):
+        if test_start == '':
+            test_start = first_ts
+        for event in events:
+            kind, line_no = event[:2]
+            line_no += line_count
+            if kind == 'noid':
+                logger.error('Could not obtain message id, line #: {}'.format(line_no))
+            elif kind == 'put':
+                msg_id, ts, pid, msg_cmd, msg_args = event[2:]
+                test_end = ts
+                message = messages[msg_id] = MiqMsgStat()
+                message.msg_id = '\'' + msg_id + '\''
+                message.msg_cmd = msg_cmd
+                message.pid_put = pid
+                message.puttime = ts
+                if msg_args is False:
+                    logger.debug('Could not obtain message args line #: {}'.format(line_no))
+                else:
+                    message.msg_args = msg_args
+            elif kind == 'get':
+                msg_id, ts, pid, deq_time = event[2:]
+                if msg_id in messages:
+                    test_end = ts
+                    messages[msg_id].pid_get = pid
+                    messages[msg_id].gettime = ts
+                    messages[msg_id].deq_time = deq_time
+                else:
+                    logger.error('Message ID not in dictionary: {}'.format(msg_id))
+            else:
+                msg_id, ts, del_time = event[2:]
+                test_end = ts
+                if msg_id in messages:
+                    messages[msg_id].del_time = del_time
+                    messages[msg_id].total_time = messages[msg_id].deq_time + del_time
+                else:
+                    logger.error('Message ID not in dictionary: {}'.format(msg_id))
+        line_count += chunk_line_count
+        timediff = time() - runningtime
+        logger.info('Chunk {}/{} : Parsed {} lines in {}'.format(
+            chunk, chunk_count, line_count, timediff))
+    return test_start, test_end, line_count
+
+
+def evm_to_workers(evm_file, checkpoint_file=None):
+    """Parses the workers and their terminations out of the evm log file.
+
+    If ``checkpoint_file`` is given, the state is saved to it and the next call only parses the
+    lines appended to the log since.
+    """
+    checkpoint = load_checkpoint(checkpoint_file, evm_file)
+    if checkpoint is not None:
+        workers = checkpoint['workers']
+        wkr_upt_exc, wkr_mem_exc, wkr_stp, wkr_int, wkr_ext = checkpoint['counts']
+        line_count = checkpoint['line_count']
+        offset = checkpoint['offset']
+    else:
+        workers = {}
+        wkr_upt_exc, wkr_mem_exc, wkr_stp, wkr_int, wkr_ext = 0, 0, 0, 0, 0
+        line_count = 0
+        offset = 0
+    end = complete_size(evm_file, checkpoint_file)
 
-    evmlines = greppedevmlog.split('\n')
+    # Use grep to reduce # of lines to sort through
+    evmlines = grep_range('Interrupt\\|MIQ([A-Za-z]*) ID\\|"evm_worker_uptime_exceeded\\|'
+        '"evm_worker_memory_exceeded\\|"evm_worker_stop\\|Worker exiting.', evm_file, offset, end)
+    line_count += len(evmlines)
 
-    workers = {}
-    wkr_upt_exc = 0
-    wkr_mem_exc = 0
-    wkr_stp = 0
-    wkr_int = 0
-    wkr_ext = 0
     for evm_log_line in evmlines:
         ts, pid = get_msg_timestamp_pid(evm_log_line)
 
@@ -234,7 +435,9 @@ def evm_to_workers(evm_file):
                         workers[workerid].terminated = 'Worker Exited'
                         workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
 
-    return workers, wkr_mem_exc, wkr_upt_exc, wkr_stp, wkr_int, wkr_ext, len(evmlines)
+    save_checkpoint(checkpoint_file, evm_file, end, workers=workers,
+        counts=(wkr_upt_exc, wkr_mem_exc, wkr_stp, wkr_int, wkr_ext), line_count=line_count)
+    return workers, wkr_mem_exc, wkr_upt_exc, wkr_stp, wkr_int, wkr_ext, line_count
 
 
 def split_appliance_charts(top_appliance, charts_dir):
@@ -519,34 +722,20 @@ def messages_to_hourly_buckets(messages, test_start, test_end):
 
 
 def messages_to_statistics_csv(messages, statistics_file_name):
-    all_statistics = []
+    all_statistics = {}
     for msg_id in messages:
         msg = messages[msg_id]
 
-        added = False
-        if len(all_statistics) > 0:
-            for msg_statistics in all_statistics:
-                if msg_statistics.cmd == msg.msg_cmd:
-
-                    if msg.del_time > 0:
-                        msg_statistics.delivertimes.append(float(msg.del_time))
-                        msg_statistics.gets += 1
-                    msg_statistics.dequeuetimes.append(float(msg.deq_time))
-                    msg_statistics.totaltimes.append(float(msg.total_time))
-                    msg_statistics.puts += 1
-                    added = True
-                    break
-
-        if not added:
-            msg_statistics = MiqMsgLists()
-            msg_statistics.cmd = msg.msg_cmd
-            if msg.del_time > 0:
-                msg_statistics.delivertimes.append(float(msg.del_time))
-                msg_statistics.gets = 1
-            msg_statistics.dequeuetimes.append(float(msg.deq_time))
-            msg_statistics.totaltimes.append(float(msg.total_time))
-            msg_statistics.puts = 1
-            all_statistics.append(msg_statistics)
+        if msg.msg_cmd not in all_statistics:
+            all_statistics[msg.msg_cmd] = MiqMsgLists()
+            all_statistics[msg.msg_cmd].cmd = msg.msg_cmd
+        msg_statistics = all_statistics[msg.msg_cmd]
+        if msg.del_time > 0:
+            msg_statistics.delivertimes.append(float(msg.del_time))
+            msg_statistics.gets += 1
+        msg_statistics.dequeuetimes.append(float(msg.deq_time))
+        msg_statistics.totaltimes.append(float(msg.total_time))
+        msg_statistics.puts += 1
 
     csvdata_path = log_path.join('csv_output', statistics_file_name)
     outputfile = csvdata_path.open('w', ensure=True)
@@ -563,7 +752,7 @@ def messages_to_statistics_csv(messages, statistics_file_name):
         csvfile.writerow(headers)
 
         # Contents of CSV
-        for msg_statistics in sorted(all_statistics, key=lambda x: x.cmd):
+        for msg_statistics in sorted(all_statistics.values(), key=lambda x: x.cmd):
             if msg_statistics.gets > 1:
                 logger.debug('Samples/Avg/90th/Std: {} : {} : {} : {},Cmd: {}'.format(
                     str(len(msg_statistics.totaltimes)).rjust(7),
@@ -613,61 +802,97 @@ def provision_hour_buckets(test_start, test_end, init=True):
     return buckets
 
 
-def top_to_appliance(top_file):
-    # Find first miqtop log line
-    miqtop_time, timezone_offset = get_first_miqtop(top_file)
-
-    runningtime = time()
-    grep_pattern = '^top\s\-\s\\|^miqtop\:\\|^Cpu(s)\:\\|^Mem\:\\|^Swap\:'
-    # Use grep to reduce # of lines to sort through
-    p = subprocess.Popen(['grep', grep_pattern, top_file], stdout=subprocess.PIPE)
-    greppedtop, err = p.communicate()
-    timediff = time() - runningtime
-    logger.info('Grepped top_output for CPU/Mem/Swap & time data in {}'.format(timediff))
+class TopClock(object):
+    """Tracks the date and time of the samples in top_output.
 
-    top_lines = greppedtop.strip().split('\n')
-    line_count = 0
+    top only logs the time of each sample, the date is taken from the miqtop lines. The state is
+    kept in this object, so the parsing can be resumed from a checkpoint.
+    """
+    def __init__(self, miqtop_time, timezone_offset):
+        self.miqtop_time = miqtop_time
+        self.timezone_offset = timezone_offset
+        self.miqtop_ahead = True
+        self.cur_time = None
 
-    top_keys = ['datetimes', 'cpuus', 'cpusy', 'cpuni', 'cpuid', 'cpuwa', 'cpuhi', 'cpusi', 'cpust',
-        'memtot', 'memuse', 'memfre', 'buffer', 'swatot', 'swause', 'swafre', 'cached']
-    top_app = dict((key, []) for key in top_keys)
+    def feed(self, top_line):
+        """Updates the time if the line carries it.
 
-    cur_time = None
-    miqtop_ahead = True
-    runningtime = time()
-    for top_line in top_lines:
-        line_count += 1
+        Returns: ``True`` if it was a time line, ``False`` otherwise.
+        """
         if 'top - ' in top_line:
             # top - 11:00:43
             cur_hour = int(top_line[6:8])
             cur_min = int(top_line[9:11])
             cur_sec = int(top_line[12:14])
-            if miqtop_ahead:
+            if self.miqtop_ahead:
                 # Have not found miqtop date/time yet so we must rely on miqtop date/time "ahead"
-                if cur_hour <= miqtop_time.hour:
-                    cur_time = miqtop_time.replace(hour=cur_hour, minute=cur_min, second=cur_sec) \
-                        - timedelta(hours=timezone_offset)
+                if cur_hour <= self.miqtop_time.hour:
+                    self.cur_time = self.miqtop_time.replace(
+                        hour=cur_hour, minute=cur_min, second=cur_sec) \
+                        - timedelta(hours=self.timezone_offset)
                 else:
                     # miqtop_time is ahead by date
                     logger.info('miqtop_time is ahead by one day')
-                    cur_time = miqtop_time - timedelta(days=1)
-                    cur_time = cur_time.replace(hour=cur_hour, minute=cur_min, second=cur_sec) \
-                        - timedelta(hours=timezone_offset)
+                    cur_time = self.miqtop_time - timedelta(days=1)
+                    self.cur_time = cur_time.replace(
+                        hour=cur_hour, minute=cur_min, second=cur_sec) \
+                        - timedelta(hours=self.timezone_offset)
             else:
-                cur_time = miqtop_time.replace(hour=cur_hour, minute=cur_min, second=cur_sec) \
-                    - timedelta(hours=timezone_offset)
+                self.cur_time = self.miqtop_time.replace(
+                    hour=cur_hour, minute=cur_min, second=cur_sec) \
+                    - timedelta(hours=self.timezone_offset)
+            return True
         elif 'miqtop: ' in top_line:
-            miqtop_ahead = False
+            self.miqtop_ahead = False
             # miqtop: .* is-> Mon Jan 26 08:57:39 EST 2015 -0500
             str_start = top_line.index('is->')
             miqtop_time = du_parser.parse(top_line[str_start:], fuzzy=True, ignoretz=True)
             # Time logged in top is the system's time which is ahead/behind by the timezone offset
-            timezone_offset = int(top_line[str_start + 34:str_start + 37])
-            miqtop_time = miqtop_time - timedelta(hours=timezone_offset)
+            self.timezone_offset = int(top_line[str_start + 34:str_start + 37])
+            self.miqtop_time = miqtop_time - timedelta(hours=self.timezone_offset)
+            return True
+        return False
+
+
+def top_to_appliance(top_file, checkpoint_file=None):
+    """Parses the appliance CPU and memory usage out of top_output.
+
+    If ``checkpoint_file`` is given, the samples are saved to it and the next call only parses the
+    lines appended to the log since.
+    """
+    checkpoint = load_checkpoint(checkpoint_file, top_file)
+    if checkpoint is not None:
+        top_app = checkpoint['top_app']
+        clock = checkpoint['clock']
+        total_lines = checkpoint['line_count']
+        offset = checkpoint['offset']
+    else:
+        top_keys = ['datetimes', 'cpuus', 'cpusy', 'cpuni', 'cpuid', 'cpuwa', 'cpuhi', 'cpusi',
+            'cpust', 'memtot', 'memuse', 'memfre', 'buffer', 'swatot', 'swause', 'swafre', 'cached']
+        top_app = dict((key, []) for key in top_keys)
+        # Find first miqtop log line
+        clock = TopClock(*get_first_miqtop(top_file))
+        total_lines = 0
+        offset = 0
+    end = complete_size(top_file, checkpoint_file)
+
+    runningtime = time()
+    grep_pattern = '^top\s\-\s\\|^miqtop\:\\|^Cpu(s)\:\\|^Mem\:\\|^Swap\:'
+    # Use grep to reduce # of lines to sort through
+    top_lines = grep_range(grep_pattern, top_file, offset, end)
+    timediff = time() - runningtime
+    logger.info('Grepped top_output for CPU/Mem/Swap & time data in {}'.format(timediff))
+
+    line_count = 0
+    runningtime = time()
+    for top_line in top_lines:
+        line_count += 1
+        if clock.feed(top_line):
+            pass
         elif 'Cpu(s): ' in top_line:
             miq_cpu_result = miq_cpu.search(top_line)
             if miq_cpu_result:
-                top_app['datetimes'].append(str(cur_time))
+                top_app['datetimes'].append(str(clock.cur_time))
                 top_app['cpuus'].append(float(miq_cpu_result.group(1).strip()))
                 top_app['cpusy'].append(float(miq_cpu_result.group(2).strip()))
                 top_app['cpuni'].append(float(miq_cpu_result.group(3).strip()))
@@ -702,100 +927,132 @@ def top_to_appliance(top_file):
             timediff = time() - runningtime
             runningtime = time()
             logger.info('Count {} : Parsed 20000 lines in {}'.format(line_count, timediff))
-    return top_app, len(top_lines)
-
+    total_lines += line_count
+    save_checkpoint(checkpoint_file, top_file, end, top_app=top_app, clock=clock,
+        line_count=total_lines)
+    return top_app, total_lines
 
-def top_to_workers(workers, top_file):
-    # Find first miqtop log line
-    miqtop_time, timezone_offset = get_first_miqtop(top_file)
 
-    runningtime = time()
+def _top_pids_pattern(pids):
     grep_pids = ''
-    for wkr in workers:
-        grep_pids = '{}^{}\s\\|'.format(grep_pids, workers[wkr].pid)
-    grep_pattern = '{}^top\s\-\s\\|^miqtop\:'.format(grep_pids)
-    # Use grep to reduce # of lines to sort through
-    p = subprocess.Popen(['grep', grep_pattern, top_file], stdout=subprocess.PIPE)
-    greppedtop, err = p.communicate()
-    timediff = time() - runningtime
-    logger.info('Grepped top_output for pids & time data in {}'.format(timediff))
+    for pid in sorted(pids):
+        grep_pids = '{}^{}\s\\|'.format(grep_pids, pid)
+    return '{}^top\s\-\s\\|^miqtop\:'.format(grep_pids)
 
-    # This is very ugly because miqtop does include the date but top does not
-    # Also pids can be duplicated, so careful attention to detail on when a pid starts and ends
-    top_lines = greppedtop.strip().split('\n')
+
+def _top_to_pid_samples(top_lines, clock, pids, samples):
+    """Collects the top samples of the ``pids`` into ``samples``, a dict of pid: list of tuples
+    ``(time, virt, res, share, cpu %, mem %)``."""
     line_count = 0
-    top_workers = {}
-    cur_time = None
-    miqtop_ahead = True
     runningtime = time()
     for top_line in top_lines:
         line_count += 1
-        if 'top - ' in top_line:
-            # top - 11:00:43
-            cur_hour = int(top_line[6:8])
-            cur_min = int(top_line[9:11])
-            cur_sec = int(top_line[12:14])
-            if miqtop_ahead:
-                # Have not found miqtop time yet so we must rely on miqtop time "ahead"
-                if cur_hour <= miqtop_time.hour:
-                    cur_time = miqtop_time.replace(hour=cur_hour, minute=cur_min, second=cur_sec) \
-                        - timedelta(hours=timezone_offset)
-                else:
-                    # miqtop_time is ahead by date
-                    logger.info('miqtop_time is ahead by one day')
-                    cur_time = miqtop_time - timedelta(days=1)
-                    cur_time = cur_time.replace(hour=cur_hour, minute=cur_min, second=cur_sec) \
-                        - timedelta(hours=timezone_offset)
-            else:
-                cur_time = miqtop_time.replace(hour=cur_hour, minute=cur_min, second=cur_sec) \
-                    - timedelta(hours=timezone_offset)
-        elif 'miqtop: ' in top_line:
-            miqtop_ahead = False
-            # miqtop: .* is-> Mon Jan 26 08:57:39 EST 2015 -0500
-            str_start = top_line.index('is->')
-            miqtop_time = du_parser.parse(top_line[str_start:], fuzzy=True, ignoretz=True)
-            # Time logged in top is the system's time which is ahead/behind by the timezone offset
-            timezone_offset = int(top_line[str_start + 34:str_start + 37])
-            miqtop_time = miqtop_time - timedelta(hours=timezone_offset)
-        else:
+        if not clock.feed(top_line):
             top_results = miq_top.search(top_line)
             if top_results:
                 top_pid = top_results.group(1)
-                top_virt = convert_top_mem_to_mib(top_results.group(2))
-                top_res = convert_top_mem_to_mib(top_results.group(3))
-                top_share = convert_top_mem_to_mib(top_results.group(4))
-                top_cpu_per = float(top_results.group(5))
-                top_mem_per = float(top_results.group(6))
-                for worker in workers:
-                    if workers[worker].pid == top_pid:
-                        if cur_time > workers[worker].start_ts and \
-                                (workers[worker].end_ts == '' or cur_time < workers[worker].end_ts):
-                            w_id = workers[worker].worker_id
-                            if w_id not in top_workers:
-                                top_workers[w_id] = {}
-                                top_workers[w_id]['datetimes'] = []
-                                top_workers[w_id]['virt'] = []
-                                top_workers[w_id]['res'] = []
-                                top_workers[w_id]['share'] = []
-                                top_workers[w_id]['cpu_per'] = []
-                                top_workers[w_id]['mem_per'] = []
-                            top_workers[w_id]['datetimes'].append(str(cur_time))
-                            top_workers[w_id]['virt'].append(top_virt)
-                            top_workers[w_id]['res'].append(top_res)
-                            top_workers[w_id]['share'].append(top_share)
-                            top_workers[w_id]['cpu_per'].append(top_cpu_per)
-                            top_workers[w_id]['mem_per'].append(top_mem_per)
-                            break
+                if top_pid in pids:
+                    samples.setdefault(top_pid, []).append((
+                        clock.cur_time,
+                        convert_top_mem_to_mib(top_results.group(2)),
+                        convert_top_mem_to_mib(top_results.group(3)),
+                        convert_top_mem_to_mib(top_results.group(4)),
+                        float(top_results.group(5)),
+                        float(top_results.group(6))))
             else:
                 logger.error('Issue with miq_top regex or grepping of top file:{}'.format(top_line))
         if (line_count % 20000) == 0:
             timediff = time() - runningtime
             runningtime = time()
             logger.info('Count {} : Parsed 20000 lines in {}'.format(line_count, timediff))
-    return top_workers, len(top_lines)
+    return line_count
+
+
+def top_to_workers(workers, top_file, checkpoint_file=None):
+    """Parses the CPU and memory usage of the workers out of top_output.
 
+    If ``checkpoint_file`` is given, the samples of the worker pids are saved to it and the next
+    call only parses the lines appended to the log since. Only the pids of the workers not seen
+    by the previous call are looked for in the already parsed part of the log.
+    """
+    # Find first miqtop log line
+    miqtop_time, timezone_offset = get_first_miqtop(top_file)
+
+    checkpoint = load_checkpoint(checkpoint_file, top_file)
+    if checkpoint is not None:
+        samples = checkpoint['samples']
+        known_pids = checkpoint['pids']
+        clock = checkpoint['clock']
+        total_lines = checkpoint['line_count']
+        offset = checkpoint['offset']
+    else:
+        samples = {}
+        known_pids = set()
+        clock = TopClock(miqtop_time, timezone_offset)
+        total_lines = 0
+        offset = 0
+    end = complete_size(top_file, checkpoint_file)
+    pids = set(workers[wkr].pid for wkr in workers)
+
+    # This is very ugly because miqtop does include the date but top does not
+    # Also pids can be duplicated, so careful attention to detail on when a pid starts and ends
+    new_pids = pids - known_pids
+    if new_pids and offset:
+        runningtime = time()
+        top_lines = grep_range(_top_pids_pattern(new_pids), top_file, 0, offset)
+        _top_to_pid_samples(
+            top_lines, TopClock(miqtop_time, timezone_offset), new_pids, samples)
+        timediff = time() - runningtime
+        logger.info('Parsed already checkpointed top_output for {} new pids in {}'.format(
+            len(new_pids), timediff))
+    known_pids |= pids
 
-def perf_process_evm(evm_file, top_file):
+    runningtime = time()
+    # Use grep to reduce # of lines to sort through
+    top_lines = grep_range(_top_pids_pattern(known_pids), top_file, offset, end)
+    timediff = time() - runningtime
+    logger.info('Grepped top_output for pids & time data in {}'.format(timediff))
+    total_lines += _top_to_pid_samples(top_lines, clock, known_pids, samples)
+    save_checkpoint(checkpoint_file, top_file, end, samples=samples, pids=known_pids,
+        clock=clock, line_count=total_lines)
+
+    top_workers = {}
+    for top_pid in samples:
+        if top_pid not in pids:
+            continue
+        for cur_time, top_virt, top_res, top_share, top_cpu_per, top_mem_per in samples[top_pid]:
+            for worker in workers:
+                if workers[worker].pid == top_pid:
+                    if cur_time > workers[worker].start_ts and \
+                            (workers[worker].end_ts == '' or cur_time < workers[worker].end_ts):
+                        w_id = workers[worker].worker_id
+                        if w_id not in top_workers:
+                            top_workers[w_id] = {}
+                            top_workers[w_id]['datetimes'] = []
+                            top_workers[w_id]['virt'] = []
+                            top_workers[w_id]['res'] = []
+                            top_workers[w_id]['share'] = []
+                            top_workers[w_id]['cpu_per'] = []
+                            top_workers[w_id]['mem_per'] = []
+                        top_workers[w_id]['datetimes'].append(str(cur_time))
+                        top_workers[w_id]['virt'].append(top_virt)
+                        top_workers[w_id]['res'].append(top_res)
+                        top_workers[w_id]['share'].append(top_share)
+                        top_workers[w_id]['cpu_per'].append(top_cpu_per)
+                        top_workers[w_id]['mem_per'].append(top_mem_per)
+                        break
+    return top_workers, total_lines
+
+
+def perf_process_evm(evm_file, top_file, checkpoint=True):
+    """Parses the evm log and top_output and generates the charts, csvs and html report.
+
+    Args:
+        evm_file: Path to the evm log file.
+        top_file: Path to the top_output log file.
+        checkpoint: If ``True``, the parsed data is saved to checkpoint files next to the logs,
+            so running it again on the same (possibly grown) logs only parses the new lines.
+    """
     msg_filters = {
         '-hourly': re.compile(r'\"[0-9\-]*T[0-9\:]*Z\",\s\"hourly\"'),
         '-daily': re.compile(r'\"[0-9\-]*T[0-9\:]*Z\",\s\"daily\"'),
@@ -805,11 +1062,15 @@ def perf_process_evm(evm_file, top_file):
         '-EmsOpenstack': re.compile(r'\[\[\"EmsOpenstack\"\,\s[0-9]*\]\]')
     }
 
+    def checkpoint_path(log_file, kind):
+        return '{}.{}.checkpoint'.format(log_file, kind) if checkpoint else None
+
     starttime = time()
     initialtime = starttime
 
     logger.info('----------- Parsing evm log file for messages -----------')
-    messages, msg_cmds, test_start, test_end, msg_lc = evm_to_messages(evm_file, msg_filters)
+    messages, msg_cmds, test_start, test_end, msg_lc = evm_to_messages(evm_file, msg_filters,
+        checkpoint_file=checkpoint_path(evm_file, 'messages'))
     timediff = time() - starttime
     logger.info('----------- Completed Parsing evm log file -----------')
     logger.info('Parsed {} lines of evm log file for messages in {}'.format(msg_lc, timediff))
@@ -820,7 +1081,8 @@ def perf_process_evm(evm_file, top_file):
 
     logger.info('----------- Parsing evm log file for workers -----------')
     starttime = time()
-    workers, wkr_mem_exc, wkr_upt_exc, wkr_stp, wkr_int, wkr_ext, wkr_lc = evm_to_workers(evm_file)
+    workers, wkr_mem_exc, wkr_upt_exc, wkr_stp, wkr_int, wkr_ext, wkr_lc = evm_to_workers(evm_file,
+        checkpoint_file=checkpoint_path(evm_file, 'workers'))
     timediff = time() - starttime
     logger.info('----------- Completed Parsing evm log for workers -----------')
     logger.info('Parsed {} lines of evm log file for workers in {}'.format(wkr_lc, timediff))
@@ -833,7 +1095,8 @@ def perf_process_evm(evm_file, top_file):
 
     logger.info('----------- Parsing top_output log file for Appliance Metrics -----------')
     starttime = time()
-    top_appliance, tp_lc = top_to_appliance(top_file)
+    top_appliance, tp_lc = top_to_appliance(top_file,
+        checkpoint_file=checkpoint_path(top_file, 'appliance'))
     timediff = time() - starttime
     logger.info('----------- Completed Parsing top_output log -----------')
     logger.info('Parsed {} lines of top_output file for Appliance Metrics in {}'.format(tp_lc,
@@ -841,7 +1104,8 @@ def perf_process_evm(evm_file, top_file):
 
     logger.info('----------- Parsing top_output log file for worker CPU/Mem -----------')
     starttime = time()
-    top_workers, tp_lc = top_to_workers(workers, top_file)
+    top_workers, tp_lc = top_to_workers(workers, top_file,
+        checkpoint_file=checkpoint_path(top_file, 'workers'))
     timediff = time() - starttime
     logger.info('----------- Completed Parsing top_output log -----------')
     logger.info('Parsed {} lines of top_output file for workers in {}'.format(tp_lc, timediff))
@@ -1029,10 +1293,12 @@ def perf_process_evm(evm_file, top_file):
 
 
 class MiqMsgStat(object):
+    # There are millions of these for long runs, so keep them small
+    __slots__ = ['msg_id', 'msg_cmd', 'msg_args', 'pid_put', 'pid_get', 'puttime', 'gettime',
+        'deq_time', 'del_time', 'total_time']
+    headers = __slots__
 
     def __init__(self):
-        self.headers = ['msg_id', 'msg_cmd', 'msg_args', 'pid_put', 'pid_get', 'puttime', 'gettime',
-            'deq_time', 'del_time', 'total_time']
         self.msg_id = ''
         self.msg_cmd = ''
         self.msg_args = ''
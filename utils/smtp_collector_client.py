@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 
 from utils.timeutil import parsetime
+from utils.wait import TimedOutError
 import requests
+import time
 
 
 class SMTPCollectorClient(object):
@@ -16,8 +18,17 @@ class SMTPCollectorClient(object):
         self._host = host
         self._port = port
 
-    def _query(self, method, path, **params):
-        return method("http://%s:%d/%s" % (self._host, self._port, path), params=params)
+    def _query(self, method, path, http_timeout=None, **params):
+        return method(
+            "http://%s:%d/%s" % (self._host, self._port, path), params=params,
+            timeout=http_timeout)
+
+    @staticmethod
+    def _convert_filter(filter):
+        for key in ("time_from", "time_to"):
+            if isinstance(filter.get(key, None), parsetime):
+                filter[key] = filter[key].to_request_format()
+        return filter
 
     def clear_database(self):
         """Clear the database in collector
@@ -55,13 +66,32 @@ class SMTPCollectorClient(object):
 
         Returns: List of dicts with e-mails matching the criteria.
         """
-        if filter.get("time_from", None) is not None:
-            if isinstance(filter["time_from"], parsetime):
-                filter["time_from"] = filter["time_from"].to_request_format()
-        if filter.get("time_to", None) is not None:
-            if isinstance(filter["time_to"], parsetime):
-                filter["time_to"] = filter["time_to"].to_request_format()
-        return self._query(requests.get, "messages", **filter).json()
+        return self._query(requests.get, "messages", **self._convert_filter(filter)).json()
+
+    def wait_for_emails(self, count=1, timeout=60, **filter):
+        """Wait until at least ``count`` e-mails matching the filter arrive.
+
+        The collector holds the request until the e-mails come, so there is no polling involved.
+        Takes the same filter keywords as :py:meth:`get_emails`.
+
+        Args:
+            count: How many e-mails are expected.
+            timeout: How many seconds to wait at most.
+        Returns: List of dicts with e-mails matching the criteria.
+        Raises: :py:class:`utils.wait.TimedOutError` if not enough e-mails arrived in time.
+        """
+        filter = self._convert_filter(filter)
+        deadline = time.time() + timeout
+        while True:
+            remaining = max(deadline - time.time(), 0)
+            emails = self._query(
+                requests.get, "messages/wait", http_timeout=remaining + 30, count=count,
+                timeout=remaining, **filter).json()
+            if len(emails) >= count:
+                return emails
+            if time.time() >= deadline:
+                raise TimedOutError("Got {} of {} e-mails matching {!r} in {} seconds".format(
+                    len(emails), count, filter, timeout))
 
     def get_html_report(self):
         return self._query(requests.get, "messages.html").text.strip()
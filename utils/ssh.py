@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
+import os
+import pipes
 import re
+import select
 import socket
 import sys
-from collections import namedtuple
+import time
+import zlib
+from collections import deque, namedtuple
 from urlparse import urlparse
 
 import paramiko
@@ -20,6 +25,13 @@ from utils.timeutil import parsetime
 # Default blocking time before giving up on an ssh command execution,
 # in seconds (float)
 RUNCMD_TIMEOUT = 1200.0
+# sshd allows 10 sessions per connection by default (MaxSessions)
+MAX_SESSIONS = 10
+# How much of the output of one command is kept, only the end is kept for longer outputs
+MAX_OUTPUT_SIZE = 64 * 1024 * 1024
+RECV_SIZE = 32 * 1024
+# Block size of the resumable uploads
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 SSHResult = namedtuple("SSHResult", ["rc", "output"])
 
 _ssh_key_file = project_path.join('.generated_ssh_key')
@@ -28,6 +40,70 @@ _ssh_pubkey_file = project_path.join('.generated_ssh_key.pub')
 _client_session = []
 
 
+class _OutputBuffer(object):
+    """Keeps the last ``max_size`` bytes of one output stream."""
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.chunks = deque()
+        self.size = 0
+        self.truncated = False
+
+    def add(self, data):
+        self.chunks.append(data)
+        self.size += len(data)
+        while self.size > self.max_size and len(self.chunks) > 1:
+            self.size -= len(self.chunks.popleft())
+            self.truncated = True
+
+    @property
+    def value(self):
+        return ''.join(self.chunks)
+
+
+class _RunningCommand(object):
+    """A command executed in its own channel, collecting its output until it finishes."""
+    def __init__(self, channel, command, timeout, max_output, streaming):
+        self.channel = channel
+        self.command = command
+        self.deadline = time.time() + timeout if timeout else None
+        self.max_output = max_output
+        self.streaming = streaming
+        self.stdout = _OutputBuffer(max_output)
+        self.stderr = _OutputBuffer(max_output)
+        channel.exec_command('{}\n'.format(command))
+
+    def fileno(self):
+        # The channel pipe becomes readable on new stdout, stderr and when the channel closes
+        return self.channel.fileno()
+
+    def read(self):
+        """Reads what is available, returns True when the command has finished."""
+        while self.channel.recv_ready():
+            data = self.channel.recv(RECV_SIZE)
+            if self.streaming:
+                sys.stdout.write(data)
+            self.stdout.add(data)
+        while self.channel.recv_stderr_ready():
+            data = self.channel.recv_stderr(RECV_SIZE)
+            if self.streaming:
+                sys.stderr.write(data)
+            self.stderr.add(data)
+        return self.channel.eof_received and self.channel.exit_status_ready() and not (
+            self.channel.recv_ready() or self.channel.recv_stderr_ready())
+
+    @property
+    def output(self):
+        # All of stdout followed by all of stderr, the way run_command always returned it
+        return self.stdout.value + self.stderr.value
+
+    @property
+    def result(self):
+        if self.stdout.truncated or self.stderr.truncated:
+            logger.warning("Output of `{}` exceeded {} bytes, only the end is kept".format(
+                self.command, self.max_output))
+        return SSHResult(self.channel.recv_exit_status(), self.output)
+
+
 class SSHClient(paramiko.SSHClient):
     """paramiko.SSHClient wrapper
 
@@ -132,46 +208,94 @@ class SSHClient(paramiko.SSHClient):
         return super(SSHClient, self).get_transport(*args, **kwargs)
 
     def run_command(self, command, timeout=RUNCMD_TIMEOUT):
-        logger.info("Running command `{}`".format(command))
-        template = '%s\n'
-        command = template % command
-
-        output = ''
         try:
-            session = self.get_transport().open_session()
-            if timeout:
-                session.settimeout(float(timeout))
-            session.exec_command(command)
-            stdout = session.makefile()
-            stderr = session.makefile_stderr()
-            while True:
-                if session.recv_ready:
-                    for line in stdout:
-                        output += line
-                        if self._streaming:
-                            sys.stdout.write(line)
-
-                if session.recv_stderr_ready:
-                    for line in stderr:
-                        output += line
-                        if self._streaming:
-                            sys.stderr.write(line)
-
-                if session.exit_status_ready():
-                    break
-            exit_status = session.recv_exit_status()
-            return SSHResult(exit_status, output)
+            return self.run_commands([command], timeout=timeout)[0]
         except paramiko.SSHException as exc:
             logger.exception(exc)
-        except socket.timeout as e:
-            logger.error("Command `{}` timed out.".format(command))
-            logger.exception(e)
-            logger.error("Output of the command before it failed was:\n{}".format(output))
-            raise
 
         # Returning two things so tuple unpacking the return works even if the ssh client fails
         return SSHResult(1, None)
 
+    def run_commands(self, commands, timeout=RUNCMD_TIMEOUT, max_sessions=MAX_SESSIONS,
+            max_output=MAX_OUTPUT_SIZE):
+        """Runs the commands concurrently, each in its own channel of the same transport.
+
+        Waits for the output of all the running commands at once, so a batch of short commands
+        takes about as long as the slowest of them.
+
+        Args:
+            commands: List of commands to run.
+            timeout: Timeout of each command in seconds, counted from its start.
+            max_sessions: How many commands can run at the same time, the rest waits.
+            max_output: How many bytes of stdout and of stderr of each command are kept.
+        Returns:
+            List of :py:class:`SSHResult` in the same order as ``commands``.
+        Raises:
+            :py:class:`socket.timeout` if any of the commands does not finish in time.
+        """
+        results = [None] * len(commands)
+        waiting = deque(enumerate(commands))
+        running = {}
+        transport = self.get_transport()
+        try:
+            while waiting or running:
+                while waiting and len(running) < max_sessions:
+                    index, command = waiting.popleft()
+                    logger.info("Running command `{}`".format(command))
+                    running[index] = _RunningCommand(
+                        transport.open_session(), command, timeout, max_output, self._streaming)
+
+                deadlines = [cmd.deadline for cmd in running.values() if cmd.deadline]
+                wait = min(deadlines) - time.time() if deadlines else None
+                ready, _, _ = select.select(
+                    running.values(), [], [], max(wait, 0) if wait is not None else None)
+
+                for index, cmd in running.items():
+                    if cmd in ready and cmd.read():
+                        results[index] = cmd.result
+                        cmd.channel.close()
+                        del running[index]
+                    elif cmd.deadline and cmd.deadline <= time.time():
+                        logger.error("Command `{}` timed out.".format(cmd.command))
+                        logger.error(
+                            "Output of the command before it failed was:\n{}".format(cmd.output))
+                        raise socket.timeout("Command `{}` timed out".format(cmd.command))
+        finally:
+            for cmd in running.values():
+                cmd.channel.close()
+        return results
+
+    def run_command_to_file(self, command, local_file, timeout=RUNCMD_TIMEOUT):
+        """Runs the command and writes its stdout straight into ``local_file`` as it comes.
+
+        Meant for commands with a large output which should not be stored on the remote host
+        nor kept in memory. Stderr is only logged.
+
+        Returns:
+            The exit status of the command.
+        """
+        logger.info("Running command `{}` into {}".format(command, local_file))
+        session = self.get_transport().open_session()
+        try:
+            if timeout:
+                session.settimeout(float(timeout))
+            session.exec_command('{}\n'.format(command))
+            with open(local_file, 'wb') as f:
+                while True:
+                    data = session.recv(RECV_SIZE)
+                    if not data:
+                        break
+                    f.write(data)
+            errors = session.makefile_stderr('rb').read(MAX_OUTPUT_SIZE)
+            if errors:
+                logger.warning("Stderr of `{}`:\n{}".format(command, errors))
+            return session.recv_exit_status()
+        except socket.timeout:
+            logger.error("Command `{}` timed out.".format(command))
+            raise
+        finally:
+            session.close()
+
     def run_rails_command(self, command, timeout=RUNCMD_TIMEOUT):
         logger.info("Running rails command `{}`".format(command))
         return self.run_command('cd /var/www/miq/vmdb; bin/rails runner {}'.format(command),
@@ -187,6 +311,40 @@ class SSHClient(paramiko.SSHClient):
         return SCPClient(self.get_transport(), progress=self._progress_callback).put(
             local_file, remote_file, **kwargs)
 
+    def put_file_resumable(self, local_file, remote_file, chunk_size=UPLOAD_CHUNK_SIZE):
+        """Uploads the file over SFTP, continuing where a previous interrupted upload stopped.
+
+        Whatever is already in ``remote_file`` is taken as the beginning of ``local_file``. If the
+        remote file is bigger than the local one, it is uploaded again from scratch.
+
+        Returns:
+            Tuple of the offset the upload started from and the number of bytes sent.
+        """
+        local_file = str(local_file)
+        size = os.path.getsize(local_file)
+        sftp = self.open_sftp()
+        try:
+            try:
+                offset = sftp.stat(remote_file).st_size
+            except IOError:
+                offset = 0
+            if offset > size:
+                offset = 0
+            logger.info("Uploading local file {} to remote {} from byte {} of {}".format(
+                local_file, remote_file, offset, size))
+            sent = 0
+            with open(local_file, 'rb') as local, \
+                    sftp.open(remote_file, 'ab' if offset else 'wb') as remote:
+                remote.set_pipelined(True)
+                local.seek(offset)
+                for chunk in iter(lambda: local.read(chunk_size), b''):
+                    remote.write(chunk)
+                    sent += len(chunk)
+                    self._progress_callback(remote_file, size, offset + sent)
+            return offset, sent
+        finally:
+            sftp.close()
+
     def get_file(self, remote_file, local_path='', **kwargs):
         logger.info("Transferring remote file {} to local {}".format(remote_file, local_path))
         return SCPClient(self.get_transport(), progress=self._progress_callback).get(
@@ -295,6 +453,53 @@ class SSHTail(SSHClient):
             fstat = sshtail._sftp_client.stat(self._remote_filename)
             self._remote_file_size = fstat.st_size  # Seed initial size of file
 
+    def grep(self, fixed_string, chunk_size=256 * 1024):
+        """Like iterating over the tail, but yields only the lines containing ``fixed_string``.
+
+        The new part of the file is filtered by ``grep`` on the remote side and the matching
+        lines come back gzipped in large chunks, so the rest of the file never leaves the host.
+        """
+        if self._remote_file_size is None:
+            # Same as iterating, the first pass only finds the end of the file
+            self.set_initial_file_end()
+            return
+        filename = pipes.quote(self._remote_filename)
+        # The size goes to stderr, the lines to stdout
+        command = (
+            'size=$(stat -c %s {file}); echo $size >&2; '
+            'if [ $size -gt {offset} ]; then '
+            'tail -c +{start} {file} | head -c $((size - {offset})) | grep -F -- {string}; '
+            'fi | gzip -1').format(
+                file=filename, offset=self._remote_file_size, start=self._remote_file_size + 1,
+                string=pipes.quote(fixed_string))
+        session = self.get_transport().open_session()
+        try:
+            session.exec_command(command)
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            pending = ''
+            while True:
+                chunk = session.recv(chunk_size)
+                if not chunk:
+                    break
+                lines = (pending + decompressor.decompress(chunk)).split('\n')
+                pending = lines.pop()
+                for line in lines:
+                    yield line.rstrip()
+            lines = (pending + decompressor.flush()).split('\n')
+            pending = lines.pop()
+            for line in lines:
+                yield line.rstrip()
+            if pending:
+                yield pending.rstrip()
+            size = session.makefile_stderr('rb').read().strip()
+            if size.isdigit():
+                self._remote_file_size = int(size)
+            else:
+                logger.error('Could not get the size of {}: {}'.format(
+                    self._remote_filename, size))
+        finally:
+            session.close()
+
 
 def keygen():
     """Generate temporary ssh keypair for appliance SSH auth
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""Runs an operation over the VMs (or templates, ...) of many providers concurrently.
+
+Every provider gets its own small pool of workers, all the workers together are capped by a global
+limit and the calls to each provider can be rate limited, so a slow or fragile provider does not
+get hammered and does not hold the others back.
+
+Usage:
+
+    >>> from utils.sweep import Sweep
+    >>> def list_vms(provider_key, mgmt):
+    ...     return [vm for vm in mgmt.list_vm() if vm.startswith("test_")]
+    >>> def check(provider_key, mgmt, vm_names):
+    ...     return [(vm, mgmt.vm_creation_time(vm)) for vm in vm_names]
+    >>> results, failed = Sweep(max_workers=16, provider_workers=4).run(
+    ...     ["vsphere55", "rhevm35"], list_vms, check)
+
+The ``process`` function gets the items in batches of ``batch_size``, so a backend that can fetch
+the metadata of more VMs in one call can do so. Without ``process`` the results are the listed
+items themselves.
+"""
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from utils.log import logger
+from utils.providers import get_mgmt
+
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_PROVIDER_WORKERS = 4
+
+
+class RateLimiter(object):
+    """Spaces the calls so there is at most ``per_second`` of them each second.
+
+    Args:
+        per_second: Allowed rate. ``None`` or 0 means no limit.
+    """
+    def __init__(self, per_second=None):
+        self.interval = 1.0 / per_second if per_second else 0
+        self._lock = threading.Lock()
+        self._next = 0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def _batches(items, batch_size):
+    for i in range(0, len(items), batch_size):
+        yield items[i:i + batch_size]
+
+
+class Sweep(object):
+    """Concurrent sweep over providers.
+
+    Args:
+        max_workers: How many calls can run at once over all providers.
+        provider_workers: How many calls can run at once against one provider.
+        rate: Default limit of calls per second to one provider, ``None`` for no limit.
+        rate_limits: Dict of provider key to its own limit, overrides ``rate``.
+        mgmt_factory: Gets the management system for a provider key.
+    """
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, provider_workers=DEFAULT_PROVIDER_WORKERS,
+                 rate=None, rate_limits=None, mgmt_factory=get_mgmt):
+        self.provider_workers = provider_workers
+        self.rate = rate
+        self.rate_limits = rate_limits or {}
+        self.mgmt_factory = mgmt_factory
+        self._slots = threading.BoundedSemaphore(max_workers)
+
+    def _call(self, limiter, func, *args):
+        limiter.wait()
+        with self._slots:
+            # Consume the result here, a generator would otherwise run outside of the slot
+            return list(func(*args) or [])
+
+    def _sweep_provider(self, provider_key, list_items, process, batch_size):
+        limiter = RateLimiter(self.rate_limits.get(provider_key, self.rate))
+        mgmt = self.mgmt_factory(provider_key)
+        items = self._call(limiter, list_items, provider_key, mgmt)
+        if process is None:
+            return items
+
+        def process_batch(batch):
+            try:
+                return self._call(limiter, process, provider_key, mgmt, batch)
+            except Exception as e:
+                logger.error("Sweep of {} on {} failed: {}".format(batch, provider_key, str(e)))
+                logger.exception(e)
+                return []
+
+        batches = list(_batches(items, batch_size))
+        if not batches:
+            return []
+        pool = ThreadPool(min(self.provider_workers, len(batches)))
+        try:
+            return [result for results in pool.map(process_batch, batches) for result in results]
+        finally:
+            pool.close()
+            pool.join()
+
+    def run(self, provider_keys, list_items, process=None, batch_size=1):
+        """Sweeps all the providers in parallel.
+
+        Args:
+            provider_keys: Keys of the providers to sweep.
+            list_items: ``list_items(provider_key, mgmt)`` returns the items of the provider.
+            process: ``process(provider_key, mgmt, items)`` handles a batch of the items and
+                returns an iterable of results (or ``None``). Failures are logged and the batch
+                gives no results.
+            batch_size: How many items ``process`` gets at once.
+        Returns: Tuple of a dict with the list of results for each provider that could be swept
+            and a dict with the exception for each provider that could not be listed.
+        """
+        results, failed = {}, {}
+        lock = threading.Lock()
+
+        def sweep_provider(provider_key):
+            logger.info("Sweeping {}".format(provider_key))
+            try:
+                provider_results = self._sweep_provider(
+                    provider_key, list_items, process, batch_size)
+            except Exception as e:
+                logger.error("Could not sweep {}: {}".format(provider_key, str(e)))
+                with lock:
+                    failed[provider_key] = e
+            else:
+                logger.info("Sweep of {} finished".format(provider_key))
+                with lock:
+                    results[provider_key] = provider_results
+
+        threads = []
+        for provider_key in provider_keys:
+            thread = threading.Thread(target=sweep_provider, args=(provider_key,))
+            # Mark as daemon thread for easy-mode KeyboardInterrupt handling
+            thread.daemon = True
+            threads.append(thread)
+            thread.start()
+        for thread in threads:
+            # Joining with timeout keeps the main thread responsive to KeyboardInterrupt
+            while thread.is_alive():
+                thread.join(1)
+        return results, failed
@@ -88,6 +88,7 @@ import random
 from collections import OrderedDict
 from cfme.exceptions import UnknownProviderType
 from cfme.infrastructure.pxe import get_pxe_server_from_config
+from fixtures.collection_cache import collection_cache
 from fixtures.prov_filter import filtered
 from fixtures.templateloader import TEMPLATES
 from cfme.roles import group_data
@@ -246,6 +247,74 @@ def provider_by_type(metafunc, provider_types, *fields, **options):
     if 'provider' in metafunc.fixturenames and 'provider' not in argnames:
         argnames.append('provider')
 
+    # The selection does not depend on the templates, those are checked below
+    cache_key = repr((
+        getattr(metafunc.module, '__name__', None), getattr(metafunc.cls, '__name__', None),
+        metafunc.function.__name__, sorted(provider_types) if provider_types is not None else None,
+        fields, sorted(options.items())))
+    providers = collection_cache.get(cache_key)
+    if providers is None:
+        providers = _select_providers(metafunc, provider_types, fields, dict(options))
+        collection_cache.put(cache_key, providers)
+
+    for provider in providers:
+        data = cfme_data['management_systems'][provider]
+        prov_obj = get_crud(provider)
+
+        # Check the template presence if requested
+        if template_location is not None:
+            o = data
+            try:
+                for field in template_location:
+                    o = o[field]
+            except (IndexError, KeyError):
+                logger.info("Cannot apply {} to {} in the template specification, ignoring.".format(
+                    repr(field), repr(o)))
+            else:
+                if not isinstance(o, basestring):
+                    raise ValueError("{} is not a string! (for template)".format(repr(o)))
+                templates = TEMPLATES.get(provider, None)
+                if templates is not None:
+                    if o not in templates:
+                        logger.info(
+                            "Wanted template {} on {} but it is not there!\n".format(o, provider))
+                        # Skip collection of this one
+                        continue
+
+        values = []
+        for arg in argnames:
+            if arg == 'provider':
+                metafunc.function = pytest.mark.provider_related()(metafunc.function)
+                values.append(prov_obj)
+            elif arg in fields:
+                values.append(data.get(arg, None))
+
+        # skip when required field is not present and option['require_field'] == True
+        argvalues.append(values)
+
+        # Use the provider name for idlist, helps with readable parametrized test output
+        idlist.append(provider)
+
+    # pick a single provider if option['choose_random'] == True
+    if 'choose_random' not in options:
+        options['choose_random'] = False
+    if idlist and options['choose_random']:
+        single_index = idlist.index(random.choice(idlist))
+        new_idlist = ['random_provider']
+        new_argvalues = [argvalues[single_index]]
+        logger.debug('Choosing random provider, "%s" selected, ' % (provider))
+        return argnames, new_argvalues, new_idlist
+
+    return argnames, argvalues, idlist
+
+
+def _select_providers(metafunc, provider_types, fields, options):
+    """Returns keys of the providers :py:func:`provider_by_type` parametrizes the test with.
+
+    This is the expensive part of the test generation, its result is cached in
+    :py:data:`fixtures.collection_cache.collection_cache`.
+    """
+    selected = []
     for provider, data in cfme_data.get('management_systems', {}).iteritems():
 
         # Check provider hasn't been filtered out with --use-provider
@@ -342,51 +411,8 @@ def provider_by_type(metafunc, provider_types, *fields, **options):
         if skip:
             continue
 
-        # Check the template presence if requested
-        if template_location is not None:
-            o = data
-            try:
-                for field in template_location:
-                    o = o[field]
-            except (IndexError, KeyError):
-                logger.info("Cannot apply {} to {} in the template specification, ignoring.".format(
-                    repr(field), repr(o)))
-            else:
-                if not isinstance(o, basestring):
-                    raise ValueError("{} is not a string! (for template)".format(repr(o)))
-                templates = TEMPLATES.get(provider, None)
-                if templates is not None:
-                    if o not in templates:
-                        logger.info(
-                            "Wanted template {} on {} but it is not there!\n".format(o, provider))
-                        # Skip collection of this one
-                        continue
-
-        values = []
-        for arg in argnames:
-            if arg == 'provider':
-                metafunc.function = pytest.mark.provider_related()(metafunc.function)
-                values.append(prov_obj)
-            elif arg in data_values:
-                values.append(data_values[arg])
-
-        # skip when required field is not present and option['require_field'] == True
-        argvalues.append(values)
-
-        # Use the provider name for idlist, helps with readable parametrized test output
-        idlist.append(provider)
-
-    # pick a single provider if option['choose_random'] == True
-    if 'choose_random' not in options:
-        options['choose_random'] = False
-    if idlist and options['choose_random']:
-        single_index = idlist.index(random.choice(idlist))
-        new_idlist = ['random_provider']
-        new_argvalues = [argvalues[single_index]]
-        logger.debug('Choosing random provider, "%s" selected, ' % (provider))
-        return argnames, new_argvalues, new_idlist
-
-    return argnames, argvalues, idlist
+        selected.append(provider)
+    return selected
 
 
 def cloud_providers(metafunc, *fields, **options):
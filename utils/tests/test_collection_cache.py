@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0621
+import pytest
+
+from fixtures.collection_cache import CollectionCache
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+@pytest.fixture
+def make_cache(tmpdir):
+    def _make_cache():
+        cache = CollectionCache()
+        cache.key = "test"
+        cache._cache.path = tmpdir.join("collection")
+        return cache
+    return _make_cache
+
+
+def test_collection_cache_roundtrip(make_cache):
+    cache = make_cache()
+    assert cache.get("test_provider_add") is None
+    cache.put("test_provider_add", ["vsphere55", "rhevm35"])
+    cache.save()
+    # The next run (or a slave) sees the entries
+    assert make_cache().get("test_provider_add") == ["vsphere55", "rhevm35"]
+
+
+def test_collection_cache_disabled(make_cache):
+    cache = make_cache()
+    cache.enabled = False
+    cache.put("test_provider_add", ["vsphere55"])
+    cache.save()
+    assert make_cache().get("test_provider_add") is None
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0621
+import pytest
+
+from utils.disk_cache import DiskCache
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+@pytest.fixture
+def cache(tmpdir):
+    cache = DiskCache("test", ttl=60)
+    cache.path = tmpdir.join("cache")
+    return cache
+
+
+def test_disk_cache_roundtrip(cache):
+    assert cache.get(1) is None
+    cache.put(1, {"status": "NEW"})
+    assert cache.get(1) == {"status": "NEW"}
+    # Another instance (process) sees the same data
+    other = DiskCache("test", ttl=60)
+    other.path = cache.path
+    assert other.get_many([1, 2]) == {1: {"status": "NEW"}}
+
+
+def test_disk_cache_expiration(cache):
+    cache.put("a", 42)
+    cache.path.join("a.pickle").setmtime(1)
+    assert cache.get("a", "expired") == "expired"
+
+
+def test_disk_cache_broken_entry(cache):
+    cache.put("a", 42)
+    cache.path.join("a.pickle").write("garbage")
+    assert cache.get("a") is None
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0621
+import hashlib
+
+import pytest
+import requests
+
+from utils import image_cache
+from utils.image_cache import ChecksumMismatch, ImageCache, parse_checksums
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+IMAGE = b"appliance image " * 1000
+CHECKSUM = hashlib.sha256(IMAGE).hexdigest()
+URL = "http://example.com/builds/cfme-rhevm.ova"
+
+
+class FakeResponse(object):
+    def __init__(self, data, status_code):
+        self.data = data
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.data), chunk_size):
+            yield self.data[i:i + chunk_size]
+
+
+@pytest.fixture
+def downloads(monkeypatch):
+    """Records the Range headers of the requests"""
+    ranges = []
+
+    def get(url, headers=None, **kwargs):
+        offset = int(headers["Range"][6:-1]) if headers else 0
+        ranges.append(offset)
+        return FakeResponse(IMAGE[offset:], 206 if offset else 200)
+
+    monkeypatch.setattr(requests, "get", get)
+    return ranges
+
+
+@pytest.fixture
+def cache(tmpdir):
+    return ImageCache(tmpdir.join("images"))
+
+
+def test_parse_checksums():
+    assert parse_checksums("abc  cfme-rhevm.ova\nDEF *cfme-vsphere.ova\n\n") == {
+        "cfme-rhevm.ova": "abc", "cfme-vsphere.ova": "def"}
+
+
+def test_image_cache_downloads_once(cache, downloads):
+    local_file = cache.fetch(URL, CHECKSUM)
+    assert local_file.read("rb") == IMAGE
+    assert cache.fetch(URL, CHECKSUM) == local_file
+    assert downloads == [0]
+
+
+def test_image_cache_resumes(cache, downloads):
+    part = cache.file(URL, CHECKSUM).new(basename="cfme-rhevm.ova.part")
+    part.write(IMAGE[:100], "wb", ensure=True)
+    assert cache.fetch(URL, CHECKSUM).read("rb") == IMAGE
+    assert downloads == [100]
+    assert not part.check()
+
+
+def test_image_cache_checksum_mismatch(cache, downloads):
+    with pytest.raises(ChecksumMismatch):
+        cache.fetch(URL, "0" * 64)
+    assert not cache.file(URL, "0" * 64).dirpath().listdir()
+    assert image_cache.stats.records
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from utils.pagestats import parse_page_stats
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+PREFIX = "[----] I, [2015-10-21T10:43:53.123456 #12345:3fe2a0c3d2e4]  INFO -- : "
+LINES = [
+    PREFIX + 'Started GET "/dashboard/show" for 127.0.0.1 at 2015-10-21 10:43:53 -0400',
+    "[----] D, [2015-10-21T10:43:53.200000 #12345:3fe2a0c3d2e4] DEBUG -- :   "
+    'User Load (0.4ms)  SELECT "users".* FROM "users" WHERE "users"."id" = $1',
+    "[----] D, [2015-10-21T10:43:53.300000 #12345:3fe2a0c3d2e4] DEBUG -- :   "
+    'Vm Load (12.5ms)  SELECT "vms".* FROM "vms"',
+    "[----] D, [2015-10-21T10:43:53.400000 #12345:3fe2a0c3d2e4] DEBUG -- :   "
+    'CACHE (0.0ms)  SELECT "users".* FROM "users" WHERE "users"."id" = $1',
+    PREFIX + "Completed 200 OK in 345.6ms (Views: 120.5ms | ActiveRecord: 13.2ms)",
+    PREFIX + 'Started GET "/vm_infra/explorer" for 127.0.0.1 at 2015-10-21 10:43:54 -0400',
+    PREFIX + "Completed 302 Found in 5.0ms (ActiveRecord: 0.0ms)",
+    PREFIX + 'Started GET "/vm_infra/report_data" for 127.0.0.1 at 2015-10-21 10:43:55 -0400',
+]
+
+
+def test_parse_page_stats():
+    first, second = parse_page_stats(LINES, query_time_threshold=10)
+    assert first.request == 'GET "/dashboard/show" '
+    assert first.status == "200 OK"
+    assert first.completedintime == 345.6
+    assert first.viewstime == 120.5
+    assert first.activerecordtime == 13.2
+    assert first.selectcount == 3
+    assert first.cachedcount == 1
+    assert first.uncachedcount == 2
+    assert first.slowselects == [LINES[2]]
+
+    # Redirects have no view timing, the page without Completed is not finished yet
+    assert second.request == 'GET "/vm_infra/explorer" '
+    assert second.status == "302 Found"
+    assert second.completedintime == 5.0
+    assert second.viewstime == 0
+    assert second.selectcount == 0
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0621
+import pytest
+from utils.perf_message_stats import evm_to_messages
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+put_line = ('[----] I, [2014-03-04T08:{:02d}:14.320377 #3450:b15814]  INFO -- : '
+    'MIQ(MiqQueue.put) Message id: [{}], Command: [Metric::Capture.perf_rollup], '
+    'Args: ["2014-03-04T08:00:00Z", "hourly"]')
+get_line = ('[----] I, [2014-03-04T08:{:02d}:15.320377 #3451:b15814]  INFO -- : '
+    'MIQ(MiqQueue.get_via_drb) Message id: [{}], Dequeued in: [1.5] seconds')
+del_line = ('[----] I, [2014-03-04T08:{:02d}:16.320377 #3451:b15814]  INFO -- : '
+    'MIQ(MiqQueue.delivered) Message id: [{}], Delivered in [0.25] seconds')
+
+
+@pytest.fixture
+def evm_log(tmpdir):
+    lines = []
+    for msg_id in range(500):
+        minute = msg_id % 60
+        lines.append(put_line.format(minute, msg_id))
+        lines.append('[----] I, unrelated line')
+        lines.append(get_line.format(minute, msg_id))
+        lines.append(del_line.format(minute, msg_id))
+    evm_file = tmpdir.join('evm.log')
+    evm_file.write('\n'.join(lines) + '\n')
+    return evm_file.strpath
+
+
+def test_evm_to_messages_parallel_matches_serial(evm_log):
+    serial = evm_to_messages(evm_log, {}, processes=1)
+    parallel = evm_to_messages(evm_log, {}, processes=4)
+    assert serial[2:] == parallel[2:]
+    assert serial[1] == parallel[1]
+    assert sorted(serial[0]) == sorted(parallel[0])
+    for msg_id in serial[0]:
+        assert dict(serial[0][msg_id]) == dict(parallel[0][msg_id])
+
+
+def test_evm_to_messages_statistics(evm_log):
+    messages, msg_cmds, test_start, test_end, line_count = evm_to_messages(evm_log, {})
+    assert len(messages) == 500
+    assert line_count == 2000
+    assert test_start == '2014-03-04 08:00:14.320377'
+    assert msg_cmds['Metric::Capture.perf_rollup']['total'] == [1.75] * 500
+
+
+def test_evm_to_messages_parses_last_line(evm_log, tmpdir):
+    # Without checkpointing, a last line lacking the newline is parsed too
+    finished_log = tmpdir.join('finished_evm.log')
+    finished_log.write(open(evm_log).read().rstrip('\n'))
+    messages, msg_cmds, test_start, test_end, line_count = evm_to_messages(
+        finished_log.strpath, {})
+    assert line_count == 2000
+    assert msg_cmds['Metric::Capture.perf_rollup']['total'] == [1.75] * 500
+
+
+def test_evm_to_messages_resumes_from_checkpoint(evm_log, tmpdir):
+    checkpoint_file = tmpdir.join('evm.log.messages.checkpoint').strpath
+    full_log = open(evm_log).read()
+    # Leave a half-written line at the end, it must be picked up by the next run
+    cut = full_log.index('\n', len(full_log) // 2) + 1
+    partial_log = tmpdir.join('growing_evm.log')
+    partial_log.write(full_log[:cut + 20])
+    first = evm_to_messages(partial_log.strpath, {}, checkpoint_file=checkpoint_file)
+    assert first[4] < 2000
+    partial_log.write(full_log)
+    resumed = evm_to_messages(partial_log.strpath, {}, checkpoint_file=checkpoint_file)
+    expected = evm_to_messages(evm_log, {})
+    assert resumed[1:] == expected[1:]
+    assert sorted(resumed[0]) == sorted(expected[0])
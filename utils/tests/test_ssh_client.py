@@ -50,3 +50,19 @@ def test_scp_client_can_put_a_file(ssh_client, tmpdir):
     assert "content" in tmpfile.read()
     # Clean up the server
     ssh_client.run_command("rm -f /tmp/%s" % tmpfile.basename)
+
+
+def test_ssh_client_run_commands(ssh_client):
+    # The results keep the order of the commands, not the order they finished in
+    results = ssh_client.run_commands(['sleep 2; echo first', 'echo second', 'exit 3'])
+    assert [result.rc for result in results] == [0, 0, 3]
+    assert results[0].output.strip() == 'first'
+    assert results[1].output.strip() == 'second'
+
+
+def test_ssh_client_run_command_stderr_after_stdout(ssh_client):
+    # Stderr never gets in the middle of stdout
+    exit_status, output = ssh_client.run_command(
+        'echo -n out1; echo err >&2; sleep 1; echo out2')
+    assert exit_status == 0
+    assert output == 'out1out2\nerr\n'
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0621
+import threading
+import time
+
+import pytest
+
+from utils.sweep import RateLimiter, Sweep
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+class FakeMgmt(object):
+    def __init__(self, key):
+        self.key = key
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def list_vm(self):
+        if self.key == "broken":
+            raise Exception("Provider is down")
+        return ["{}-vm{}".format(self.key, i) for i in range(10)]
+
+    def inspect(self, vm_names):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.01)
+        with self._lock:
+            self.running -= 1
+        if "{}-vm3".format(self.key) in vm_names:
+            raise Exception("VM disappeared")
+        return vm_names
+
+
+@pytest.fixture
+def mgmts():
+    return {}
+
+
+@pytest.fixture
+def sweep(mgmts):
+    def factory(key):
+        return mgmts.setdefault(key, FakeMgmt(key))
+    return Sweep(max_workers=4, provider_workers=2, mgmt_factory=factory)
+
+
+def test_sweep_results(sweep):
+    results, failed = sweep.run(
+        ["a", "b", "broken"], lambda key, mgmt: mgmt.list_vm(),
+        lambda key, mgmt, vms: mgmt.inspect(vms))
+    assert failed.keys() == ["broken"]
+    # The failed batch is skipped, the rest keeps the order
+    assert results["a"] == ["a-vm{}".format(i) for i in range(10) if i != 3]
+    assert len(results["b"]) == 9
+
+
+def test_sweep_batches_and_limits(sweep, mgmts):
+    batches = []
+
+    def process(key, mgmt, vms):
+        batches.append(len(vms))
+        return mgmt.inspect(["-"])
+
+    results, failed = sweep.run(["a"], lambda key, mgmt: mgmt.list_vm(), process, batch_size=4)
+    assert sorted(batches) == [2, 4, 4]
+    assert mgmts["a"].max_running <= 2
+
+
+def test_sweep_generator_process_limited(mgmts):
+    running = [0, 0]
+    lock = threading.Lock()
+
+    def process(key, mgmt, vms):
+        for vm in vms:
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            yield vm
+
+    sweep = Sweep(max_workers=2, provider_workers=4,
+                  mgmt_factory=lambda key: mgmts.setdefault(key, FakeMgmt(key)))
+    results, failed = sweep.run(
+        ["a", "b", "c"], lambda key, mgmt: mgmt.list_vm(), process, batch_size=2)
+    assert all(len(results[key]) == 10 for key in ["a", "b", "c"])
+    assert running[1] <= 2
+
+
+def test_sweep_without_process(sweep):
+    results, failed = sweep.run(["a"], lambda key, mgmt: mgmt.list_vm())
+    assert len(results["a"]) == 10
+
+
+def test_rate_limiter():
+    limiter = RateLimiter(100)
+    start = time.time()
+    for _ in range(11):
+        limiter.wait()
+    assert time.time() - start >= 0.09
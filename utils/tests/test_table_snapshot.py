@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0621
+import pytest
+
+import cfme.fixtures.pytest_selenium as sel
+from cfme.web_ui import Table
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+SNAPSHOT = {
+    "headers": ["", "Name", "Provider", "Last Analysis"],
+    "rows": [
+        {"position": 2, "cells": ["", "rhel-7", "vsphere55", "Never"]},
+        {"position": 3, "cells": ["", "rhel-7", "rhevm35", "Never"]},
+        {"position": 4, "cells": ["", "fedora-22", "vsphere55", "2015-10-21"]},
+    ],
+}
+
+
+class FakeTable(Table):
+    # The snapshot script gets these, they are never used as elements here
+    header_row = "header row"
+    body = "body"
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+
+    def execute_script(script, *args):
+        calls.append((script, args))
+        return SNAPSHOT
+    monkeypatch.setattr(sel, "execute_script", execute_script)
+    monkeypatch.setattr(sel, "element", lambda loc, root=None: (loc, root))
+    return calls
+
+
+@pytest.fixture
+def table(calls):
+    return FakeTable('//div[@id="pre_prov_div"]//table', body_offset=1, snapshot=True)
+
+
+def test_snapshot_rows(table, calls):
+    rows = list(table.rows())
+    assert len(calls) == 1
+    assert calls[0][1] == ("header row", "body", 1)
+    assert [row.name.text for row in rows] == ["rhel-7", "rhel-7", "fedora-22"]
+    assert rows[2]["Last Analysis"].text == "2015-10-21"
+    assert rows[1][2].text == "rhevm35"
+    # The elements are located by the position of the row in the body
+    assert rows[1].row_element == ("tr[3]", "body")
+    assert rows[1][2].locate() == ("td[3]", ("tr[3]", "body"))
+
+
+def test_snapshot_filter_rows(table):
+    rows = table.snapshot()
+    assert Table._filter_rows(rows, {"Name": "rhel-7"}) == rows[:2]
+    assert Table._filter_rows(rows, {"Name": "rhel-7", "Provider": "rhevm35"}) == [rows[1]]
+    assert Table._filter_rows(rows, {"Name": "rhel"}) == []
+    assert Table._filter_rows(rows, {"Name": "rhel"}, partial_check=True) == rows[:2]
+
+
+def test_snapshot_find_row_by_cells(table, calls):
+    row = table.find_row_by_cells({"Name": "fedora-22", "Provider": "vsphere55"})
+    assert row.position == 4
+    assert table.find_row_by_cells({"Name": "fedora-22", "Provider": "rhevm35"}) is None
+    # Every lookup reads the table once
+    assert len(calls) == 2
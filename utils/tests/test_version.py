@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0621
+import copy
+import pickle
+
+import pytest
+
+from utils import version
+from utils.version import LATEST, LOWEST, Version
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+@pytest.fixture
+def current(monkeypatch):
+    current = {'version': Version('5.4.2')}
+    monkeypatch.setattr(version, 'current_version', lambda: current['version'])
+    return current
+
+
+def test_version_interned():
+    assert Version('5.5.0.1') is Version('5.5.0.1')
+    assert Version(Version('5.5')) is Version('5.5')
+    assert Version([5, 5]) == Version('5.5')
+    assert pickle.loads(pickle.dumps(Version('5.4'), 2)) is Version('5.4')
+    assert copy.deepcopy(Version('5.4')) is Version('5.4')
+
+
+def test_version_ordering():
+    assert Version('5.4.1') < '5.5' < Version('5.5.0.1') < LATEST
+    assert LOWEST < '0.1'
+    assert Version('master') == LATEST
+    assert sorted(['5.5', LATEST, '5.4.1', LOWEST], key=Version) == [LOWEST, '5.4.1', '5.5', LATEST]
+    assert len({Version('5.5'), Version([5, 5])}) == 1
+
+
+def test_pick(current):
+    locators = {'5.3': 'a', '5.4': 'b', '5.5': 'c', LATEST: 'd'}
+    assert version.pick(locators) == 'b'
+    assert version.pick({'5.5': 'c'}) is None
+    current['version'] = Version('5.5.0.1')
+    assert version.pick(locators) == 'c'
+    current['version'] = LATEST
+    assert version.pick(locators) == 'd'
@@ -142,25 +142,68 @@ def dependent(default_function):
     return m
 
 
+# Which key pick() chooses for a set of keys, valid for _pick_table_version only
+_pick_table = {}
+_pick_table_version = None
+
+
+def _pick_key(keys, version):
+    """Returns the key of the highest version that is not higher than ``version`` or None"""
+    matching = [(get_version(key), key) for key in keys if get_version(key) <= version]
+    return max(matching)[1] if matching else None
+
+
 def pick(v_dict):
     """
     Collapses an ambiguous series of objects bound to specific versions
     by interrogating the CFME Version and returning the correct item.
+
+    The chosen key is remembered for the set of keys, so the versions are only compared again
+    once the current version changes.
     """
-    # convert keys to Versions
-    v_dict = {get_version(k): v for (k, v) in v_dict.items()}
-    versions = v_dict.keys()
-    sorted_matching_versions = sorted(filter(lambda v: v <= current_version(), versions),
-                                      reverse=True)
-    return v_dict.get(sorted_matching_versions[0]) if sorted_matching_versions else None
+    global _pick_table, _pick_table_version
+    version = current_version()
+    if version is not _pick_table_version:
+        _pick_table = {}
+        _pick_table_version = version
+    keys = frozenset(v_dict)
+    try:
+        key = _pick_table[keys]
+    except KeyError:
+        key = _pick_table[keys] = _pick_key(keys, version)
+    return v_dict[key] if key is not None else None
 
 
 class Version(object):
-    """Version class based on distutil.version.LooseVersion"""
+    """Version class based on distutil.version.LooseVersion
+
+    The instances are interned, ``Version("5.5")`` parses the string only the first time and then
+    returns the same object. Do not modify them.
+    """
     component_re = re.compile(r'(\d+ | [a-z]+ | \.)', re.VERBOSE)
+    _cache = {}
 
-    def __init__(self, vstring):
+    def __new__(cls, vstring):
+        if type(vstring) is cls:
+            return vstring
+        # lists are not hashable, tuples join the same way
+        key = tuple(vstring) if isinstance(vstring, list) else vstring
+        try:
+            return cls._cache[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # Not hashable, cannot be interned
+            key = None
+        self = super(Version, cls).__new__(cls)
         self.parse(vstring)
+        if key is not None:
+            cls._cache[key] = self
+        return self
+
+    def __init__(self, vstring):
+        # Everything was done in __new__
+        pass
 
     def parse(self, vstring):
         if vstring is None:
@@ -182,6 +225,13 @@ class Version(object):
 
         self.vstring = vstring
         self.version = components
+        # Total ordering key, lowest and latest go around everything else
+        if components == ['lowest']:
+            self._key = (0, )
+        elif components == ['master']:
+            self._key = (2, )
+        else:
+            self._key = (1, components)
 
     @classmethod
     def latest(cls):
@@ -198,26 +248,28 @@ class Version(object):
         return "Version ('%s')" % str(self)
 
     def __cmp__(self, other):
-        try:
-            other = Version(other)
-        except:
-            raise ValueError('Cannot compare Version to {}'.format(type(other).__name__))
-
-        if self == other:
-            return 0
-        elif self == self.latest() or other == self.lowest():
-            return 1
-        elif self == self.lowest() or other == self.latest():
-            return -1
-        else:
-            return cmp(self.version, other.version)
+        if not isinstance(other, Version):
+            try:
+                other = Version(other)
+            except:
+                raise ValueError('Cannot compare Version to {}'.format(type(other).__name__))
+        return cmp(self._key, other._key)
 
     def __eq__(self, other):
+        if other is self:
+            return True
         try:
             return self.version == Version(other).version
         except:
             return False
 
+    def __hash__(self):
+        return hash(self._key[:1] + tuple(self.version))
+
+    def __reduce__(self):
+        # pickle and copy go through __new__ too, so they get the interned instance
+        return (Version, (self.vstring, ))
+
     def __contains__(self, ver):
         """Enables to use ``in`` expression for :py:meth:`Version.is_in_series`.
 
@@ -245,7 +297,7 @@ class Version(object):
 
         if not isinstance(series, Version):
             series = get_version(series)
-        if self in (self.lowest(), self.latest()):
+        if len(self._key) == 1:  # lowest or latest
             if series == self:
                 return True
             else:
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""Threaded server for the bottle based helper scripts.
+
+The default bottle server handles one request at a time, so a request waiting for something to
+happen would block all the others. Usage::
+
+    from bottle import run
+    from utils.wsgi_server import ThreadingServer
+
+    run(host="0.0.0.0", port=8080, server=ThreadingServer)
+"""
+from SocketServer import ThreadingMixIn
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, make_server
+
+from bottle import ServerAdapter
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(*args, **kwargs):
+        pass
+
+
+class ThreadingServer(ServerAdapter):
+    """wsgiref server handling each request in its own thread."""
+    def run(self, handler):
+        if self.quiet:
+            self.options['handler_class'] = QuietHandler
+        server = make_server(
+            self.host, self.port, handler, server_class=ThreadingWSGIServer, **self.options)
+        server.serve_forever()